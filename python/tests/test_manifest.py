@@ -0,0 +1,108 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from wolverine import manifest
+from wolverine.shots import ShotData
+
+MEDIA = ['thumbnail']
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    source = tmp_path.joinpath('source.mov')
+    source.write_bytes(b'source')
+    return source
+
+
+def make_shots(source: Path, export_dir: Path, count: int) -> list[ShotData]:
+    shots = [ShotData.from_frames(index=(i + 1) * 10, fps=24, source=source, start=i * 10, duration=10,
+                                  auto_thumbnail=False) for i in range(count)]
+    for shot in shots:
+        shot.save_directory = export_dir
+    return shots
+
+
+def export(shots: list[ShotData], export_dir: Path) -> manifest.ExportPlan:
+    # what export_shots does, media "generated" as a file holding the start frame of its shot
+    plan = manifest.plan_export(shots, export_dir, MEDIA)
+    manifest.apply_moves(plan.moves)
+    for shot, media in plan.generate:
+        shot.media_command(media)[1].write_text(f'frame {shot.start_frame}')
+    manifest.remove_orphans(plan.orphans)
+    manifest.write_manifest(export_dir, plan)
+    return plan
+
+
+def contents(export_dir: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in sorted(export_dir.glob('*.jpg'))}
+
+
+def test_rename_chain_moves_every_file(tmp_path: Path, source: Path):
+    export_dir = tmp_path.joinpath('export')
+    export_dir.mkdir()
+    shots = make_shots(source, export_dir, 3)
+    export(shots, export_dir)
+
+    # SH010 -> SH020 -> SH030 -> SH040, each rename lands on the name of the next shot
+    for shot in shots:
+        shot.index += 10
+    plan = export(shots, export_dir)
+    assert not plan.generate
+    assert len(plan.moves) == 3
+    assert contents(export_dir) == {'SH020.jpg': 'frame 0', 'SH030.jpg': 'frame 10', 'SH040.jpg': 'frame 20'}
+
+
+def test_swapped_names_swap_files(tmp_path: Path, source: Path):
+    export_dir = tmp_path.joinpath('export')
+    export_dir.mkdir()
+    first, second = make_shots(source, export_dir, 2)
+    export([first, second], export_dir)
+
+    first.index, second.index = second.index, first.index
+    plan = export([first, second], export_dir)
+    assert not plan.generate
+    assert contents(export_dir) == {'SH010.jpg': 'frame 10', 'SH020.jpg': 'frame 0'}
+
+
+def test_modified_file_is_generated_again(tmp_path: Path, source: Path):
+    export_dir = tmp_path.joinpath('export')
+    export_dir.mkdir()
+    shots = make_shots(source, export_dir, 2)
+    export(shots, export_dir)
+
+    # same size, other content and modification time
+    edited = export_dir.joinpath('SH010.jpg')
+    edited.write_text('frame X')
+    os.utime(edited, ns=(edited.stat().st_atime_ns, edited.stat().st_mtime_ns + 10 ** 9))
+    plan = export(shots, export_dir)
+    assert [(shot.name, media) for shot, media in plan.generate] == [('SH010', 'thumbnail')]
+    assert plan.unchanged == [export_dir.joinpath('SH020.jpg')]
+    assert contents(export_dir)['SH010.jpg'] == 'frame 0'
+
+
+def test_touched_file_with_same_content_is_kept(tmp_path: Path, source: Path):
+    export_dir = tmp_path.joinpath('export')
+    export_dir.mkdir()
+    shots = make_shots(source, export_dir, 1)
+    export(shots, export_dir)
+
+    touched = export_dir.joinpath('SH010.jpg')
+    os.utime(touched, ns=(touched.stat().st_atime_ns, touched.stat().st_mtime_ns + 10 ** 9))
+    plan = export(shots, export_dir)
+    assert not plan.generate
+    assert plan.unchanged == [touched]
+
+
+def test_orphans_are_removed(tmp_path: Path, source: Path):
+    export_dir = tmp_path.joinpath('export')
+    export_dir.mkdir()
+    shots = make_shots(source, export_dir, 3)
+    export(shots, export_dir)
+    unrelated = export_dir.joinpath('notes.jpg')
+    unrelated.write_text('not exported')
+
+    plan = export(shots[:2], export_dir)
+    assert plan.orphans == [export_dir.joinpath('SH030.jpg')]
+    assert sorted(contents(export_dir)) == ['SH010.jpg', 'SH020.jpg', 'notes.jpg']
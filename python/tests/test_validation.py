@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from wolverine.shots import ShotData
+from wolverine.validation import repair_shots
+
+
+def make_shot(start: int, duration: int) -> ShotData:
+    return ShotData.from_frames(index=0, fps=24, source=Path('source.mov'), start=start, duration=duration,
+                                auto_thumbnail=False)
+
+
+def test_pinned_shot_made_shorter_keeps_its_end():
+    a, b, c = make_shot(0, 10), make_shot(10, 10), make_shot(20, 10)
+    b.end_frame = 15
+    result = repair_shots([a, b, c], nb_frames=30, pinned=[b])
+    assert [(s.start_frame, s.end_frame) for s in result.shots] == [(0, 9), (10, 15), (16, 29)]
+    assert c in result.moved
+
+
+def test_pinned_shot_trimming_a_shot_onto_the_next_start():
+    a, b, e = make_shot(0, 10), make_shot(10, 21), make_shot(20, 10)
+    a.end_frame = 19
+    result = repair_shots([a, b, e], nb_frames=31, pinned=[a])
+    ranges = [(s.start_frame, s.end_frame) for s in result.shots]
+    assert ranges[0] == (0, 19)
+    assert all(s.duration > 0 for s in result.shots)
+    assert len({start for start, _ in ranges}) == len(ranges)
+    assert ranges[-1][1] == 30
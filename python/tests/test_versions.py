@@ -0,0 +1,128 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from wolverine import analysis
+from wolverine import versions
+from wolverine import media_cache
+from wolverine.shots import ShotData
+from wolverine.versions import Segment
+
+SHOT_FRAMES = 48
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    # carry_shots adds media to the shared cache, nothing is cached here
+    monkeypatch.setattr(media_cache, '_cache', None)
+    monkeypatch.setattr(media_cache, '_cache_configured', True)
+
+
+def frames(seed: int, count: int, held: bool = False) -> np.ndarray:
+    # random signatures are far apart from each other, a held shot repeats its first frame
+    rng = np.random.default_rng(seed)
+    signatures = rng.integers(0, 256, (count, analysis.SIGNATURE_BYTES), dtype=np.uint8)
+    return np.repeat(signatures[:1], count, axis=0) if held else signatures
+
+
+# previous version : shots A, B (a hold), C and D, one seed each
+PREVIOUS = {name: frames(seed, SHOT_FRAMES, held=name == 'B') for seed, name in enumerate('ABCD')}
+NEW = frames(100, 30)
+
+
+def version(*parts: np.ndarray) -> np.ndarray:
+    return np.concatenate(parts)
+
+
+CASES = {
+    'identical': (version(*PREVIOUS.values()),
+                  [Segment(0, 0, 192)], [], 'ABCD'),
+    'insert': (version(PREVIOUS['A'], PREVIOUS['B'], NEW, PREVIOUS['C'], PREVIOUS['D']),
+               [Segment(0, 0, 96), Segment(126, 96, 96)], [(96, 126)], 'ABCD'),
+    'delete': (version(PREVIOUS['A'], PREVIOUS['C'], PREVIOUS['D']),
+               [Segment(0, 0, 48), Segment(48, 96, 96)], [(48, 48)], 'ACD'),
+    'replace': (version(PREVIOUS['A'], PREVIOUS['B'], NEW, PREVIOUS['D']),
+                [Segment(0, 0, 96), Segment(126, 144, 48)], [(96, 126)], 'ABD'),
+    # the hold gets shorter : the first segment runs into it, the next one starts on C
+    'held frames': (version(PREVIOUS['A'], PREVIOUS['B'][:30], PREVIOUS['C'], PREVIOUS['D']),
+                    [Segment(0, 0, 78), Segment(78, 96, 96)], [(78, 78)], 'ACD'),
+    # fewer frames than a chunk after the last change are not matched
+    'end of source': (version(PREVIOUS['A'], PREVIOUS['B'], PREVIOUS['C'], PREVIOUS['D'][:38], NEW[:10]),
+                      [Segment(0, 0, 182)], [(182, 192)], 'ABC'),
+    # changed frames followed by fewer unchanged frames than a chunk
+    'short tail': (version(PREVIOUS['A'], PREVIOUS['B'], PREVIOUS['C'], NEW[:10], PREVIOUS['D'][-20:]),
+                   [Segment(0, 0, 144)], [(144, 174)], 'ABC'),
+}
+
+
+def previous_shots(source: Path) -> list[ShotData]:
+    return [ShotData.from_frames(index=(i + 1) * 10, fps=24, source=source, start=i * SHOT_FRAMES,
+                                 duration=SHOT_FRAMES, auto_thumbnail=False) for i in range(len(PREVIOUS))]
+
+
+def silence(signatures: np.ndarray) -> np.ndarray:
+    return versions._peaks(None, len(signatures))
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_match(case: str):
+    signatures, segments, changed, _ = CASES[case]
+    previous = version(*PREVIOUS.values())
+    result = versions.match(previous, silence(previous), signatures, silence(signatures))
+    assert result == segments
+    assert versions.changed_ranges(result, len(signatures)) == changed
+
+
+def test_match_tolerates_encoding_noise():
+    previous = version(*PREVIOUS.values())
+    noise = np.random.default_rng(0).integers(-versions.SIGNATURE_TOLERANCE, versions.SIGNATURE_TOLERANCE + 1,
+                                              previous.shape)
+    signatures = np.clip(previous.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    assert versions.match(previous, silence(previous), signatures, silence(signatures)) == [Segment(0, 0, 192)]
+
+
+def test_changed_audio_breaks_a_segment():
+    previous = version(*PREVIOUS.values())
+    peaks = silence(previous).copy()
+    peaks[60:80] = -6.0
+    result = versions.match(previous, silence(previous), previous, peaks)
+    assert result == [Segment(0, 0, 60), Segment(80, 80, 112)]
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_carry_shots(case: str):
+    signatures, segments, _, kept = CASES[case]
+    previous, source = Path('previous.mov'), Path('source.mov')
+    carried = versions.carry_shots(previous_shots(previous), segments, source)
+    assert [s.name for s in carried] == [f'SH0{"ABCD".index(name) + 1}0' for name in kept]
+    for shot in carried:
+        segment = next(s for s in segments if s.start <= shot.start_frame < s.end)
+        assert shot.source == source
+        assert shot.start_frame + shot.duration <= segment.end
+        assert shot.duration == SHOT_FRAMES
+        # same frames as the previous shot
+        previous_start = shot.start_frame - segment.offset
+        assert np.array_equal(signatures[shot.start_frame:shot.start_frame + shot.duration],
+                              version(*PREVIOUS.values())[previous_start:previous_start + shot.duration])
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_cut_changed_fills_what_is_not_carried(case: str):
+    signatures, segments, changed, _ = CASES[case]
+    source = Path('source.mov')
+    carried = versions.carry_shots(previous_shots(Path('previous.mov')), segments, source)
+    # a cut on the first frame of each changed range and of each segment
+    cuts = {start for start, end in changed} | {s.start for s in segments}
+    scores = [1.0 if frame in cuts else 0.0 for frame in range(len(signatures))]
+    result = analysis.SourceAnalysis(fingerprint='', fps=24, frames=len(signatures), scene_scores=scores, black=[],
+                                     freeze=[], key_frames=[0], audio_peaks=None, thumbnail_frames=[])
+    shots = versions.cut_changed(result, carried, source, threshold=50)
+    assert all(s.index == 0 and s.source == source for s in shots)
+    ranges = sorted([(s.start_frame, s.start_frame + s.duration) for s in shots + carried])
+    # every frame is in exactly one shot
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(signatures)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    # new shots start on a cut or where a carried shot ends
+    ends = {s.start_frame + s.duration for s in carried}
+    assert all(s.start_frame in cuts | ends for s in shots)
@@ -0,0 +1,5 @@
+import sys
+
+from wolverine.cli import main
+
+sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+Single-decode source analysis : one ffmpeg run decodes the source once and feeds every analysis at the same time
+
+    - scene score of every frame (shot detection at any threshold reads them, see SourceAnalysis.cuts)
+    - black and frozen frame ranges
+    - key frames
+    - audio peak level of every frame
+    - thumbnails of the frames that may start a shot, added to the media cache under the key the thumbnail of a
+      shot starting there uses, so the thumbnails of detected shots are linked from it instead of being extracted
+    - low resolution signatures of every frame, to match the content of another version of the source (see versions)
+
+    result = analysis.analyze(source, fps=24, frames=2400)
+    starts = result.cuts(threshold=45)
+    analysis.flag_ignored(shots, result)  # black gaps, slates (and held frames if asked for) become ignored shots
+
+Results are kept per source content (media_cache.source_fingerprint) in the analysis cache, opening the same source
+again or detecting with another threshold doesn't decode anything.
+
+    WOLVERINE_ANALYSIS_DIR    analysis cache directory (defaults to <temp>/wolverine/analysis), an empty value keeps
+                              results in memory only
+"""
+from __future__ import annotations
+
+import os
+import json
+import re
+from pathlib import Path
+from tempfile import gettempdir, TemporaryDirectory
+from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Iterable
+from uuid import uuid4
+
+import numpy as np
+
+from wolverine import log
+from wolverine import jobs
+from wolverine import trace
+from wolverine import media_cache
+from wolverine.shots import ShotData
+
+ANALYSIS_VERSION = 1
+DEFAULT_ANALYSIS_DIR = Path(gettempdir()).joinpath('wolverine/analysis')
+CANDIDATE_SCORE = 0.2       # frames scoring above it get a thumbnail, detection thresholds from 20 are covered
+PEAK_SAMPLE_RATE = 48000
+SIGNATURE_SIZE = (16, 8)    # pixels of frame signatures, each one is the average of an area of the frame
+SIGNATURE_BYTES = SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1] * 3 // 2  # per frame, yuv 4:2:0 : color changes count
+SILENCE_DB = -120.0         # floor of audio peaks, digital silence is -inf
+
+_METADATA_LINE = re.compile(r'^\[a?metadata@(\w+) @ [^]]+] (.*)$')
+_analyses: dict[str, SourceAnalysis] = {}
+_directory: Path | None = None
+_directory_configured = False
+
+
+@dataclass(frozen=True)
+class AnalysisSettings:
+    """
+    Black and freeze detection settings (ffmpeg's blackdetect and freezedetect), an analysis made with other settings
+    is done again
+    """
+    black_pixel_threshold: float = 0.1  # luminance ratio under which a pixel is black
+    black_min_duration: float = 0.04    # seconds
+    freeze_noise: float = -60.0         # dB, frames closer than that are the same frame
+    freeze_min_duration: float = 0.2    # seconds
+
+
+@dataclass(frozen=True)
+class IgnoreRules:
+    """
+    Detected shots flagged as ignored (and disabled), ratios of the frames of a shot, 0 turns a rule off
+    """
+    black: float = 0.9   # black frames : gaps, leader
+    freeze: float = 0.0  # frozen frames, off by default as animatics often hold a panel for a whole shot
+    slate: float = 0.9   # frozen frames of a shot followed by an ignored black one : slates and cards before leader
+
+
+@dataclass
+class SourceAnalysis:
+    fingerprint: str
+    fps: float
+    frames: int                             # decoded frames
+    scene_scores: list[float]               # per frame, 0 for the first one
+    black: list[tuple[int, int]]            # frame ranges, end excluded
+    freeze: list[tuple[int, int]]           # frame ranges, end excluded
+    key_frames: list[int]
+    audio_peaks: list[float] | None         # dBFS per frame, None without audio
+    thumbnail_frames: list[int]             # frames whose thumbnail went to the media cache
+    settings: dict[str, float] = field(default_factory=lambda: asdict(AnalysisSettings()))
+    signatures: bytes = b''                 # SIGNATURE_BYTES per frame, stored next to the json
+    version: int = ANALYSIS_VERSION
+
+    def cuts(self, threshold: int) -> list[int]:
+        """
+        Shot start frames for a detection threshold (1-100), what ffmpeg's select='gt(scene,threshold/100)' keeps
+        plus the first frame
+        """
+        limit = float(threshold) / 100
+        return [0] + [frame for frame, score in enumerate(self.scene_scores) if frame and score > limit]
+
+    def signature_array(self) -> np.ndarray | None:
+        """
+        Returns:
+            np.ndarray: (frames, SIGNATURE_BYTES) signatures, None when the analysis has none (made by an older
+                version)
+        """
+        if not self.frames or len(self.signatures) != self.frames * SIGNATURE_BYTES:
+            return None
+        return np.frombuffer(self.signatures, dtype=np.uint8).reshape(self.frames, SIGNATURE_BYTES)
+
+    def to_dict(self) -> dict[str, Any]:
+        values = asdict(self)
+        del values['signatures']
+        return values
+
+    @staticmethod
+    def from_dict(values: dict[str, Any]) -> SourceAnalysis:
+        values = dict(values)
+        for key in ('black', 'freeze'):
+            values[key] = [tuple(frame_range) for frame_range in values.get(key, [])]
+        return SourceAnalysis(**values)
+
+
+def get_directory() -> Path | None:
+    """
+    Analysis cache directory, None when results are only kept in memory
+    """
+    global _directory, _directory_configured
+    if not _directory_configured:
+        directory = os.getenv('WOLVERINE_ANALYSIS_DIR', DEFAULT_ANALYSIS_DIR.as_posix())
+        _directory = Path(directory) if directory else None
+        _directory_configured = True
+    return _directory
+
+
+def set_directory(directory: str | Path | None) -> None:
+    """
+    Replace (or disable with None) the analysis cache directory
+    """
+    global _directory, _directory_configured
+    _directory = Path(directory) if directory else None
+    _directory_configured = True
+
+
+def _cache_path(fingerprint: str) -> Path | None:
+    directory = get_directory()
+    return directory.joinpath(fingerprint[:2], f'{fingerprint}.json') if directory else None
+
+
+def _write(path: Path, data: bytes) -> None:
+    # written next to its final path then moved over it
+    partial_path = path.with_name(f'.{path.stem}.{uuid4().hex[:8]}{path.suffix}')
+    try:
+        partial_path.write_bytes(data)
+        os.replace(partial_path, path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+
+def load(source: str | Path) -> SourceAnalysis | None:
+    """
+    Analysis of source from memory or from the analysis cache, None if it was never analyzed
+    """
+    fingerprint = media_cache.source_fingerprint(source)
+    if fingerprint in _analyses:
+        return _analyses[fingerprint]
+    path = _cache_path(fingerprint)
+    if not path or not path.exists():
+        return None
+    try:
+        values = json.loads(path.read_text())
+        if values.get('version') != ANALYSIS_VERSION:
+            return None
+        result = SourceAnalysis.from_dict(values)
+        signatures_path = path.with_suffix('.sig')
+        result.signatures = signatures_path.read_bytes() if signatures_path.exists() else b''
+    except (OSError, ValueError, TypeError) as e:
+        log.debug(f'Could not read analysis ({path}) : {e}')
+        return None
+    _analyses[fingerprint] = result
+    return result
+
+
+def store(result: SourceAnalysis) -> Path | None:
+    """
+    Keep result in memory and write it to the analysis cache, signatures go to a binary file next to the json
+    """
+    _analyses[result.fingerprint] = result
+    path = _cache_path(result.fingerprint)
+    if not path:
+        return None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # signatures first, a json without them is still a valid (older) analysis
+        if result.signatures:
+            _write(path.with_suffix('.sig'), result.signatures)
+        _write(path, json.dumps(result.to_dict()).encode())
+    except OSError as e:
+        log.debug(f'Could not write analysis ({path}) : {e}')
+        return None
+    return path
+
+
+def _peaks_filter(fps: float) -> str:
+    # peak level per frame duration of audio
+    samples = round(PEAK_SAMPLE_RATE / fps)
+    return (f'aresample={PEAK_SAMPLE_RATE},asetnsamples=n={samples}:p=0,'
+            f'astats=metadata=1:reset=1:measure_perchannel=none:measure_overall=Peak_level,'
+            f'ametadata@peaks=print:key=lavfi.astats.Overall.Peak_level')
+
+
+def _signatures_filter() -> str:
+    width, height = SIGNATURE_SIZE
+    return f'scale={width}:{height}:flags=area,format=yuv420p'
+
+
+# key frames carry no metadata, they are tagged so metadata=print logs them
+_KEYS_FILTER = "select='key',metadata=add:key=lavfi.key:value=1,metadata@keys=print:key=lavfi.key,nullsink"
+
+
+def analysis_command(source: str | Path, fps: float, thumbnails_dir: Path | None = None,
+                     settings: AnalysisSettings | None = None, signatures_path: Path | None = None,
+                     frame_range: tuple[int, int] | None = None) -> list[str]:
+    """
+    ffmpeg command decoding source once, every analysis is a branch of the filter graph and logs what it finds
+    (metadata filters named after the analysis), thumbnails are written to thumbnails_dir in the order they are
+    logged and signatures to signatures_path (raw frames)
+
+    Args:
+        frame_range: only decode these frames (start, end excluded), without key frames and audio peaks which belong
+            to the whole source
+    """
+    source = Path(source)
+    settings = settings or AnalysisSettings()
+    branches = ['scores', 'events'] + (['keys'] if not frame_range else []) + (['thumbs'] if thumbnails_dir else [])
+    branches += ['sigs'] if signatures_path else []
+    graph = [
+        f"[0:v:0]split={len(branches)}{''.join(f'[{branch}]' for branch in branches)}",
+        "[scores]select='gte(scene,0)',metadata@scores=print:key=lavfi.scene_score[scores_out]",
+        f'[events]blackdetect=d={settings.black_min_duration}:pix_th={settings.black_pixel_threshold},'
+        f'freezedetect=n={settings.freeze_noise}dB:d={settings.freeze_min_duration},nullsink',
+    ]
+    command = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'info']
+    if frame_range:
+        # half a frame early, timestamps of 23.976 sources don't land on whole frames
+        start, end = frame_range
+        command += ['-ss', f'{max(start - 0.5, 0) / fps:.6f}', '-t', f'{(end - start) / fps:.6f}']
+    else:
+        graph.append(f'[keys]{_KEYS_FILTER}')
+    command += ['-i', source.as_posix()]
+    # a filter graph needs an output, the scores branch always is one
+    outputs = ['-map', '[scores_out]', '-f', 'null', '-']
+    if thumbnails_dir:
+        graph.append(f"[thumbs]select='eq(n,0)+gt(scene,{CANDIDATE_SCORE})',metadata=add:key=lavfi.thumb:value=1,"
+                     f"metadata@thumbs=print:key=lavfi.thumb[thumbs_out]")
+        outputs += ['-map', '[thumbs_out]', '-fps_mode', 'passthrough', '-start_number', '0',
+                    thumbnails_dir.joinpath('%06d.jpg').as_posix()]
+    if signatures_path:
+        graph.append(f'[sigs]{_signatures_filter()}[sigs_out]')
+        outputs += ['-map', '[sigs_out]', '-fps_mode', 'passthrough', '-f', 'rawvideo', '-y',
+                    signatures_path.as_posix()]
+    if not frame_range:
+        # the optional map skips sources without audio
+        outputs += ['-map', '0:a:0?', '-af', _peaks_filter(fps), '-f', 'null', '-']
+    return command + ['-filter_complex', ';'.join(graph)] + outputs
+
+
+def signature_command(source: str | Path, fps: float, signatures_path: Path) -> list[str]:
+    """
+    ffmpeg command only writing signatures (and logging key frames and audio peaks), a lot lighter than the analysis
+    command : nothing but the decoding runs at full resolution
+    """
+    graph = [
+        "[0:v:0]split=2[sigs][keys]",
+        f'[sigs]{_signatures_filter()},metadata=add:key=lavfi.sig:value=1,metadata@sigs=print:key=lavfi.sig'
+        f'[sigs_out]',
+        f'[keys]{_KEYS_FILTER}',
+    ]
+    return ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'info', '-i', Path(source).as_posix(),
+            '-filter_complex', ';'.join(graph),
+            '-map', '[sigs_out]', '-fps_mode', 'passthrough', '-f', 'rawvideo', '-y', signatures_path.as_posix(),
+            '-map', '0:a:0?', '-af', _peaks_filter(fps), '-f', 'null', '-']
+
+
+def _time_value(line: str, key: str) -> float:
+    return float(line.split(key, 1)[1].split()[0])
+
+
+def parse_output(output: str, fps: float) -> dict[str, Any]:
+    """
+    Results logged by the analysis (or signature) command, frames are counted from the first decoded frame
+
+    Returns:
+        dict: SourceAnalysis fields (without fingerprint and thumbnail frames) and the logged thumbnail frames in
+            'thumbnails'
+    """
+    times: dict[str, list[float]] = {'scores': [], 'keys': [], 'peaks': [], 'thumbs': [], 'sigs': []}
+    scores, peaks, black, freeze = [], [], [], []
+    freeze_start = None
+    for line in output.splitlines():
+        match = _METADATA_LINE.match(line)
+        if match:
+            branch, text = match.groups()
+            if ' pts_time:' in text:
+                times.setdefault(branch, []).append(_time_value(text, 'pts_time:'))
+            elif branch == 'scores' and text.startswith('lavfi.scene_score='):
+                scores.append(float(text.split('=', 1)[1]))
+            elif branch == 'peaks' and '=' in text:
+                peaks.append(float(text.split('=', 1)[1]))
+        elif 'black_start:' in line:
+            black.append((_time_value(line, 'black_start:'), _time_value(line, 'black_end:')))
+        elif 'lavfi.freezedetect.freeze_start:' in line:
+            freeze_start = _time_value(line, 'freeze_start:')
+        elif 'lavfi.freezedetect.freeze_end:' in line and freeze_start is not None:
+            freeze.append((freeze_start, _time_value(line, 'freeze_end:')))
+            freeze_start = None
+
+    # sources may not start at 0, everything is counted from the first frame like -ss does
+    video_times = times['scores'] or times['sigs']
+    start_time = video_times[0] if video_times else 0.0
+
+    def to_frame(seconds: float) -> int:
+        # rounded, timestamps of 23.976 sources land just below whole frames
+        return round((seconds - start_time) * fps)
+
+    frames = len(video_times)
+    if freeze_start is not None:
+        # still frozen when the source ends
+        freeze.append((freeze_start, start_time + frames / fps))
+    audio_peaks = None
+    if peaks:
+        audio_peaks = [SILENCE_DB] * frames
+        for seconds, peak in zip(times['peaks'], peaks):
+            frame = to_frame(seconds)
+            if 0 <= frame < frames:
+                audio_peaks[frame] = max(audio_peaks[frame], round(max(peak, SILENCE_DB), 2))
+    return {
+        'fps': fps,
+        'frames': frames,
+        'scene_scores': [round(score, 6) for score in scores],
+        'black': [(to_frame(start), to_frame(end)) for start, end in black],
+        'freeze': [(to_frame(start), to_frame(end)) for start, end in freeze],
+        'key_frames': [to_frame(seconds) for seconds in times['keys']],
+        'audio_peaks': audio_peaks,
+        'thumbnails': [to_frame(seconds) for seconds in times['thumbs']],
+    }
+
+
+def thumbnail_key(source: Path, fps: float, frame: int) -> str:
+    """
+    Media cache key of the thumbnail of a shot of source starting on frame
+    """
+    # the thumbnail command only depends on the start of the shot
+    shot = ShotData.from_frames(index=0, fps=fps, source=source, start=frame, duration=1,
+                                _save_dir=Path(gettempdir()), auto_thumbnail=False)
+    return media_cache.media_key(source, shot.media_command('thumbnail')[0])
+
+
+def cache_thumbnails(source: Path, fps: float, frames: list[int | None], thumbnails_dir: Path) -> list[int]:
+    """
+    Add the analysis thumbnails (logged order = file order) to the media cache under the key of the thumbnail
+    command of a shot starting on their frame, None frames are left out
+
+    Returns:
+        list[int]: frames whose thumbnail got cached
+    """
+    cache = media_cache.get_cache()
+    cached = []
+    for i, frame in enumerate(frames):
+        path = thumbnails_dir.joinpath(f'{i:06d}.jpg')
+        if frame is None or not cache or not path.exists():
+            continue
+        if cache.put(thumbnail_key(source, fps, frame), path):
+            cached.append(frame)
+    return cached
+
+
+@trace.traced('analyze')
+def analyze(source: str | Path, fps: float, frames: int | None = None, use_cache: bool = True,
+            settings: AnalysisSettings | None = None,
+            progress: Callable[[jobs.AggregateProgress], None] | None = None) -> SourceAnalysis:
+    """
+    Analysis of source, read from the analysis cache or made with a single decode of the source. progress gets the
+    decoding progress (seconds decoded, speed and ETA) while it runs
+
+    Raises:
+        JobError, OSError: the source could not be decoded
+    """
+    source = Path(source)
+    settings = settings or AnalysisSettings()
+    if use_cache:
+        cached = load(source)
+        if cached and cached.fps == fps and cached.settings == asdict(settings):
+            log.debug(f'Analysis cache hit ({source.name})')
+            return cached
+
+    duration = frames / fps if frames and fps else None
+    tracker = jobs.ProgressTracker()
+    # thumbnails are only worth writing when the media cache can hand them over to shots
+    with TemporaryDirectory(prefix='wolverine_analysis_') as temp_dir:
+        signatures_path = Path(temp_dir).joinpath('signatures.raw')
+        thumbnails_dir = Path(temp_dir).joinpath('thumbnails') if media_cache.get_cache() else None
+        if thumbnails_dir:
+            thumbnails_dir.mkdir()
+        command = analysis_command(source, fps, thumbnails_dir, settings, signatures_path)
+        log.debug(f'Running Analysis Command : {" ".join(command)}')
+        future = jobs.get_engine().submit(command, resource=jobs.DECODE, duration=duration,
+                                          progress=tracker.job('analyze', duration))
+        for done in tracker.as_completed([future], progress):
+            output = done.result().stderr.decode(errors='replace')
+        values = parse_output(output, fps)
+        thumbnails = values.pop('thumbnails')
+        thumbnail_frames = cache_thumbnails(source, fps, thumbnails, thumbnails_dir) if thumbnails_dir else []
+        signatures = signatures_path.read_bytes() if signatures_path.exists() else b''
+
+    if not values['frames']:
+        raise OSError(f'No video frames decoded from ({source})')
+    result = SourceAnalysis(fingerprint=media_cache.source_fingerprint(source), thumbnail_frames=thumbnail_frames,
+                            settings=asdict(settings), signatures=signatures, **values)
+    if frames and result.frames != frames:
+        log.debug(f'{result.frames} frames decoded from ({source.name}), {frames} expected')
+    store(result)
+    return result
+
+
+def coverage(ranges: Iterable[tuple[int, int]], start: int, end: int) -> float:
+    """
+    Ratio of the frames from start to end (excluded) inside ranges (disjoint, end excluded)
+    """
+    if end <= start:
+        return 0.0
+    covered = sum(max(0, min(end, range_end) - max(start, range_start)) for range_start, range_end in ranges)
+    return covered / (end - start)
+
+
+def flag_ignored(shots: list[ShotData], result: SourceAnalysis, rules: IgnoreRules | None = None) -> list[ShotData]:
+    """
+    Flag shots (sorted) matching rules as ignored and disabled, exports don't extract media for them
+
+    Returns:
+        list[ShotData]: flagged shots
+    """
+    rules = rules or IgnoreRules()
+    black = [bool(rules.black) and coverage(result.black, s.start_frame, s.start_frame + s.duration) >= rules.black
+             for s in shots]
+    flagged = []
+    for i, shot in enumerate(shots):
+        frozen = coverage(result.freeze, shot.start_frame, shot.start_frame + shot.duration)
+        slate = bool(rules.slate) and frozen >= rules.slate and i + 1 < len(shots) and black[i + 1]
+        if black[i] or slate or (rules.freeze and frozen >= rules.freeze):
+            shot.ignored = True
+            shot.enabled = False
+            flagged.append(shot)
+    return flagged
@@ -0,0 +1,225 @@
+"""
+Auto-save writer, saves are written on a background thread as an append-only journal of changed shots which gets
+compacted into a full snapshot (written atomically) every now and then
+
+Journal entries key shots by a stable id (not their row, which every add or remove shifts) and only hold the fields
+that changed, renumbering shots costs a few bytes per shot. Snapshots get a new generation every time they are
+written and entries carry the generation they apply to : entries left by a crash in the middle of a compaction are
+skipped instead of being replayed onto the newer snapshot.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from uuid import uuid4
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+from wolverine import log
+from wolverine.serialization import dumps, loads
+
+JOURNAL_SUFFIX = '.journal'
+COMPACT_EVERY = 100
+META_KEY = 'auto_save'  # snapshot generation and shot ids, only used by the journal
+
+
+def journal_path(save_path: str | Path) -> Path:
+    save_path = Path(save_path)
+    return save_path.with_name(f'{save_path.name}{JOURNAL_SUFFIX}')
+
+
+def atomic_write_text(file_path: str | Path, text: str) -> None:
+    """
+    Write text to a temp file next to file_path then rename it over file_path, readers either see the old or the new
+    content, never a partially written file
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile('w', dir=file_path.parent, prefix=f'.{file_path.name}.', suffix='.tmp',
+                            encoding='utf-8', delete=False) as tmp_file:
+        tmp_file.write(text)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_file.name, file_path)
+
+
+def read_auto_save(save_path: str | Path) -> dict[str, Any]:
+    """
+    Read an auto-save snapshot and replay its journal on top of it
+
+    Returns:
+        dict: save data, empty if no snapshot exists
+    """
+    save_path = Path(save_path)
+    if not save_path.exists():
+        return {}
+    save_data = loads(save_path.read_text())
+    save_data.setdefault('shots', [])
+    meta = save_data.pop(META_KEY, None)
+
+    save_journal = journal_path(save_path)
+    if not save_journal.exists():
+        return save_data
+    if meta:
+        rows = dict(zip(meta['shot_ids'], save_data['shots']))
+        order = list(meta['shot_ids'])
+    for line in save_journal.read_text().splitlines():
+        try:
+            entry = loads(line)
+        except ValueError:
+            # last entry was only partially written (crash during append), everything before it is still valid
+            log.warning(f'Skipping truncated auto-save journal entry in ({save_journal})')
+            break
+        if not meta:
+            _apply_row_entry(save_data, entry)
+        elif entry.get('generation') == meta['generation']:
+            order = _apply_journal_entry(save_data, rows, order, entry)
+    if meta:
+        save_data['shots'] = [rows[shot_id] for shot_id in order]
+    return save_data
+
+
+def _apply_journal_entry(save_data: dict[str, Any], rows: dict[str, Any], order: list[str],
+                         entry: dict[str, Any]) -> list[str]:
+    save_data.update(entry.get('header', {}))
+    rows.update(entry.get('shots', {}))
+    for shot_id, fields in entry.get('fields', {}).items():
+        row = rows[shot_id]
+        for field_key, value in fields.items():
+            row[int(field_key) if isinstance(row, list) else field_key] = value
+    return entry.get('order', order)
+
+
+def _apply_row_entry(save_data: dict[str, Any], entry: dict[str, Any]) -> None:
+    # journals written before shot ids, keyed by row
+    save_data.update(entry.get('header', {}))
+    shots = save_data['shots']
+    length = entry.get('length', len(shots))
+    del shots[length:]
+    shots.extend([None] * (length - len(shots)))
+    for index, shot_dict in entry.get('shots', {}).items():
+        shots[int(index)] = shot_dict
+
+
+def _changed_fields(previous: list | dict, current: list | dict) -> dict[str, Any] | None:
+    """
+    Fields of a shot row (list) or dict that changed, None when they can't be compared field by field
+    """
+    if isinstance(previous, list) and isinstance(current, list) and len(previous) == len(current):
+        return {str(i): value for i, (old, value) in enumerate(zip(previous, current)) if old != value}
+    if isinstance(previous, dict) and isinstance(current, dict) and previous.keys() == current.keys():
+        return {key: value for key, value in current.items() if previous[key] != value}
+    return None
+
+
+class AutoSaver:
+    """
+    Coalescing background auto-save writer
+
+    Calls to save() only hand the latest save data over to a writer thread, if several saves are requested while a
+    write is in progress only the last one is written. The first write for a path is a full snapshot, following
+    writes only append the shots that changed to a journal, the journal is compacted into a new snapshot every
+    `compact_every` entries.
+
+    Shots are told apart by the shot_ids given to save() (eg: id() of each shot), without them by row.
+    """
+
+    def __init__(self, compact_every: int = COMPACT_EVERY) -> None:
+        self.compact_every = compact_every
+
+        self._condition = threading.Condition()
+        self._pending: tuple[Path, dict[str, Any], list[Any] | None] | None = None
+        self._writing = False
+        self._thread: threading.Thread | None = None
+
+        self._saved_path: Path | None = None
+        self._saved_header: dict[str, Any] = {}
+        self._saved_rows: dict[str, Any] = {}
+        self._saved_order: list[str] = []
+        self._generation = ''
+        self._journal_entries = 0
+
+    def save(self, save_path: str | Path, save_data: dict[str, Any], shot_ids: list[Any] | None = None) -> None:
+        with self._condition:
+            self._pending = (Path(save_path), save_data, shot_ids)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name='wolverine-autosave', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait for pending saves to be written
+
+        Returns:
+            bool: False if timeout was reached before everything was written
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._pending is not None, timeout=5.0):
+                    # idle, let the thread die, save() will start a new one
+                    self._thread = None
+                    return
+                save_path, save_data, shot_ids = self._pending
+                self._pending = None
+                self._writing = True
+            try:
+                self._write(save_path, save_data, shot_ids)
+            except Exception as e:
+                log.critical(f'Could not write auto-save ({save_path})')
+                log.critical(e)
+                # force a full snapshot next time, the journal might not match what we think was written
+                self._saved_path = None
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, save_path: Path, save_data: dict[str, Any], shot_ids: list[Any] | None = None) -> None:
+        header = {k: v for k, v in save_data.items() if k != 'shots'}
+        shots = save_data.get('shots', [])
+        # json object keys are strings
+        order = [str(shot_id) for shot_id in shot_ids] if shot_ids is not None else [str(i) for i in range(len(shots))]
+        rows = dict(zip(order, shots))
+        save_journal = journal_path(save_path)
+
+        if save_path != self._saved_path or self._journal_entries >= self.compact_every or not save_path.exists():
+            # entries of the previous generation left in the journal (crash before the unlink) are skipped
+            self._generation = uuid4().hex
+            atomic_write_text(save_path, dumps({**save_data, META_KEY: {'generation': self._generation,
+                                                                        'shot_ids': order}}))
+            save_journal.unlink(missing_ok=True)
+            self._saved_path = save_path
+            self._journal_entries = 0
+        else:
+            entry = {}
+            changed_header = {k: v for k, v in header.items() if self._saved_header.get(k) != v}
+            if changed_header:
+                entry['header'] = changed_header
+            if order != self._saved_order:
+                entry['order'] = order
+            for shot_id, row in rows.items():
+                previous = self._saved_rows.get(shot_id)
+                if previous == row:
+                    continue
+                fields = _changed_fields(previous, row) if previous is not None else None
+                if fields is None:
+                    entry.setdefault('shots', {})[shot_id] = row
+                else:
+                    entry.setdefault('fields', {})[shot_id] = fields
+            if not entry:
+                return
+            entry['generation'] = self._generation
+            with save_journal.open('a', encoding='utf-8') as journal_file:
+                journal_file.write(dumps(entry) + '\n')
+            self._journal_entries += 1
+
+        self._saved_header = header
+        # rows are compared with the next save, copies in case the caller edits them in place
+        self._saved_rows = {shot_id: list(row) if isinstance(row, list) else dict(row) for shot_id, row in rows.items()}
+        self._saved_order = order
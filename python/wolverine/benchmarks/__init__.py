@@ -0,0 +1,3 @@
+"""
+Benchmarks, run them as modules (eg: python -m wolverine.benchmarks.serialization)
+"""
@@ -0,0 +1,116 @@
+"""
+Deterministic synthetic sources for benchmarks, made with ffmpeg's lavfi sources (no media shipped with the repo)
+
+Every shot is a solid colour with a small moving test pattern and a sine tone, consecutive shots never share a colour
+so each cut is a hard scene change at a known frame. Only one segment per colour is encoded, the source is the
+segments concatenated (stream copy) so even 10,000 shot sources take seconds to make.
+
+    source = make_source(nb_shots=100, shot_duration=24, resolution=(1280, 720), codec='libx264')
+    source.cuts  # [0, 24, 48, ...]
+"""
+from __future__ import annotations
+
+import hashlib
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass
+from tempfile import gettempdir, TemporaryDirectory
+
+from wolverine.shots import ShotData
+
+FIXTURES_DIR = Path(gettempdir()).joinpath('wolverine_bench/fixtures')
+PALETTE = ['0xE03020', '0x2040C0', '0xF0D020', '0x108040', '0xF0F0F0', '0x602080']
+CODEC_OPTIONS = {
+    'libx264': ['-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'prores_ks': ['-profile:v', '0', '-pix_fmt', 'yuv422p10le'],
+    'mjpeg': ['-q:v', '3', '-pix_fmt', 'yuvj420p'],
+}
+
+
+@dataclass
+class SyntheticSource:
+    path: Path
+    fps: float
+    shot_duration: int
+    nb_shots: int
+    resolution: tuple[int, int]
+    codec: str
+
+    @property
+    def frames(self) -> int:
+        return self.nb_shots * self.shot_duration
+
+    @property
+    def cuts(self) -> list[int]:
+        """
+        First frame of every shot
+        """
+        return [i * self.shot_duration for i in range(self.nb_shots)]
+
+    def shots(self) -> list[ShotData]:
+        """
+        Shots as detection should find them
+        """
+        return [ShotData.from_frames(index=(i + 1) * 10, fps=self.fps, source=self.path, start=start,
+                                     duration=self.shot_duration, auto_thumbnail=False)
+                for i, start in enumerate(self.cuts)]
+
+
+def _segment_command(colour: str, tone: int, output_path: Path, fps: float, shot_duration: int,
+                     resolution: tuple[int, int], codec: str) -> list[str]:
+    width, height = resolution
+    duration = shot_duration / fps
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'color=c={colour}:s={width}x{height}:r={fps}:d={duration}',
+        '-f', 'lavfi', '-i', f'testsrc2=s={width // 4}x{height // 4}:r={fps}:d={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency={tone}:sample_rate=22050:d={duration}',
+        '-filter_complex', "[0][1]overlay=x='mod(n*8,W-w)':y=H/8[v]",
+        '-map', '[v]', '-map', '2', '-frames:v', str(shot_duration),
+        '-c:v', codec, *CODEC_OPTIONS.get(codec, []), '-g', str(shot_duration), '-c:a', 'pcm_s16le',
+        output_path.as_posix(),
+    ]
+
+
+def make_source(nb_shots: int = 100, shot_duration: int = 24, fps: float = 24.0,
+                resolution: tuple[int, int] = (1280, 720), codec: str = 'libx264',
+                directory: str | Path = FIXTURES_DIR) -> SyntheticSource:
+    """
+    Make (or reuse, they are kept in directory) a source of nb_shots shots of shot_duration frames
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    settings = f'{nb_shots}_{shot_duration}_{fps}_{resolution[0]}x{resolution[1]}_{codec}'
+    name = f'synthetic_{hashlib.sha1(settings.encode()).hexdigest()[:10]}'
+    source = SyntheticSource(path=directory.joinpath(f'{name}.mov'), fps=fps, shot_duration=shot_duration,
+                             nb_shots=nb_shots, resolution=resolution, codec=codec)
+    if source.path.exists():
+        return source
+
+    with TemporaryDirectory(dir=directory) as temp_dir:
+        temp_dir = Path(temp_dir)
+        colours = PALETTE[:min(len(PALETTE), max(nb_shots, 2))]
+        segments = []
+        for i, colour in enumerate(colours):
+            segment = temp_dir.joinpath(f'segment_{i}.mov')
+            subprocess.run(_segment_command(colour, 220 * (i + 1), segment, fps, shot_duration, resolution, codec),
+                           check=True)
+            segments.append(segment)
+        concat_list = temp_dir.joinpath('segments.ffconcat')
+        lines = ['ffconcat version 1.0'] + [f"file '{segments[i % len(segments)].name}'" for i in range(nb_shots)]
+        concat_list.write_text('\n'.join(lines))
+        partial_path = temp_dir.joinpath(source.path.name)
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0',
+                        '-i', concat_list.as_posix(), '-c', 'copy', partial_path.as_posix()], check=True)
+        partial_path.replace(source.path)
+    return source
+
+
+def make_shots(nb_shots: int, fps: float = 24.0, shot_duration: int = 48,
+               source: str | Path = FIXTURES_DIR.joinpath('source.mov')) -> list[ShotData]:
+    """
+    Shots of a source that doesn't exist, for benchmarks that don't touch media
+    """
+    return [ShotData.from_frames(index=(i + 1) * 10, fps=fps, source=Path(source), start=i * shot_duration,
+                                 duration=shot_duration, auto_thumbnail=False)
+            for i in range(nb_shots)]
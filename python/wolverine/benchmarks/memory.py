@@ -0,0 +1,108 @@
+"""
+Leak check : repeat edit cycles (add a shot, move a cut, change the prefix, delete a shot, sort) and check that live
+objects and traced memory stay flat
+
+    python -m wolverine.benchmarks.memory
+    python -m wolverine.benchmarks.memory --shots 1000 --cycles 100
+    python -m wolverine.benchmarks.memory --ui        # same edits through the offscreen UI (see benchmarks.ui)
+
+A few warm up cycles fill caches first, then object counts (ShotData, OTIO clips, tracks and timelines, Qt widgets,
+scenes and graphics items) and tracemalloc snapshots are compared before and after --cycles cycles. The exit code is
+1 when an object count grew or traced memory grew by more than --max-growth KB per cycle, the allocation sites that
+grew the most are printed.
+"""
+from __future__ import annotations
+
+import sys
+import argparse
+from typing import Callable
+
+from wolverine import memory
+from wolverine import session
+from wolverine import utils
+from wolverine.benchmarks import fixtures
+
+WARMUP_CYCLES = 5
+
+
+def session_cycle(wolverine_session: session.WolverineSession) -> Callable[[int], None]:
+    def cycle(i: int) -> None:
+        shots = wolverine_session.shots
+        shot = shots[(i * 37) % len(shots)]
+        wolverine_session.add_shot(shot.start_frame + shot.duration // 2)
+        shot = shots[(i * 53) % len(shots)]
+        if shot.start_frame:
+            wolverine_session.move_shot_start(shot.start_frame, shot.start_frame + 1)
+        wolverine_session.set_prefix(f'p{i % 2}_')
+        wolverine_session.remove_shot(shots[(i * 71) % len(shots)].start_frame)
+        wolverine_session.sort_shots()
+        # thumbnails of edited shots are part of the cycle
+        wolverine_session.wait_thumbnails()
+    return cycle
+
+
+def make_session(args: argparse.Namespace) -> tuple[Callable[[int], None], Callable[[], int], Callable[[], None]]:
+    source = fixtures.make_source(args.shots, args.shot_duration, resolution=(320, 180))
+    wolverine_session = session.WolverineSession()
+    wolverine_session.source = source.path
+    wolverine_session.probe_data = utils.FFProbe(index=0, source=source.path, resolution=source.resolution,
+                                                 fps=source.fps, duration=source.frames / source.fps,
+                                                 frames=source.frames)
+    wolverine_session.set_shots(source.shots())
+    return session_cycle(wolverine_session), lambda: len(wolverine_session.shots), wolverine_session.cancel_thumbnails
+
+
+def make_ui(args: argparse.Namespace) -> tuple[Callable[[int], None], Callable[[], int], Callable[[], None]]:
+    from wolverine.benchmarks.ui import UIDriver
+
+    driver = UIDriver(args.shots, args.shot_duration)
+    driver.load()
+    driver.process_events()
+
+    def cycle(_: int) -> None:
+        for edit in (driver.add_marker, driver.drag, driver.prefix, driver.delete, driver.sort):
+            edit()
+            driver.process_events()
+    return cycle, lambda: len(driver.window.shots), driver.close
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shots', type=int, default=200, help='Shots of the edited session')
+    parser.add_argument('--shot-duration', type=int, default=24, help='Frames per synthetic shot')
+    parser.add_argument('--cycles', type=int, default=50, help='Edit cycles between the two checkpoints')
+    parser.add_argument('--max-growth', type=float, default=1.0, help='Allowed traced memory growth per cycle (KB)')
+    parser.add_argument('--ui', action='store_true', help='Edit through the offscreen UI instead of the session')
+    args = parser.parse_args(argv)
+
+    cycle, live_shots, close = make_ui(args) if args.ui else make_session(args)
+    # traced during warm up too : allocations made once (caches, lazy imports) are in both checkpoints
+    memory.start()
+    for i in range(WARMUP_CYCLES):
+        cycle(i)
+    before, shots_before = memory.Checkpoint(), live_shots()
+    for i in range(WARMUP_CYCLES, WARMUP_CYCLES + args.cycles):
+        cycle(i)
+    after, shots_after = memory.Checkpoint(), live_shots()
+    close()
+    memory.stop()
+
+    print(after.diff(before))
+    print(f'{"live shots":<24}{shots_before:>10}{shots_after:>10}{shots_after - shots_before:>+10}')
+    growth = after.growth(before)
+    # edits that got skipped (a marker added on an existing cut) change the number of shots, those are alive
+    for name in ('ShotData', 'Clip'):
+        growth[name] = growth.get(name, 0) - (shots_after - shots_before)
+    leaks = [name for name, delta in growth.items() if name != 'traced' and delta > 0]
+    per_cycle = growth.get('traced', 0) / args.cycles / 1024
+    print(f'\n{args.cycles} cycles : {per_cycle:+.2f} KB traced per cycle')
+    if per_cycle > args.max_growth:
+        leaks.append('traced')
+    if leaks:
+        print(f'Leaks : {", ".join(leaks)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
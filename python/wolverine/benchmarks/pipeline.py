@@ -0,0 +1,217 @@
+"""
+Time every step of the pipeline on synthetic sources (see fixtures) at several scales and compare against a baseline
+
+    python -m wolverine.benchmarks.pipeline
+    python -m wolverine.benchmarks.pipeline --scales 10 100 1000 10000 --media-scales 10 100 1000
+    python -m wolverine.benchmarks.pipeline --save-baseline baseline.json
+    python -m wolverine.benchmarks.pipeline --baseline baseline.json --tolerance 0.15
+
+Media steps (probe, detect, thumbnails, movies, audio) run ffmpeg on a source of that many shots, they only run at
+--media-scales as making and decoding 10,000 shot sources takes a while. The others (serialization, timeline, sort)
+run at every scale. Steps whose tools are missing are skipped. With --baseline, steps slower than the baseline by
+more than the tolerance are reported as regressions and the exit code is 1.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from shutil import which
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from typing import Any, Callable
+
+from opentimelineio import adapters
+
+from wolverine import utils
+from wolverine import analysis
+from wolverine import export
+from wolverine import session
+from wolverine import media_cache
+from wolverine import serialization
+from wolverine.benchmarks import fixtures
+from wolverine.benchmarks.serialization import timed
+
+BASELINE_VERSION = 1
+MEDIA_STEPS = ('probe', 'detect', 'thumbnails', 'movies', 'audio')
+STEPS = ('serialization', 'timeline', 'sort')
+DEFAULT_SCALES = (10, 100, 1000, 10000)
+DEFAULT_MEDIA_SCALES = (10, 100)
+MIN_DELTA = 0.005  # seconds, differences below it are noise whatever the ratio
+
+
+def _export_step(source: fixtures.SyntheticSource, media: str, workers: int | None) -> Callable[[], Any]:
+    shots = source.shots()
+
+    def run() -> None:
+        # a new directory every time, the export manifest would skip everything otherwise
+        with TemporaryDirectory(prefix='wolverine_bench_') as export_dir:
+            export.export_shots(shots, export_dir, media=[media], workers=workers)
+    return run
+
+
+def _detect_step(source: fixtures.SyntheticSource) -> Callable[[], Any]:
+    def run() -> list[int]:
+        detected = utils.probe_file_shots(source.path, source.fps, source.frames, detection_threshold=20,
+                                          auto_thumbnail=False, use_cache=False)
+        nb_shots = next(detected)
+        return [shot.start_frame for shot in detected] if nb_shots else []
+    return run
+
+
+def _sort_step(nb_shots: int) -> Callable[[], Any]:
+    shots = fixtures.make_shots(nb_shots)
+    random.Random(nb_shots).shuffle(shots)
+    wolverine_session = session.WolverineSession()
+
+    def run() -> None:
+        wolverine_session.set_shots(shots)
+    return run
+
+
+def media_steps(nb_shots: int, args: argparse.Namespace) -> dict[str, float]:
+    if not which('ffmpeg'):
+        print(f'  [{nb_shots}] ffmpeg not found, skipping media steps')
+        return {}
+    source = fixtures.make_source(nb_shots, args.shot_duration, args.fps, tuple(args.resolution), args.codec)
+    steps: dict[str, Callable[[], Any]] = {}
+    if which('ffprobe'):
+        steps['probe'] = lambda: utils.probe_file(source.path)
+    else:
+        print(f'  [{nb_shots}] ffprobe not found, skipping probe')
+    steps['detect'] = _detect_step(source)
+    for media in export.SHOT_MEDIA:
+        steps[media] = _export_step(source, media, args.workers)
+
+    results = {}
+    for name, step in steps.items():
+        if name not in args.steps:
+            continue
+        results[f'{name}@{nb_shots}'], value = timed(step, args.repeat)
+        if name == 'detect' and value != source.cuts:
+            missed = len(set(source.cuts) - set(value))
+            extra = len(set(value) - set(source.cuts))
+            print(f'  [{nb_shots}] detection mismatch : {missed} cuts missed, {extra} extra cuts')
+        print(f'  {name:<14}{nb_shots:>7} shots {results[f"{name}@{nb_shots}"] * 1000:10.1f} ms')
+    return results
+
+
+def steps(nb_shots: int, args: argparse.Namespace) -> dict[str, float]:
+    shots = fixtures.make_shots(nb_shots)
+    schema = serialization.shots_schema()
+    all_steps = {
+        'serialization': lambda: serialization.load_shots(serialization.loads(
+            serialization.dumps(serialization.dump_shots(shots))), schema),
+        'timeline': lambda: adapters.write_to_string(export.build_timeline(shots, shots[0].source),
+                                                     adapter_name='otio_json'),
+        'sort': _sort_step(nb_shots),
+    }
+    results = {}
+    for name, step in all_steps.items():
+        if name not in args.steps:
+            continue
+        results[f'{name}@{nb_shots}'], _ = timed(step, args.repeat)
+        print(f'  {name:<14}{nb_shots:>7} shots {results[f"{name}@{nb_shots}"] * 1000:10.1f} ms')
+    return results
+
+
+def machine_info() -> dict[str, Any]:
+    ffmpeg_version = ''
+    if which('ffmpeg'):
+        ffmpeg_version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.split('\n')[0]
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg_version,
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    previous_cache, previous_analysis_dir = media_cache.get_cache(), analysis.get_directory()
+    # every extraction has to run, not be linked from the cache of a previous run
+    media_cache.set_cache(None)
+    analysis.set_directory(None)
+    results = {}
+    try:
+        for nb_shots in sorted(set(args.scales) | set(args.media_scales)):
+            if nb_shots in args.media_scales:
+                results.update(media_steps(nb_shots, args))
+            if nb_shots in args.scales:
+                results.update(steps(nb_shots, args))
+    finally:
+        media_cache.set_cache(previous_cache)
+        analysis.set_directory(previous_analysis_dir)
+    return {
+        'version': BASELINE_VERSION,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'settings': {k: getattr(args, k) for k in ['shot_duration', 'fps', 'resolution', 'codec', 'workers',
+                                                    'repeat']},
+        'results': results,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """
+    Print current timings against the baseline ones
+
+    Returns:
+        list[str]: steps slower than the baseline by more than tolerance (a ratio, 0.1 = 10%)
+    """
+    if baseline.get('settings') != report['settings']:
+        print(f'Warning : baseline settings differ ({baseline.get("settings")})')
+    regressions = []
+    print(f'\n{"step":<24}{"baseline":>12}{"current":>12}{"change":>10}')
+    for key, current in report['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None:
+            print(f'{key:<24}{"-":>12}{current * 1000:10.1f}ms{"new":>10}')
+            continue
+        change = (current - previous) / previous if previous else 0.0
+        regression = change > tolerance and current - previous > MIN_DELTA
+        if regression:
+            regressions.append(key)
+        print(f'{key:<24}{previous * 1000:10.1f}ms{current * 1000:10.1f}ms{change:+9.0%}{" !" if regression else ""}')
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='*', default=list(DEFAULT_SCALES),
+                        help='Numbers of shots for serialization, timeline and sort')
+    parser.add_argument('--media-scales', type=int, nargs='*', default=list(DEFAULT_MEDIA_SCALES),
+                        help='Numbers of shots of the synthetic sources used by media steps')
+    parser.add_argument('--steps', nargs='*', default=list(MEDIA_STEPS + STEPS), choices=MEDIA_STEPS + STEPS)
+    parser.add_argument('--shot-duration', type=int, default=24, help='Frames per synthetic shot')
+    parser.add_argument('--fps', type=float, default=24.0)
+    parser.add_argument('--resolution', type=int, nargs=2, default=[1280, 720], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--codec', default='libx264', help='Video codec of synthetic sources')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel ffmpeg processes of media exports')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per step, the best one is kept')
+    parser.add_argument('--baseline', type=Path, help='Baseline json to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed slow down ratio (0.1 = 10%%)')
+    parser.add_argument('--save-baseline', type=Path, help='Write results as a baseline json')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+        print(f'Baseline written to ({args.save_baseline})')
+    if not args.baseline:
+        return 0
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} regressions : {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Compare the legacy dataclasses.asdict based shot (de)serialization with the row serializer
+
+    python -m wolverine.benchmarks.serialization --shots 10000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from time import perf_counter
+from pathlib import Path
+from copy import deepcopy
+from typing import Any, Callable
+
+from opentimelineio import opentime
+
+from wolverine import serialization
+from wolverine.shots import ShotData
+from wolverine.benchmarks.fixtures import make_shots
+
+
+LEGACY_FIELDS = ('index', 'fps', 'source', 'range', 'new_start', 'thumbnail', 'movie', 'audio', 'prefix', 'enabled',
+                 'ignored', '_otio_clip', '_update_otio', '_save_dir')
+
+
+def legacy_to_dict(shot: ShotData) -> dict[str, Any]:
+    # what ShotData.to_dict did through dataclasses.asdict: deep-copy every field (private ones included) then filter
+    shot_dict = {}
+    for k in LEGACY_FIELDS:
+        v = deepcopy(getattr(shot, k))
+        if k.startswith('_'):
+            continue
+        if isinstance(v, Path):
+            v = v.as_posix()
+        if isinstance(v, opentime.TimeRange):
+            v = {'start_time': v.start_time.to_frames(), 'duration': v.duration.to_frames()}
+        shot_dict[k] = v
+    return shot_dict
+
+
+def timed(func: Callable[[], Any], repeat: int = 3) -> tuple[float, Any]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+
+def run(nb_shots: int = 10000, repeat: int = 3) -> dict[str, float]:
+    shot_list = make_shots(nb_shots)
+    # make sure the otio clips exist, they are what makes asdict expensive in a real session
+    for shot in shot_list:
+        shot._otio_clip = shot.otio_clip
+
+    legacy_dump, legacy_text = timed(lambda: json.dumps([legacy_to_dict(s) for s in shot_list]), repeat)
+    rows_dump, rows_text = timed(lambda: serialization.dumps(serialization.dump_shots(shot_list)), repeat)
+    legacy_load, _ = timed(lambda: [ShotData.from_dict(d) for d in json.loads(legacy_text)], repeat)
+    rows_load, _ = timed(lambda: serialization.load_shots(serialization.loads(rows_text),
+                                                          serialization.shots_schema()), repeat)
+    return {
+        'legacy_dump': legacy_dump,
+        'rows_dump': rows_dump,
+        'legacy_load': legacy_load,
+        'rows_load': rows_load,
+        'legacy_size': len(legacy_text),
+        'rows_size': len(rows_text),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shots', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    res = run(args.shots, args.repeat)
+    print(f'{args.shots} shots (orjson: {"yes" if serialization.orjson else "no"})')
+    print(f'  dump : {res["legacy_dump"] * 1000:8.1f} ms -> {res["rows_dump"] * 1000:8.1f} ms '
+          f'(x{res["legacy_dump"] / res["rows_dump"]:.1f})')
+    print(f'  load : {res["legacy_load"] * 1000:8.1f} ms -> {res["rows_load"] * 1000:8.1f} ms '
+          f'(x{res["legacy_load"] / res["rows_load"]:.1f})')
+    print(f'  size : {res["legacy_size"] / 1024:8.1f} KB -> {res["rows_size"] / 1024:8.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
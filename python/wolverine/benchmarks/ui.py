@@ -0,0 +1,257 @@
+"""
+Drive the UI offscreen with sessions of synthetic shots and time scripted edits, no video or mpv needed
+
+    python -m wolverine.benchmarks.ui
+    python -m wolverine.benchmarks.ui --scales 100 1000 10000 --edits 20
+    python -m wolverine.benchmarks.ui --save-baseline ui_baseline.json
+    python -m wolverine.benchmarks.ui --baseline ui_baseline.json --tolerance 0.2
+
+Every scale runs in its own process (peak memory is per process) : the session is loaded with that many shots then
+each edit (add marker, drag a marker, delete, prefix change, sort, scrub, playback) is done --edits times the way the
+UI signals would do it. Latency is the time from the edit to the end of the events it triggered, frame time the time
+a full repaint of the window takes right after. p50, p95 and max are printed, p95 latencies are compared against the
+baseline (see pipeline.compare), peak RSS is reported alongside.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from math import ceil
+from time import perf_counter
+from pathlib import Path
+from datetime import datetime
+from tempfile import gettempdir
+from typing import Any, Callable
+
+# before Qt gets imported : no display needed, auto-saves and config stay out of the user prefs
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('WOLVERINE_PREFS_PATH', Path(gettempdir()).joinpath('wolverine_bench/prefs').as_posix())
+
+from opentimelineio import opentime, schema
+
+from wolverine import utils
+from wolverine.benchmarks import fixtures
+from wolverine.benchmarks.pipeline import BASELINE_VERSION, compare, machine_info
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+EDITS = ('load', 'add_marker', 'drag', 'delete', 'prefix', 'sort', 'scrub', 'playback')
+DEFAULT_SCALES = (100, 1000, 10000)
+WINDOW_SIZE = (1600, 900)
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """
+    Nearest rank percentile (ratio between 0 and 1)
+    """
+    if not values:
+        return 0.0
+    return sorted(values)[max(0, ceil(ratio * len(values)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    if not resource:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class UIDriver:
+    """
+    WolverineUI without a player, fed a session of synthetic shots, edits go through the same signals user actions
+    emit
+    """
+
+    def __init__(self, nb_shots: int, shot_duration: int = 48, fps: float = 24.0) -> None:
+        # only scale worker processes need Qt
+        from qt_py_tools.Qt import QtWidgets
+        from wolverine.ui import WolverineUI
+
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+        self.window = WolverineUI(player=False)
+        self.window.resize(*WINDOW_SIZE)
+        self.window.show()
+        self.fps = fps
+        self.shots = fixtures.make_shots(nb_shots, fps=fps, shot_duration=shot_duration)
+        frames = nb_shots * shot_duration
+        session = self.window.session
+        session.source = self.shots[0].source
+        session.probe_data = utils.FFProbe(index=0, source=session.source, resolution=(1920, 1080), fps=fps,
+                                           duration=frames / fps, frames=frames)
+        self._edit_index = 0
+
+    def process_events(self) -> None:
+        from qt_py_tools.Qt import QtCore
+
+        self.app.processEvents()
+        # processEvents leaves deleteLater calls to the main event loop, there is none here
+        self.app.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+
+    def frame_time(self) -> float:
+        start = perf_counter()
+        self.window.repaint()
+        return perf_counter() - start
+
+    def _shot(self) -> Any:
+        # walk through the sequence so edits don't pile up on the same shots
+        shots = self.window.shots
+        self._edit_index += 1
+        return shots[(self._edit_index * 7919) % len(shots)]
+
+    def load(self) -> None:
+        self.window.session.set_shots(self.shots)
+
+    def add_marker(self) -> None:
+        shot = self._shot()
+        if shot.duration > 2:
+            self.window._otio_view.marker_added.emit(shot.start_frame + shot.duration // 2)
+
+    def drag(self) -> None:
+        shot = self._shot()
+        if shot.start_frame == 0 or shot.duration < 4:
+            return
+        marker = schema.Marker(marked_range=opentime.TimeRange(opentime.from_frames(shot.start_frame, self.fps),
+                                                               opentime.from_frames(1, self.fps)))
+        self.window._otio_view.marker_moved.emit(marker, shot.start_frame + 2)
+
+    def delete(self) -> None:
+        if len(self.window.shots) > 2:
+            self.window._otio_view.marker_removed.emit(None, self._shot().start_frame)
+
+    def prefix(self) -> None:
+        shots_panel = self.window._shots_panel_lw
+        shots_panel.prefix = f'p{self._edit_index % 2}_'
+        self._edit_index += 1
+        shots_panel._shots_prefix_le.editingFinished.emit()
+
+    def sort(self) -> None:
+        self.window.sort_shots()
+
+    def scrub(self) -> None:
+        self.window._otio_view.ruler_moved.emit(self._shot().start_frame + 1)
+
+    def playback(self) -> None:
+        # mpv reporting the playhead position
+        self._edit_index += 1
+        self.window._time_observer((self._edit_index % self.window.session.probe_data.frames) / self.fps)
+
+    def close(self) -> None:
+        self.window.close()
+        self.window.deleteLater()
+        self.process_events()
+
+
+def measure(driver: UIDriver, edit: Callable[[], None], repeat: int) -> dict[str, list[float]]:
+    latencies, frame_times = [], []
+    for _ in range(repeat):
+        start = perf_counter()
+        edit()
+        driver.process_events()
+        latencies.append(perf_counter() - start)
+        frame_times.append(driver.frame_time())
+    return {'latency': latencies, 'frame': frame_times}
+
+
+def run_scale(nb_shots: int, args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Time every edit on a session of nb_shots shots (run in a dedicated process by run())
+    """
+    driver = UIDriver(nb_shots, args.shot_duration, args.fps)
+    driver.process_events()
+    # edits need shots, the session is always loaded first
+    timings = {'load': measure(driver, driver.load, 1)}
+    for name in EDITS[1:]:
+        if name in args.steps:
+            timings[name] = measure(driver, getattr(driver, name), args.edits)
+    driver.close()
+
+    results = {}
+    for name, values in timings.items():
+        if name not in args.steps:
+            continue
+        for metric in ('latency', 'frame'):
+            results[f'{name}.{metric}.p50@{nb_shots}'] = percentile(values[metric], 0.5)
+            results[f'{name}.{metric}.p95@{nb_shots}'] = percentile(values[metric], 0.95)
+            results[f'{name}.{metric}.max@{nb_shots}'] = max(values[metric])
+    return {'results': results, 'peak_rss_mb': peak_rss_mb()}
+
+
+def _print_scale(nb_shots: int, scale: dict[str, Any]) -> None:
+    results = scale['results']
+    for name in EDITS:
+        if f'{name}.latency.p50@{nb_shots}' not in results:
+            continue
+        row = ''.join(f'{results[f"{name}.{metric}.{stat}@{nb_shots}"] * 1000:10.1f}'
+                      for metric in ('latency', 'frame') for stat in ('p50', 'p95', 'max'))
+        print(f'  {name:<12}{nb_shots:>7} shots{row}')
+    print(f'  {"peak rss":<12}{nb_shots:>7} shots{scale["peak_rss_mb"]:10.1f} MB')
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    results, memory = {}, {}
+    print(f'  {"edit":<12}{"":>13}' + ''.join(f'{f"{m} {s}":>10}' for m in ('lat', 'frame')
+                                              for s in ('p50', 'p95', 'max')) + '  (ms)')
+    for nb_shots in sorted(set(args.scales)):
+        command = [sys.executable, '-m', 'wolverine.benchmarks.ui', '--scale-worker', str(nb_shots),
+                   '--edits', str(args.edits), '--shot-duration', str(args.shot_duration), '--fps', str(args.fps),
+                   '--steps', *args.steps]
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode:
+            print(f'  [{nb_shots}] failed : {process.stderr.strip().splitlines()[-1:] or process.returncode}')
+            continue
+        scale = json.loads(process.stdout.strip().splitlines()[-1])
+        _print_scale(nb_shots, scale)
+        # only p95 latencies are compared against baselines, the rest is for reading
+        results.update({k: v for k, v in scale['results'].items() if '.latency.p95@' in k})
+        memory[f'peak_rss_mb@{nb_shots}'] = scale['peak_rss_mb']
+    return {
+        'version': BASELINE_VERSION,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'settings': {k: getattr(args, k) for k in ['shot_duration', 'fps', 'edits']},
+        'results': results,
+        'memory': memory,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='*', default=list(DEFAULT_SCALES), help='Numbers of shots')
+    parser.add_argument('--steps', nargs='*', default=list(EDITS), choices=EDITS, help='Edits to time')
+    parser.add_argument('--edits', type=int, default=10, help='Times each edit is done per scale')
+    parser.add_argument('--shot-duration', type=int, default=48, help='Frames per synthetic shot')
+    parser.add_argument('--fps', type=float, default=24.0)
+    parser.add_argument('--baseline', type=Path, help='Baseline json to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slow down ratio (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', type=Path, help='Write results as a baseline json')
+    parser.add_argument('--scale-worker', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scale_worker:
+        # logs go to stderr, the last stdout line is the result
+        print(json.dumps(run_scale(args.scale_worker, args)))
+        return 0
+
+    report = run(args)
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+        print(f'Baseline written to ({args.save_baseline})')
+    if not args.baseline:
+        return 0
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} regressions : {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Headless command line, runs probing, shot detection and exports without Qt
+
+    python -m wolverine probe sequence.mov
+    python -m wolverine detect sequence.mov --threshold 45 --json
+    python -m wolverine export seq_010.mov seq_020.mov -o /exports --workers 8 --timelines .otio .edl
+    python -m wolverine export sequence.mov -o /exports --trace export_trace.json
+    python -m wolverine export seq_010.mov seq_020.mov --cut-list seq_010.edl seq_020.xml -o /exports
+    python -m wolverine export sequence_v002.mov --previous sequence_v001.mov -o /exports
+"""
+from __future__ import annotations
+
+import sys
+import json
+import logging
+import argparse
+import importlib
+from pathlib import Path
+from typing import Any
+
+from wolverine import log
+from wolverine import jobs
+from wolverine import analysis
+from wolverine import export
+from wolverine import profiles
+from wolverine import trace
+from wolverine import media_cache
+from wolverine.session import WolverineSession, DEFAULT_THRESHOLD, MEDIA_PROGRESS
+
+
+class Reporter:
+    """
+    Prints progress, either as text or (with --json) as one json object per line on stdout
+    """
+
+    def __init__(self, as_json: bool = False) -> None:
+        self.as_json = as_json
+
+    def emit(self, event: str, **data: Any) -> None:
+        if self.as_json:
+            sys.stdout.write(json.dumps({'event': event, **data}) + '\n')
+            sys.stdout.flush()
+            return
+        if event == 'progress':
+            print(f'[{data["input"]}] {data["stage"]} ({data["current"]}/{data["total"]})')
+        elif event == 'media_progress':
+            eta = f'{data["eta"]:.0f}s' if data['eta'] is not None else '?'
+            print(f'[{data["input"]}] {data["stage"]} {data["time"]:.1f}/{data["duration"]:.1f}s '
+                  f'({data["speed"]:.1f}x, ETA {eta})')
+        elif event == 'error':
+            print(f'[{data.get("input", "")}] ERROR : {data["message"]}', file=sys.stderr)
+        else:
+            print(f'[{data.get("input", "")}] {event} : {json.dumps(data.get("result", data))}')
+
+    def progress_callback(self, input_path: Path):
+        def progress(stage: str, current: int, total: int) -> None:
+            self.emit('progress', input=input_path.as_posix(), stage=stage, current=current, total=total)
+        return progress
+
+    def media_progress_callback(self, input_path: Path):
+        def media_progress(stage: str, progress: jobs.AggregateProgress) -> None:
+            eta = progress.eta
+            self.emit('media_progress', input=input_path.as_posix(), stage=stage, frames=progress.frames,
+                      time=round(progress.time, 3), duration=round(progress.duration, 3),
+                      speed=round(progress.speed, 2), eta=round(eta, 1) if eta is not None else None)
+        return media_progress
+
+
+def load_export_action(spec: str) -> export.ExportAction:
+    """
+    Load an ExportAction (or a plain function) from a "package.module:attribute" string
+    """
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f'Export actions need to be specified as "module:attribute" (got {spec})')
+    action = getattr(importlib.import_module(module_name), attr)
+    if isinstance(action, export.ExportAction):
+        return action
+    if callable(action):
+        return export.ExportAction(description=spec, func=action)
+    raise ValueError(f'{spec} is neither an ExportAction nor a function')
+
+
+def process_input(command: str, input_path: Path, args: argparse.Namespace, reporter: Reporter,
+                  export_actions: list[export.ExportAction], cut_list: Path | None = None,
+                  previous: Path | None = None) -> dict[str, Any]:
+    progress = reporter.progress_callback(input_path)
+    wolverine_session = WolverineSession()
+    wolverine_session.subscribe(MEDIA_PROGRESS, reporter.media_progress_callback(input_path))
+    # shots are detected (or imported) on the previous version then carried over to input_path
+    probe_data = wolverine_session.load_source(previous if previous and command != 'probe' else input_path)
+    if command == 'probe':
+        return probe_data.to_dict()
+
+    wolverine_session.prefix = args.prefix
+    wolverine_session.shot_start = args.shot_start
+    if cut_list:
+        shots = wolverine_session.import_cut_list(cut_list, offset=args.cut_offset, auto_thumbnail=False,
+                                                  progress=progress)
+    else:
+        wolverine_session.analysis_settings = analysis.AnalysisSettings(black_pixel_threshold=args.black_threshold,
+                                                                        freeze_noise=args.freeze_noise)
+        wolverine_session.ignore_rules = analysis.IgnoreRules(black=args.ignore_black, freeze=args.ignore_freeze,
+                                                              slate=args.ignore_slate)
+        shots = wolverine_session.detect(threshold=args.threshold, auto_thumbnail=False, progress=progress)
+    if previous and shots:
+        shots = wolverine_session.update_source(input_path, auto_thumbnail=False, progress=progress)
+    if not shots:
+        raise ValueError(f'Could not detect any shots in ({previous or input_path})')
+    wolverine_session.set_shot_start(args.shot_start)
+    if command == 'detect':
+        save_data = wolverine_session.to_save_data()
+        return {k: save_data[k] for k in ['probe_data', 'shots_schema', 'shots']}
+
+    export_dir = Path(args.output)
+    if len(args.inputs) > 1:
+        export_dir = export_dir.joinpath(input_path.stem)
+    export_errors = wolverine_session.export(export_dir, media=args.shots, timelines=args.timelines,
+                                             export_actions=[(a, None) for a in export_actions],
+                                             workers=args.workers, progress=progress, profile=args.profile)
+    if export_errors:
+        raise RuntimeError(f'{export_errors} timelines or export actions failed, check logs for more details')
+    return {
+        'export_directory': export_dir.as_posix(),
+        'shots': len(shots),
+        'timelines': [export_dir.joinpath(f'{input_path.stem}{ext}').as_posix() for ext in args.timelines],
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='wolverine', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='+', type=Path, help='Source movie(s)')
+    common.add_argument('--json', action='store_true', help='Print progress and results as json lines')
+    common.add_argument('-v', '--verbose', action='store_true', help='Print debug logs (on stderr)')
+    common.add_argument('--trace', type=Path, default=None,
+                        help='Write per-stage timings as a Chrome trace (json) and print a summary on stderr')
+
+    detection = argparse.ArgumentParser(add_help=False)
+    detection.add_argument('-t', '--threshold', type=int, default=DEFAULT_THRESHOLD,
+                           help='Shot detection threshold (1-100)')
+    detection.add_argument('--ignore-black', type=float, default=analysis.IgnoreRules.black,
+                           help='Ratio of black frames from which a shot is ignored (0 to keep them)')
+    detection.add_argument('--ignore-slate', type=float, default=analysis.IgnoreRules.slate,
+                           help='Ratio of frozen frames from which a shot followed by an ignored black one is ignored '
+                                '(0 to keep them)')
+    detection.add_argument('--ignore-freeze', type=float, default=analysis.IgnoreRules.freeze,
+                           help='Ratio of frozen frames from which any shot is ignored (0, the default, to keep them)')
+    detection.add_argument('--black-threshold', type=float, default=analysis.AnalysisSettings.black_pixel_threshold,
+                           help='Luminance ratio under which a pixel is black')
+    detection.add_argument('--freeze-noise', type=float, default=analysis.AnalysisSettings.freeze_noise,
+                           help='Noise (dB) under which consecutive frames are the same frame')
+    detection.add_argument('--prefix', default='', help='Shot names prefix')
+    detection.add_argument('--shot-start', type=int, default=101, help='First frame of exported shots')
+    detection.add_argument('--cut-list', type=Path, nargs='+', default=None,
+                           help='EDL, FCP XML or .otio cut list per input (in the same order), shots are read from '
+                                'it instead of being detected')
+    detection.add_argument('--cut-offset', type=int, default=0,
+                           help='Record frame of the cut lists the inputs start at (eg: the length of a slate)')
+    detection.add_argument('--previous', type=Path, nargs='+', default=None,
+                           help='Previous version per input (in the same order), shots are detected (or read from '
+                                '--cut-list) on it and carried over, only the frames that changed are analyzed')
+
+    subparsers.add_parser('probe', parents=[common], help='Print source movie information')
+    subparsers.add_parser('detect', parents=[common, detection], help='Detect shots and print them')
+    export_parser = subparsers.add_parser('export', parents=[common, detection],
+                                          help='Detect shots and export media, timelines and custom actions')
+    export_parser.add_argument('-o', '--output', type=Path, required=True,
+                               help='Export directory (one sub-directory per input when several are given)')
+    export_parser.add_argument('-w', '--workers', type=int, default=None,
+                               help='Number of media extractions run in parallel (defaults to the number of CPUs '
+                                    'divided by the profile threads per job)')
+    export_parser.add_argument('-p', '--profile', default=profiles.DEFAULT_PROFILE, choices=list(profiles.PROFILES),
+                               help='Export profile used for shot movies and audio')
+    export_parser.add_argument('--shots', nargs='*', default=list(export.SHOT_MEDIA), choices=export.SHOT_MEDIA,
+                               help='Shot media to export')
+    export_parser.add_argument('--timelines', nargs='*', default=list(export.TIMELINE_ADAPTERS),
+                               choices=list(export.TIMELINE_ADAPTERS), help='Timeline formats to export')
+    export_parser.add_argument('--media-cache', type=Path, default=None,
+                               help='Media cache directory, unchanged shots are linked from it instead of being '
+                                    'encoded again (defaults to $WOLVERINE_CACHE_DIR or a temp directory)')
+    export_parser.add_argument('--media-cache-size', type=int, default=media_cache.DEFAULT_MAX_SIZE,
+                               help='Media cache maximum size in MB')
+    export_parser.add_argument('--no-media-cache', action='store_true', help='Always encode shot media')
+    export_parser.add_argument('--action', dest='actions', action='append', default=[],
+                               help='Custom export action as "module:attribute" (ExportAction or function), '
+                                    'can be given several times')
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(as_json=args.json)
+
+    # keep stdout for results/progress
+    for handler in log.handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(sys.stderr)
+    log.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+    if getattr(args, 'no_media_cache', False):
+        media_cache.set_cache(None)
+    elif getattr(args, 'media_cache', None):
+        media_cache.set_cache(media_cache.MediaCache(args.media_cache, args.media_cache_size))
+
+    try:
+        export_actions = [load_export_action(spec) for spec in getattr(args, 'actions', [])]
+    except (ImportError, AttributeError, ValueError) as e:
+        reporter.emit('error', message=str(e))
+        return 2
+
+    cut_lists = getattr(args, 'cut_list', None) or [None] * len(args.inputs)
+    if len(cut_lists) != len(args.inputs):
+        reporter.emit('error', message=f'{len(cut_lists)} cut lists given for {len(args.inputs)} inputs')
+        return 2
+
+    previous_versions = getattr(args, 'previous', None) or [None] * len(args.inputs)
+    if len(previous_versions) != len(args.inputs):
+        reporter.emit('error', message=f'{len(previous_versions)} previous versions given for {len(args.inputs)} '
+                                       f'inputs')
+        return 2
+
+    if args.trace:
+        trace.enable()
+
+    failed = 0
+    for input_path, cut_list, previous in zip(args.inputs, cut_lists, previous_versions):
+        reporter.emit('start', input=input_path.as_posix(), command=args.command)
+        try:
+            result = process_input(args.command, input_path, args, reporter, export_actions, cut_list, previous)
+        except Exception as e:
+            log.debug('', exc_info=True)
+            reporter.emit('error', input=input_path.as_posix(), message=str(e))
+            failed += 1
+            continue
+        reporter.emit('done', input=input_path.as_posix(), result=result)
+
+    if args.trace:
+        trace.write(args.trace)
+        print(trace.summary(), file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,101 @@
+"""
+Cut lists : shots read from an editorial timeline (EDL, FCP XML or .otio) instead of being detected, nothing is decoded
+
+    shots = cut_list.read_shots('sequence.edl', source=Path('sequence.mov'), fps=24, frames=2400)
+
+Clip positions in the edit (record side) are frames of the source movie, the movie being the render of that edit.
+offset is the record frame the movie starts at when it doesn't start with the edit (eg: a slate before it). Gaps
+in the edit and whatever the movie has after the edit become ignored shots, disabled clips disabled shots.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+from opentimelineio import adapters, algorithms, exceptions, schema
+
+from wolverine import log
+from wolverine import export
+from wolverine.shots import ShotData
+
+CUT_LIST_EXT = tuple(export.TIMELINE_ADAPTERS)
+
+
+def read_timeline(path: str | Path, fps: float) -> schema.Timeline:
+    """
+    Read a cut list with the adapter used to export that format, EDLs carry no frame rate and are read at fps
+    """
+    path = Path(path)
+    adapter_name = export.TIMELINE_ADAPTERS.get(path.suffix.lower())
+    if not adapter_name:
+        raise ValueError(f'Unsupported cut list ({path}), expected one of {", ".join(CUT_LIST_EXT)}')
+    kwargs = {'rate': fps} if adapter_name == 'cmx_3600' else {}
+    try:
+        result = adapters.read_from_file(path.as_posix(), adapter_name=adapter_name, **kwargs)
+    except exceptions.NotSupportedError as e:
+        raise ValueError(f'No {adapter_name} adapter to read ({path}), install the OpenTimelineIO plugin providing '
+                         f'it') from e
+    except (exceptions.OTIOError, OSError, ValueError) as e:
+        raise ValueError(f'Could not read cut list ({path}) : {e}') from e
+    if isinstance(result, schema.SerializableCollection):
+        result = next(iter(result.find_children(descended_from_type=schema.Timeline)), None)
+    if not isinstance(result, schema.Timeline):
+        raise ValueError(f'No timeline in cut list ({path})')
+    return result
+
+
+def clip_ranges(timeline: schema.Timeline, fps: float, offset: int = 0) -> list[tuple[int, int, bool]]:
+    """
+    Record ranges of the visible clips of timeline, stacked video tracks are flattened (top-most clip wins)
+
+    Returns:
+        list: (start frame, end frame exclusive, enabled) per clip, in timeline order
+    """
+    tracks = timeline.video_tracks()
+    if not tracks:
+        raise ValueError(f'No video track in cut list ({timeline.name})')
+    track = tracks[0] if len(tracks) == 1 else algorithms.flatten_stack(tracks)
+    ranges = []
+    for clip in track.find_clips():
+        # nested clips (sub-sequences) are mapped to the top track time
+        record = clip.transformed_time_range(clip.trimmed_range(), track)
+        start = round(record.start_time.value_rescaled_to(fps)) - offset
+        end = round(record.end_time_exclusive().value_rescaled_to(fps)) - offset
+        ranges.append((start, end, clip.enabled))
+    return ranges
+
+
+def read_shots(path: str | Path, source: Path, fps: float, frames: int | None = None, offset: int = 0,
+               auto_thumbnail: bool = False) -> list[ShotData]:
+    """
+    Shots of source cut as in the cut list at path, overlaps (transitions) go to the earlier shot and clips out of
+    the source frame range are trimmed to it
+
+    Returns:
+        list[ShotData]: shots covering the source from frame 0
+    """
+    ranges = sorted(clip_ranges(read_timeline(path, fps), fps, offset))
+    if frames is not None:
+        outside = sum(1 for start, end, _ in ranges if start >= frames or end <= 0)
+        if outside:
+            log.warning(f'{outside} clips of ({Path(path).name}) are outside of the source frame range')
+    shots = []
+    cursor = 0
+
+    def add(start: int, end: int, **kwargs) -> None:
+        shots.append(ShotData.from_frames(index=len(shots), fps=fps, source=source, start=start,
+                                          duration=end - start, auto_thumbnail=auto_thumbnail, **kwargs))
+
+    for start, end, enabled in ranges:
+        start = max(start, cursor)
+        end = min(end, frames) if frames is not None else end
+        if end <= start:
+            continue
+        if start > cursor:
+            add(cursor, start, ignored=True, enabled=False)
+        add(start, end, enabled=enabled)
+        cursor = end
+    if not shots:
+        raise ValueError(f'No clips of ({path}) within the source frame range')
+    if frames is not None and cursor < frames:
+        add(cursor, frames, ignored=True, enabled=False)
+    return shots
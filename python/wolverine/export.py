@@ -0,0 +1,317 @@
+"""
+Export helpers shared by the UI and the command line : shot media, timelines and custom export actions
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from time import perf_counter_ns
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable
+
+from opentimelineio import schema, adapters
+from opentimelineio.schema import Box2d, V2d
+
+from wolverine import log
+from wolverine import jobs
+from wolverine import trace
+from wolverine import manifest
+from wolverine import profiles
+from wolverine.shots import ShotData, MEDIA_TYPES, probe_resolution
+
+SHOT_MEDIA = ('thumbnails', 'movies', 'audio')
+TIMELINE_ADAPTERS = {
+    '.otio': 'otio_json',
+    '.edl': 'cmx_3600',
+    '.xml': 'fcp_xml',
+}
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+@dataclass
+class ExportAction:
+    """
+    Custom export step, func is called as func(export_directory, shots, *widget_values)
+
+    widget is an optional QWidget class shown in the export dialog, widget_func the name of the method returning
+    its value(s)
+    """
+    description: str
+    func: Callable
+    widget: Callable | None = None
+    widget_func: str = ''
+
+
+def build_timeline(shots: Iterable[ShotData], source: str | Path,
+                   profile: str | profiles.ExportProfile | None = None) -> schema.Timeline:
+    """
+    Timeline of shots, with profile the movie references get the bounds of the movies it exports
+    """
+    source = Path(source)
+    movie_bounds = None
+    if profile is not None:
+        resolution = probe_resolution(source) if source.exists() else None
+        if resolution:
+            movie_bounds = Box2d(V2d(*profiles.get_profile(profile).movie_resolution(resolution)))
+    # add shots to OTIO track
+    track = schema.Track(
+        name=source.stem,
+        kind=schema.TrackKind.Video
+    )
+    for shot in shots:
+        if shot.otio_clip.parent():
+            shot.otio_clip.parent().remove(shot.otio_clip)
+        movie_reference = shot.otio_clip.media_references().get('reference')
+        if movie_bounds and movie_reference:
+            movie_reference.available_image_bounds = movie_bounds
+        track.append(shot.otio_clip)
+    # add track to stack
+    stack = schema.Stack(
+        children=[track],
+        name=source.stem,
+    )
+    # add stack to timeline
+    timeline = schema.Timeline()
+    timeline.tracks = stack
+    timeline.metadata['source'] = source.as_posix()
+    return timeline
+
+
+# export media name -> ShotData media type
+SHOT_MEDIA_TYPES = dict(zip(SHOT_MEDIA, MEDIA_TYPES))
+
+
+def export_shot(shot: ShotData, export_dir: str | Path, media: Iterable[str] = SHOT_MEDIA) -> ShotData:
+    shot.save_directory = export_dir
+    if 'thumbnails' in media:
+        shot.generate_thumbnail()
+    if 'movies' in media:
+        shot.generate_movie()
+    if 'audio' in media:
+        shot.generate_audio()
+    return shot
+
+
+async def export_shot_async(shot: ShotData, export_dir: str | Path, media: Iterable[str] = SHOT_MEDIA,
+                            engine: jobs.MediaJobEngine | None = None, priority: int = 0) -> ShotData:
+    """
+    Extract all media of a shot at once, the engine semaphores decide how many ffmpeg processes actually run
+    """
+    shot.save_directory = export_dir
+    await asyncio.gather(*(shot.generate_media_async(SHOT_MEDIA_TYPES[m], engine, priority)
+                           for m in SHOT_MEDIA if m in media))
+    return shot
+
+
+async def _generate_shot_media(shot: ShotData, media_types: list[str], engine: jobs.MediaJobEngine,
+                               priority: int = 0, profile: profiles.ExportProfile | None = None,
+                               tracker: jobs.ProgressTracker | None = None) -> list[bool]:
+    return await asyncio.gather(*(shot.generate_media_async(m, engine, priority, profile=profile,
+                                                     progress=tracker.job((shot, m), shot.media_duration(m))
+                                                     if tracker else None)
+                           for m in media_types))
+
+
+def plan_shots_export(shots: list[ShotData], export_dir: str | Path, media: Iterable[str] = SHOT_MEDIA,
+                      profile: str | profiles.ExportProfile | None = None) -> manifest.ExportPlan | None:
+    """
+    Compare shots against the last export of export_dir (see wolverine.manifest), move the files of renamed shots
+    and point shots to their exported media (which may not be generated yet). Ignored shots get no media, files of
+    a previous export of theirs are removed
+
+    Returns:
+        ExportPlan: what needs to be generated, None if no shot media is exported
+    """
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    media_types = [SHOT_MEDIA_TYPES[m] for m in SHOT_MEDIA if m in media]
+    if not media_types:
+        return None
+
+    shots = [shot for shot in shots if not shot.ignored]
+    for shot in shots:
+        shot.save_directory = export_dir
+    with trace.span('export.plan', shots=len(shots)):
+        plan = manifest.plan_export(shots, export_dir, media_types, profiles.get_profile(profile))
+        log.debug(f'Export plan ({export_dir}) : {plan}')
+        manifest.apply_moves(plan.moves)
+    for entry in plan.entries.values():
+        setattr(entry['shot'], entry['media'], export_dir.joinpath(entry['file']))
+    return plan
+
+
+def export_shots(shots: list[ShotData], export_dir: str | Path, media: Iterable[str] = SHOT_MEDIA,
+                 workers: int | None = None, progress: ProgressCallback | None = None,
+                 profile: str | profiles.ExportProfile | None = None,
+                 plan: manifest.ExportPlan | None = None,
+                 media_progress: Callable[[jobs.AggregateProgress], None] | None = None) -> manifest.ExportPlan | None:
+    """
+    Export shot media through a job engine allowing workers processes per resource class (decode, io), every
+    extraction is queued at once without any extra thread, progress is reported from the calling thread.
+    Without workers the number of processes comes from the profile threads per job (see ExportProfile.job_limits).
+    media_progress gets the seconds of media written by all extractions (speed, ETA) every few hundred ms.
+
+    Only media that changed since the last export of export_dir are generated (see plan_shots_export), renamed
+    shots get their files moved and files no shot uses anymore are removed. Ignored shots are skipped.
+
+    Returns:
+        ExportPlan: what was generated, moved, kept and removed
+    """
+    export_dir = Path(export_dir)
+    profile = profiles.get_profile(profile)
+    shots = [shot for shot in shots if not shot.ignored]
+    plan = plan or plan_shots_export(shots, export_dir, media, profile)
+    if not plan:
+        return None
+
+    to_generate = {}
+    for shot, media_type in plan.generate:
+        to_generate.setdefault(shot, []).append(media_type)
+        # a failed generation must not leave the previous file looking like the new one
+        if getattr(shot, media_type):
+            getattr(shot, media_type).unlink(missing_ok=True)
+    nb_done = len(shots) - len(to_generate)
+    if progress and nb_done:
+        progress('shots', nb_done, len(shots))
+
+    engine = jobs.MediaJobEngine(limits=profile.job_limits(workers))
+    tracker = jobs.ProgressTracker()
+    # every job is known upfront, so the expected total doesn't grow as jobs start
+    for shot, shot_media in to_generate.items():
+        for media_type in shot_media:
+            tracker.job((shot, media_type), shot.media_duration(media_type))
+    try:
+        with trace.span('export.shots', shots=len(to_generate), profile=profile.name):
+            # shots are queued in order so they also start in order
+            futures = {engine.schedule(_generate_shot_media(shot, shot_media, engine, priority=i, profile=profile,
+                                                            tracker=tracker)): shot
+                       for i, (shot, shot_media) in enumerate(to_generate.items())}
+            for future in tracker.as_completed(futures, media_progress):
+                for media_type, generated in zip(to_generate[futures[future]], future.result()):
+                    if not generated:
+                        plan.failed.append((futures[future], media_type))
+                # cached media never report any progress
+                for media_type in to_generate[futures[future]]:
+                    tracker.finish((futures[future], media_type))
+                nb_done += 1
+                if progress:
+                    progress('shots', nb_done, len(shots))
+    finally:
+        engine.shutdown()
+
+    with trace.span('export.manifest'):
+        manifest.remove_orphans(plan.orphans)
+        manifest.write_manifest(export_dir, plan)
+    return plan
+
+
+def _write_timeline(snapshot: str, output_path: str, adapter_name: str) -> str:
+    """
+    Process pool worker, write the timeline of an otio_json snapshot with adapter_name
+    """
+    timeline = adapters.read_from_string(snapshot, adapter_name='otio_json')
+    adapters.write_to_file(timeline, output_path, adapter_name=adapter_name)
+    return output_path
+
+
+class TimelineExports:
+    """
+    Timelines written in the background, one worker process per adapter : adapters are pure python (fcp_xml is slow
+    on long edits) and would otherwise hold the GIL the UI and the shot export need. Workers get a frozen otio_json
+    snapshot of the timeline, edits made to it afterwards aren't exported
+
+        timelines = TimelineExports(timeline, export_dir, 'seq_010', ['.otio', '.xml'])
+        export_shots(...)
+        failed = timelines.wait(progress)
+    """
+
+    def __init__(self, timeline: schema.Timeline, export_dir: str | Path, name: str,
+                 extensions: Iterable[str] = tuple(TIMELINE_ADAPTERS)) -> None:
+        export_dir = Path(export_dir)
+        self.extensions = [ext for ext in TIMELINE_ADAPTERS if ext in extensions]
+        self.outputs = {ext: export_dir.joinpath(f'{name}{ext}') for ext in self.extensions}
+        self._futures: dict[Future, str] = {}
+        self._times: dict[str, list[int]] = {}
+        self._pool = None
+        if not self.extensions:
+            return
+        with trace.span('timeline.snapshot'):
+            snapshot = adapters.write_to_string(timeline, adapter_name='otio_json')
+        # spawned rather than forked, the parent runs threads (job engine loop, Qt) that mustn't be copied mid-state
+        self._pool = ProcessPoolExecutor(max_workers=len(self.extensions),
+                                         mp_context=multiprocessing.get_context('spawn'))
+        for ext in self.extensions:
+            self._times[ext] = [perf_counter_ns()]
+            future = self._pool.submit(_write_timeline, snapshot, self.outputs[ext].as_posix(), TIMELINE_ADAPTERS[ext])
+            future.add_done_callback(lambda f, times=self._times[ext]: times.append(perf_counter_ns()))
+            self._futures[future] = ext
+
+    def wait(self, progress: ProgressCallback | None = None) -> dict[str, Exception]:
+        """
+        Wait for every timeline, progress is reported per adapter as they finish
+
+        Returns:
+            dict: extension -> error of the timelines that could not be written
+        """
+        errors = {}
+        for i, future in enumerate(as_completed(self._futures)):
+            ext = self._futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                log.critical(f'Could not export timeline ({self.outputs[ext]}) : {e}')
+                errors[ext] = e
+            else:
+                trace.add_output(self.outputs[ext])
+            # written by a worker process, timed from this one (done callbacks can run just after as_completed)
+            start, end = (self._times[ext] + [perf_counter_ns()])[:2]
+            trace.record(f'timeline{ext}', start, end, 'timeline', adapter=TIMELINE_ADAPTERS[ext],
+                         failed=ext in errors)
+            if progress:
+                progress(f'timeline{ext}', i + 1, len(self._futures))
+        self.cancel()
+        return errors
+
+    def cancel(self) -> None:
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def export_timelines(timeline: schema.Timeline, export_dir: str | Path, name: str,
+                     extensions: Iterable[str] = tuple(TIMELINE_ADAPTERS),
+                     progress: ProgressCallback | None = None) -> list[Path]:
+    """
+    Write timelines in parallel (see TimelineExports)
+
+    Returns:
+        list[Path]: written timelines
+    """
+    timelines = TimelineExports(timeline, export_dir, name, extensions)
+    errors = timelines.wait(progress)
+    return [path for ext, path in timelines.outputs.items() if ext not in errors]
+
+
+def run_export_actions(export_actions: list[tuple[ExportAction, Any]], export_dir: str | Path,
+                       shots: list[ShotData], progress: ProgressCallback | None = None) -> int:
+    """
+    Returns:
+        int: number of actions that failed
+    """
+    export_errors = 0
+    for i, (export_action, widget_value) in enumerate(export_actions):
+        if progress:
+            progress('actions', i + 1, len(export_actions))
+
+        widget_value = widget_value or []
+        widget_value = widget_value if isinstance(widget_value, list) else [widget_value]
+        try:
+            with trace.span(f'action:{export_action.description}', 'export'):
+                export_action.func(Path(export_dir).as_posix(), shots, *widget_value)
+        except Exception as e:
+            log.critical(f'Export Failed: \nError: {e}\nExport Action :{export_action}')
+            export_errors += 1
+    return export_errors
@@ -0,0 +1,510 @@
+"""
+Asyncio engine running media commands (ffmpeg/ffprobe), every command runs as a subprocess on the engine event loop,
+concurrency is limited per resource class (decode, io, probe) and queued jobs start by priority.
+
+    result = await engine.run(['ffprobe', ...], resource=jobs.PROBE)     # from a coroutine
+    result = engine.run_sync(['ffmpeg', ...], priority=-10)              # from any thread
+    future = engine.submit(['ffmpeg', ...])                              # concurrent.futures.Future
+
+ffmpeg commands given a progress callback run with -progress, what they report (frames, seconds, speed) is parsed
+as it comes and ProgressTracker adds it up across parallel jobs for callers polling it (ETA of a whole export).
+"""
+from __future__ import annotations
+
+import os
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from time import perf_counter
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from typing import Any, Callable, Coroutine, Hashable, Iterable, Iterator
+
+from wolverine import log
+from wolverine import trace
+
+DECODE = 'decode'  # decoding/encoding (ffmpeg extracts, scene detection)
+IO = 'io'          # stream copies, mostly bound by disk
+PROBE = 'probe'    # short ffprobe calls
+
+DEFAULT_LIMITS = {
+    DECODE: max(1, (os.cpu_count() or 2) // 2),
+    IO: 8,
+    PROBE: 16,
+}
+PROGRESS_INTERVAL = 0.25  # seconds between progress reports of ProgressTracker.as_completed
+
+
+class JobError(RuntimeError):
+
+    def __init__(self, command: list[str], returncode: int | None, stderr: bytes = b'', message: str = '') -> None:
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr
+        message = message or f'Command failed with return code {returncode}'
+        details = stderr.decode(errors='replace').strip()
+        super().__init__(f'{message} : {" ".join(command)}' + (f'\n{details}' if details else ''))
+
+
+@dataclass
+class JobResult:
+    command: list[str]
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    attempts: int
+    elapsed: float
+
+
+@dataclass
+class JobProgress:
+    frame: int = 0
+    time: float = 0.0               # seconds of output written
+    speed: float = 0.0              # times real time
+    size: int = 0                   # bytes written
+    duration: float | None = None   # seconds the job is expected to write
+    done: bool = False
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.duration:
+            return None
+        return 1.0 if self.done else min(1.0, self.time / self.duration)
+
+    @property
+    def eta(self) -> float | None:
+        if not self.duration or not self.speed:
+            return None
+        return max(0.0, self.duration - self.time) / self.speed
+
+
+JobProgressCallback = Callable[[JobProgress], None]
+
+
+def _number(value: str | None) -> float:
+    # ffmpeg writes N/A for values it doesn't know yet
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ProgressParser:
+    """
+    Incremental parser of ffmpeg -progress output (key=value lines, each report ends with a progress= line)
+    """
+
+    def __init__(self, callback: JobProgressCallback, duration: float | None = None) -> None:
+        self.callback = callback
+        self.duration = duration
+        self._values: dict[str, str] = {}
+
+    def feed(self, line: bytes) -> None:
+        key, _, value = line.decode(errors='replace').strip().partition('=')
+        if key != 'progress':
+            self._values[key] = value
+            return
+        values, self._values = self._values, {}
+        self.callback(JobProgress(
+            frame=int(_number(values.get('frame'))),
+            time=max(0.0, _number(values.get('out_time_us')) / 1e6),
+            speed=_number(values.get('speed', '').rstrip('x')),
+            size=int(_number(values.get('total_size'))),
+            duration=self.duration,
+            done=value == 'end',
+        ))
+
+
+@dataclass
+class AggregateProgress:
+    time: float       # seconds of output written by every job
+    duration: float   # seconds every job is expected to write
+    frames: int
+    elapsed: float    # wall time since the tracker was made
+    running: int      # jobs that reported and aren't done
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.time / self.duration) if self.duration else 0.0
+
+    @property
+    def speed(self) -> float:
+        """
+        Seconds written per wall second, all jobs together
+        """
+        return self.time / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        if not self.speed:
+            return None
+        return max(0.0, self.duration - self.time) / self.speed
+
+
+class ProgressTracker:
+    """
+    Adds up the progress of parallel jobs. Jobs report from the engine loop, callers get reports on their own
+    thread through as_completed()
+
+        tracker = ProgressTracker()
+        futures = [engine.submit(command, progress=tracker.job(i, duration)) for i, command in enumerate(commands)]
+        for future in tracker.as_completed(futures, callback=lambda p: print(f'{p.fraction:.0%} ETA {p.eta}')):
+            ...
+    """
+
+    def __init__(self) -> None:
+        self._jobs: dict[Hashable, JobProgress] = {}
+        self._start = perf_counter()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def job(self, key: Hashable, duration: float | None = None) -> JobProgressCallback:
+        """
+        Add a job expected to write duration seconds
+
+        Returns:
+            Callable: progress callback of the job (see MediaJobEngine.run)
+        """
+        with self._lock:
+            self._jobs[key] = JobProgress(duration=duration)
+
+        def update(progress: JobProgress) -> None:
+            with self._lock:
+                self._jobs[key] = progress
+                self._version += 1
+        return update
+
+    def finish(self, key: Hashable) -> None:
+        """
+        Mark a job as done, for jobs that never reported (cached, failed or not run through ffmpeg)
+        """
+        with self._lock:
+            if key in self._jobs and not self._jobs[key].done:
+                duration = self._jobs[key].duration
+                self._jobs[key] = JobProgress(time=duration or 0.0, duration=duration, done=True)
+                self._version += 1
+
+    def snapshot(self) -> AggregateProgress:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return AggregateProgress(
+            time=sum(min(j.time, j.duration) if j.duration else j.time for j in jobs),
+            duration=sum(j.duration or 0.0 for j in jobs),
+            frames=sum(j.frame for j in jobs),
+            elapsed=perf_counter() - self._start,
+            running=sum(1 for j in jobs if (j.time or j.frame) and not j.done),
+        )
+
+    def as_completed(self, futures: Iterable[Future], callback: Callable[[AggregateProgress], None] | None = None,
+                     interval: float = PROGRESS_INTERVAL) -> Iterator[Future]:
+        """
+        Like concurrent.futures.as_completed, callback gets the progress every interval (when it changed) from the
+        calling thread
+        """
+        pending = set(futures)
+        reported = -1
+        while pending:
+            done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+            yield from done
+            if callback and self._version != reported:
+                reported = self._version
+                callback(self.snapshot())
+
+
+class PrioritySemaphore:
+    """
+    asyncio semaphore handing free slots to waiters by priority (lowest value first, then first come first served)
+    """
+
+    def __init__(self, value: int) -> None:
+        self._value = value
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._keyed: dict[Hashable, asyncio.Future] = {}
+        self._counter = itertools.count()
+
+    @property
+    def limit(self) -> int:
+        return self._value
+
+    async def acquire(self, priority: int = 0, key: Hashable | None = None) -> None:
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        if key is not None:
+            self._keyed[key] = waiter
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # slot was handed over right before the cancellation, give it to someone else
+                self.release()
+            raise
+        finally:
+            if key is not None and self._keyed.get(key) is waiter:
+                del self._keyed[key]
+
+    def reprioritize(self, key: Hashable, priority: int) -> bool:
+        """
+        Move a waiting acquire() in the queue, the previous heap entry is left behind and skipped once its waiter is
+        done
+
+        Returns:
+            bool: True if key was waiting on this semaphore
+        """
+        waiter = self._keyed.get(key)
+        if not waiter or waiter.done():
+            return False
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._value += 1
+
+
+class MediaJobEngine:
+    """
+    Runs commands on its own event loop (started on a daemon thread the first time it is needed)
+    """
+
+    def __init__(self, limits: dict[str, int] | None = None, timeout: float | None = None, retries: int = 0) -> None:
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.timeout = timeout
+        self.retries = retries
+
+        self._semaphores: dict[str, PrioritySemaphore] = {}
+        # keyed jobs, so they can be re-prioritised or cancelled by callers that don't hold their future
+        self._tasks: dict[Hashable, set[asyncio.Task]] = {}
+        self._priorities: dict[Hashable, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _semaphore(self, resource: str) -> PrioritySemaphore:
+        if resource not in self._semaphores:
+            self._semaphores[resource] = PrioritySemaphore(self.limits.get(resource, 1))
+        return self._semaphores[resource]
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if not self._loop:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='wolverine-jobs', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def run(self, command: list[str], resource: str = DECODE, priority: int = 0, timeout: float | None = None,
+                  retries: int | None = None, check: bool = True, key: Hashable | None = None,
+                  progress: JobProgressCallback | None = None, duration: float | None = None) -> JobResult:
+        """
+        Run command once a slot of its resource class is free, cancelling the awaiting task kills the process
+
+        Args:
+            command: program and arguments
+            resource: resource class (DECODE, IO, PROBE) limiting how many commands of that kind run at once
+            priority: lower runs first when waiting for a slot
+            timeout: seconds before the process gets killed (and retried)
+            retries: extra attempts on failure or timeout
+            check: raise a JobError if the command still fails after all attempts
+            key: job identifier used by reprioritize() and cancel()
+            progress: called with the progress of ffmpeg commands (from the engine loop), ignored for other programs
+            duration: seconds the command is expected to write, gives progress fractions and ETAs
+        """
+        command = [str(c) for c in command]
+        if progress and Path(command[0]).stem == 'ffmpeg':
+            command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+        else:
+            progress = None
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        semaphore = self._semaphore(resource)
+        start = perf_counter()
+        error = None
+        if key is not None:
+            self._register(key, priority)
+        for attempt in range(1, retries + 2):
+            await semaphore.acquire(self._priorities.get(key, priority), key)
+            try:
+                with trace.span(Path(command[0]).stem, 'subprocess', resource=resource, attempt=attempt,
+                                command=' '.join(command)):
+                    parser = ProgressParser(progress, duration) if progress else None
+                    returncode, stdout, stderr = await self._execute(command, timeout, parser)
+                    trace.add(subprocesses=1)
+                    if returncode == 0 and Path(command[0]).stem == 'ffmpeg':
+                        trace.add_output(command[-1])
+            except asyncio.TimeoutError:
+                error = JobError(command, None, message=f'Command timed out after {timeout}s')
+            else:
+                result = JobResult(command, returncode, stdout, stderr, attempt, perf_counter() - start)
+                if returncode == 0 or not check and attempt > retries:
+                    return result
+                error = JobError(command, returncode, stderr)
+            finally:
+                semaphore.release()
+            if attempt <= retries:
+                log.warning(f'Retrying ({attempt}/{retries}) : {error}')
+                await asyncio.sleep(min(0.5 * attempt, 5.0))
+        raise error
+
+    @staticmethod
+    async def _execute(command: list[str], timeout: float | None,
+                       parser: ProgressParser | None = None) -> tuple[int, bytes, bytes]:
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       stdin=asyncio.subprocess.DEVNULL)
+
+        async def read_progress() -> tuple[bytes, bytes]:
+            async def read_stdout() -> bytes:
+                lines = []
+                async for line in process.stdout:
+                    parser.feed(line)
+                    lines.append(line)
+                return b''.join(lines)
+            out, err = await asyncio.gather(read_stdout(), process.stderr.read())
+            await process.wait()
+            return out, err
+
+        try:
+            stdout, stderr = await asyncio.wait_for(read_progress() if parser else process.communicate(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        return process.returncode, stdout, stderr
+
+    def submit(self, command: list[str], **kwargs: Any) -> Future:
+        """
+        Thread-safe, schedule command on the engine loop, cancelling the returned future kills the process
+        """
+        return self.schedule(self.run(command, **kwargs))
+
+    def schedule(self, coroutine: Coroutine, key: Hashable | None = None) -> Future:
+        """
+        Thread-safe, run any coroutine (usually awaiting several run() calls) on the engine loop, key registers the
+        whole coroutine for reprioritize() and cancel()
+        """
+        future = Future()
+        loop = self.loop
+        # the task runs in the caller's context, trace spans of the caller enclose it
+        context = contextvars.copy_context()
+
+        def start() -> None:
+            if future.cancelled():
+                coroutine.close()
+                return
+            task = context.run(loop.create_task, coroutine)
+            # registered before the task first runs, so calls made right after schedule() already find it
+            if key is not None:
+                self._register(key, task=task)
+            task.add_done_callback(lambda t: _copy_task_state(t, future))
+            future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        loop.call_soon_threadsafe(start)
+        return future
+
+    def _register(self, key: Hashable, priority: int | None = None, task: asyncio.Task | None = None) -> None:
+        if priority is not None:
+            self._priorities.setdefault(key, priority)
+        task = task or asyncio.current_task()
+        tasks = self._tasks.setdefault(key, set())
+        if task in tasks:
+            return
+        tasks.add(task)
+        task.add_done_callback(lambda t: self._unregister(key, t))
+
+    def _unregister(self, key: Hashable, task: asyncio.Task) -> None:
+        tasks = self._tasks.get(key, set())
+        tasks.discard(task)
+        if not tasks:
+            self._tasks.pop(key, None)
+            self._priorities.pop(key, None)
+
+    def _call(self, func: Callable, *args: Any) -> None:
+        if self._loop:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def reprioritize(self, key: Hashable, priority: int) -> None:
+        """
+        Thread-safe, change the priority of a keyed job, waiting jobs move in their queue right away
+        """
+        self._call(self._reprioritize, key, priority)
+
+    def _reprioritize(self, key: Hashable, priority: int) -> None:
+        if key not in self._tasks:
+            return
+        self._priorities[key] = priority
+        for semaphore in self._semaphores.values():
+            semaphore.reprioritize(key, priority)
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Thread-safe, cancel every job registered under key, running processes get killed
+        """
+        self._call(self._cancel, key)
+
+    def _cancel(self, key: Hashable) -> None:
+        for task in list(self._tasks.get(key, ())):
+            task.cancel()
+
+    def run_sync(self, command: list[str], **kwargs: Any) -> JobResult:
+        """
+        Blocking version of run(), must not be called from the engine loop itself
+        """
+        return self.submit(command, **kwargs).result()
+
+    @staticmethod
+    async def _cancel_all() -> None:
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self) -> None:
+        """
+        Cancel every pending job (killing running processes) then stop the engine loop
+        """
+        with self._lock:
+            if not self._loop:
+                return
+            asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+            self._semaphores = {}
+
+
+def _copy_task_state(task: asyncio.Task, future: Future) -> None:
+    if task.cancelled():
+        future.cancel()
+    if not future.set_running_or_notify_cancel():
+        return
+    if task.exception():
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+_engine: MediaJobEngine | None = None
+
+
+def get_engine() -> MediaJobEngine:
+    """
+    Engine shared by the whole process
+    """
+    global _engine
+    if _engine is None:
+        _engine = MediaJobEngine()
+    return _engine
@@ -0,0 +1,200 @@
+"""
+Export manifest, written in the export directory it records for every exported shot its range, name and for each
+of its media files the settings hash (source fingerprint + ffmpeg arguments), size, modification time and checksum.
+
+The next export of the same directory compares against it : unchanged files are kept, files whose shot was only
+renamed are moved, everything else is generated again and files no shot uses anymore are removed.
+"""
+from __future__ import annotations
+
+import os
+import hashlib
+from uuid import uuid4
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any
+
+from wolverine import log
+from wolverine import profiles
+from wolverine import media_cache
+from wolverine.shots import ShotData
+from wolverine.autosave import atomic_write_text
+from wolverine.serialization import dumps, loads
+
+MANIFEST_NAME = '.wolverine_export.json'
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ExportPlan:
+    # (shot, media type) pairs that need to be generated
+    generate: list[tuple[ShotData, str]] = field(default_factory=list)
+    # (current file, new file) renames
+    moves: list[tuple[Path, Path]] = field(default_factory=list)
+    unchanged: list[Path] = field(default_factory=list)
+    orphans: list[Path] = field(default_factory=list)
+    # (shot, media type) pairs whose generation failed, left out of the manifest so the next export retries them
+    failed: list[tuple[ShotData, str]] = field(default_factory=list)
+    # new manifest entries, by output file name
+    entries: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return (f'{len(self.generate)} to generate, {len(self.moves)} to rename, {len(self.unchanged)} unchanged, '
+                f'{len(self.orphans)} to remove')
+
+
+def manifest_path(export_dir: str | Path) -> Path:
+    return Path(export_dir).joinpath(MANIFEST_NAME)
+
+
+def file_checksum(file_path: str | Path) -> str:
+    digest = hashlib.sha1()
+    with Path(file_path).open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(export_dir: str | Path) -> dict[str, Any]:
+    """
+    Returns:
+        dict: manifest, empty if there is none or it was written by another version
+    """
+    path = manifest_path(export_dir)
+    if not path.exists():
+        return {}
+    try:
+        manifest = loads(path.read_text())
+    except ValueError as e:
+        log.critical(f'Could not read export manifest ({path}) : {e}')
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def _previous_files(manifest: dict[str, Any], export_dir: Path) -> dict[str, dict[str, Any]]:
+    """
+    Files of the previous export which are still the ones it wrote, by file name. Files with the recorded size and
+    modification time are trusted as is, only the others are read to compare their checksum
+    """
+    files = {}
+    for shot in manifest.get('shots', []):
+        for entry in shot.get('files', {}).values():
+            path = export_dir.joinpath(entry['file'])
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+                if stat.st_size != entry['size'] or file_checksum(path) != entry['checksum']:
+                    log.warning(f'Exported file ({entry["file"]}) changed since the last export, it is generated '
+                                f'again')
+                    continue
+                # touched (copied, restored) but the same content
+                entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+            files[entry['file']] = entry
+    return files
+
+
+def plan_export(shots: list[ShotData], export_dir: str | Path, media_types: list[str],
+                profile: str | profiles.ExportProfile | None = None) -> ExportPlan:
+    """
+    Compare shots against the manifest of export_dir, shots need their save_directory set to export_dir
+    """
+    export_dir = Path(export_dir)
+    manifest = read_manifest(export_dir)
+    previous = _previous_files(manifest, export_dir)
+    by_key = {}
+    for entry in previous.values():
+        by_key.setdefault(entry['key'], []).append(entry)
+
+    plan = ExportPlan()
+    outputs = []
+    for shot in shots:
+        for media in media_types:
+            command, output_path, _ = shot.media_command(media, profile)
+            key = media_cache.media_key(shot.source, command)
+            plan.entries[output_path.name] = {'shot': shot, 'media': media, 'file': output_path.name, 'key': key}
+            outputs.append((shot, media, output_path, key))
+
+    # files kept under the same name first, then unclaimed files with the same settings (their shot got renamed)
+    matches = {}
+    for shot, media, output_path, key in outputs:
+        entry = previous.get(output_path.name)
+        if entry and entry['key'] == key:
+            matches[output_path.name] = entry
+    claimed = set(matches)
+    for shot, media, output_path, key in outputs:
+        if output_path.name in matches:
+            continue
+        entry = next((e for e in by_key.get(key, []) if e['file'] not in claimed), None)
+        if entry:
+            matches[output_path.name] = entry
+            claimed.add(entry['file'])
+
+    for shot, media, output_path, key in outputs:
+        entry = matches.get(output_path.name)
+        if not entry:
+            plan.generate.append((shot, media))
+            continue
+        plan.entries[output_path.name].update(size=entry['size'], mtime_ns=entry['mtime_ns'],
+                                              checksum=entry['checksum'])
+        if entry['file'] == output_path.name:
+            plan.unchanged.append(output_path)
+        else:
+            plan.moves.append((export_dir.joinpath(entry['file']), output_path))
+
+    # files edited since the last export (content changed) aren't removed
+    plan.orphans = [export_dir.joinpath(name) for name in previous
+                    if name not in plan.entries and name not in claimed]
+    return plan
+
+
+def apply_moves(moves: list[tuple[Path, Path]]) -> None:
+    """
+    Rename files in two passes (through temp names) so renames chained on each other (SH020 -> SH030,
+    SH030 -> SH040, ...) don't overwrite files that still need to move. A file already at a destination that isn't
+    moved itself is only replaced (with a warning) when its content differs
+    """
+    sources = {current for current, _ in moves}
+    staged = []
+    for current, new in moves:
+        if new.exists() and new not in sources:
+            if file_checksum(new) == file_checksum(current):
+                current.unlink()
+                continue
+            log.warning(f'Replacing ({new}), it is not the file the last export wrote under that name')
+        temp_path = current.with_name(f'.{current.stem}.{uuid4().hex[:8]}{current.suffix}')
+        os.replace(current, temp_path)
+        staged.append((temp_path, new))
+    for temp_path, new in staged:
+        os.replace(temp_path, new)
+
+
+def remove_orphans(orphans: list[Path]) -> None:
+    for orphan in orphans:
+        log.debug(f'Removing orphaned export ({orphan})')
+        orphan.unlink(missing_ok=True)
+
+
+def write_manifest(export_dir: str | Path, plan: ExportPlan) -> None:
+    """
+    Write the manifest for the files of plan, checksums are only computed for files written by this export. Files
+    whose generation failed are left out
+    """
+    export_dir = Path(export_dir)
+    failed = {(id(shot), media) for shot, media in plan.failed}
+    shots = {}
+    for entry in plan.entries.values():
+        path = export_dir.joinpath(entry['file'])
+        if (id(entry['shot']), entry['media']) in failed or not path.exists():
+            continue
+        stat = path.stat()
+        if (entry.get('size'), entry.get('mtime_ns')) != (stat.st_size, stat.st_mtime_ns):
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, checksum=file_checksum(path))
+        shot = entry['shot']
+        shot_entry = shots.setdefault(id(shot), {'name': shot.name, 'start': shot.start_frame,
+                                                 'duration': shot.duration, 'files': {}})
+        shot_entry['files'][entry['media']] = {k: entry[k] for k in ['file', 'key', 'size', 'mtime_ns', 'checksum']}
+    atomic_write_text(manifest_path(export_dir), dumps({'version': MANIFEST_VERSION, 'shots': list(shots.values())}))
@@ -0,0 +1,272 @@
+"""
+Content-addressed cache of extracted media (thumbnails, movies, audio)
+
+Entries are keyed by a fingerprint of the source content and the ffmpeg arguments (range and encode settings, without
+input/output paths), so a shot that was renamed, re-exported elsewhere or extracted in another session is linked (or
+copied) from the cache instead of being encoded again. The cache is bounded in size, least recently used entries are
+evicted first.
+
+    WOLVERINE_CACHE_DIR       cache directory (defaults to <temp>/wolverine/cache), an empty value disables the cache
+    WOLVERINE_CACHE_SIZE      maximum size in MB (defaults to 10240)
+"""
+from __future__ import annotations
+
+import os
+import asyncio
+import shutil
+import time
+import hashlib
+import threading
+from pathlib import Path
+from tempfile import gettempdir
+from uuid import uuid4
+from typing import Hashable
+
+from wolverine import log
+from wolverine import jobs
+
+DEFAULT_CACHE_DIR = Path(gettempdir()).joinpath('wolverine/cache')
+DEFAULT_MAX_SIZE = 10 * 1024  # MB
+FINGERPRINT_BLOCK = 8 * 1024 * 1024  # bytes read at once when hashing sources
+FINGERPRINTS_DIR = 'fingerprints'  # in the cache directory, not cache entries
+
+_fingerprints: dict[tuple[str, int, int, int], str] = {}
+
+
+def source_fingerprint(source: str | Path) -> str:
+    """
+    Hash of the whole source content, independent of the path. New versions of a movie often have the same size and
+    only differ in a few frames, sampling parts of the file would give them the same fingerprint.
+
+    Memoized while the file path, size, modification time and inode don't change, in memory and in the cache
+    directory : other processes (every CLI run, UI launches) read the source once per version, not once each
+    """
+    source = Path(source)
+    stat = source.stat()
+    memo_key = (source.as_posix(), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    if memo_key in _fingerprints:
+        return _fingerprints[memo_key]
+    cache = get_cache()
+    stored_path = None
+    if cache:
+        stored_key = hashlib.sha1('\0'.join(str(value) for value in memo_key).encode()).hexdigest()
+        stored_path = cache.directory.joinpath(FINGERPRINTS_DIR, stored_key)
+        try:
+            _fingerprints[memo_key] = stored_path.read_text().strip()
+            return _fingerprints[memo_key]
+        except OSError:
+            pass
+    digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=20)
+    with source.open('rb') as f:
+        while block := f.read(FINGERPRINT_BLOCK):
+            digest.update(block)
+    _fingerprints[memo_key] = digest.hexdigest()
+    if stored_path:
+        partial_path = stored_path.with_name(f'.{stored_path.name}.{uuid4().hex[:8]}')
+        try:
+            stored_path.parent.mkdir(parents=True, exist_ok=True)
+            partial_path.write_text(_fingerprints[memo_key])
+            os.replace(partial_path, stored_path)
+        except OSError as e:
+            log.debug(f'Could not store the fingerprint of ({source}) : {e}')
+        finally:
+            partial_path.unlink(missing_ok=True)
+    return _fingerprints[memo_key]
+
+
+def media_key(source: str | Path, command: list[str]) -> str:
+    """
+    Cache key of the media produced by command, the source path and the output path (last argument) are left out
+    """
+    source = Path(source).as_posix()
+    arguments = ['<source>' if arg == source else arg for arg in command[:-1]]
+    digest = hashlib.sha1(source_fingerprint(source).encode())
+    digest.update('\0'.join(arguments).encode())
+    return digest.hexdigest()
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    """
+    Hard-link source to destination (copy when linking isn't possible), destination is replaced atomically
+    """
+    partial_path = destination.with_name(f'.{destination.stem}.{uuid4().hex[:8]}{destination.suffix}')
+    try:
+        try:
+            os.link(source, partial_path)
+        except OSError:
+            shutil.copy2(source, partial_path)
+        os.replace(partial_path, destination)
+    finally:
+        partial_path.unlink(missing_ok=True)
+
+
+class MediaCache:
+
+    def __init__(self, directory: str | Path, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """
+        Args:
+            directory: cache directory, created when needed
+            max_size: maximum size in MB
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size * 1024 * 1024
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def path(self, key: str, suffix: str) -> Path:
+        return self.directory.joinpath(key[:2], f'{key}{suffix}')
+
+    def get(self, key: str, suffix: str) -> Path | None:
+        path = self.path(key, suffix)
+        if not path.exists():
+            return None
+        # access time is the last use (set explicitly, mounts often don't update it), eviction removes the oldest
+        # entries first. The modification time is left alone, hard-linked exports share it
+        try:
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+        except OSError:
+            return None
+        return path
+
+    def fetch(self, key: str, suffix: str, destination: str | Path) -> bool:
+        """
+        Link (or copy) a cached entry to destination
+
+        Returns:
+            bool: False if key isn't cached
+        """
+        path = self.get(key, suffix)
+        if not path:
+            return False
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            _link_or_copy(path, destination)
+        except OSError as e:
+            log.debug(f'Could not fetch ({path}) from media cache : {e}')
+            return False
+        return True
+
+    def put(self, key: str, file_path: str | Path) -> Path | None:
+        """
+        Add file_path to the cache (hard-linked when possible) then evict old entries if the cache is too big
+        """
+        file_path = Path(file_path)
+        path = self.path(key, file_path.suffix)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(file_path, path)
+        except OSError as e:
+            log.debug(f'Could not add ({file_path}) to media cache : {e}')
+            return None
+        with self._lock:
+            if self._size is not None:
+                self._size += path.stat().st_size
+        self.evict()
+        return path
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob('*/*'):
+            if path.parent.name == FINGERPRINTS_DIR:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            return self._size
+
+    def evict(self, max_size: int | None = None) -> list[Path]:
+        """
+        Remove least recently used entries until the cache fits in max_size bytes (defaults to the cache max size)
+
+        Returns:
+            list[Path]: removed entries
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if self.size <= max_size:
+            return []
+        with self._lock:
+            entries = sorted(self._entries())
+            self._size = sum(size for _, size, _ in entries)
+            removed = []
+            for _, size, path in entries:
+                if self._size <= max_size:
+                    break
+                path.unlink(missing_ok=True)
+                self._size -= size
+                removed.append(path)
+        log.debug(f'Evicted {len(removed)} entries from media cache ({self.directory})')
+        return removed
+
+    def clear(self) -> None:
+        self.evict(0)
+
+
+_cache: MediaCache | None = None
+_cache_configured = False
+
+
+async def produce(source: str | Path, command: list[str], engine: jobs.MediaJobEngine, resource: str = jobs.DECODE,
+                  priority: int = 0, key: Hashable | None = None, progress: jobs.JobProgressCallback | None = None,
+                  duration: float | None = None) -> bool:
+    """
+    Produce the output of an ffmpeg command (its last argument) through the shared cache : linked from it when
+    cached, otherwise run on the job engine then added to it. The output is written next to the final file then moved
+    over it, readers never see a half written file and a cancelled (superseded) job leaves the previous file untouched
+
+    Returns:
+        bool: True if the output came from the cache
+
+    Raises:
+        JobError, OSError: the command failed or did not write anything
+    """
+    output_path = Path(command[-1])
+    cache = get_cache()
+    cache_key = media_key(source, command) if cache else ''
+    if cache and await asyncio.to_thread(cache.fetch, cache_key, output_path.suffix, output_path):
+        log.debug(f'Media cache hit ({output_path.name})')
+        return True
+
+    partial_path = output_path.with_name(f'.{output_path.stem}.{uuid4().hex[:8]}{output_path.suffix}')
+    try:
+        await engine.run(command[:-1] + [partial_path.as_posix()], resource=resource, priority=priority, key=key,
+                         progress=progress, duration=duration)
+        if not partial_path.exists() or partial_path.stat().st_size == 0:
+            raise OSError(f'{partial_path} is missing or empty')
+        if cache:
+            await asyncio.to_thread(cache.put, cache_key, partial_path)
+        os.replace(partial_path, output_path)
+    finally:
+        partial_path.unlink(missing_ok=True)
+    return False
+
+
+def get_cache() -> MediaCache | None:
+    """
+    Cache shared by the whole process, None when disabled
+    """
+    global _cache, _cache_configured
+    if not _cache_configured:
+        directory = os.getenv('WOLVERINE_CACHE_DIR', DEFAULT_CACHE_DIR.as_posix())
+        max_size = int(os.getenv('WOLVERINE_CACHE_SIZE', DEFAULT_MAX_SIZE))
+        _cache = MediaCache(directory, max_size) if directory else None
+        _cache_configured = True
+    return _cache
+
+
+def set_cache(cache: MediaCache | None) -> None:
+    """
+    Replace (or disable with None) the shared cache
+    """
+    global _cache, _cache_configured
+    _cache = cache
+    _cache_configured = True
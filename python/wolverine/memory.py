@@ -0,0 +1,179 @@
+"""
+Memory instrumentation : tracemalloc snapshots taken on demand and live object counts (shots, OTIO objects, Qt widgets
+and graphics items) to find what grows over long editing sessions.
+
+    memory.start()
+    before = memory.Checkpoint()
+    ...  # edits
+    print(memory.Checkpoint().diff(before))
+
+WOLVERINE_MEMORY=<directory> starts tracing for the whole process, a report (allocation diff since the previous one
+and object counts) is then written to that directory at every SIGUSR1 (posix) and at exit.
+"""
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import atexit
+import signal
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from typing import Callable
+
+from wolverine import log
+
+DEFAULT_FRAMES = 10  # stack frames kept per allocation, more is slower but tells callers apart
+TOP_STATS = 25
+
+_report_dir: Path | None = None
+_last_snapshot: tracemalloc.Snapshot | None = None
+
+
+def start(frames: int = DEFAULT_FRAMES) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop() -> None:
+    global _last_snapshot
+    _last_snapshot = None
+    tracemalloc.stop()
+
+
+def snapshot() -> tracemalloc.Snapshot | None:
+    """
+    Returns:
+        Snapshot: current allocations without tracemalloc's own and import machinery ones, None when not tracing
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ])
+
+
+def _qt_counters() -> dict[str, Callable[[], int]]:
+    # only when the UI already imported Qt, counting must not pull it in
+    qt = sys.modules.get('qt_py_tools.Qt')
+    if not qt:
+        return {}
+    widgets, app = qt.QtWidgets, qt.QtWidgets.QApplication.instance()
+
+    def graphics_items() -> int:
+        return sum(len(o.items()) for o in gc.get_objects() if isinstance(o, widgets.QGraphicsScene))
+    return {
+        # allWidgets also lists widgets waiting for a deleteLater
+        'QWidget': lambda: len(app.allWidgets()) if app else 0,
+        'QGraphicsScene': lambda: sum(1 for o in gc.get_objects() if isinstance(o, widgets.QGraphicsScene)),
+        'QGraphicsItem': graphics_items,
+    }
+
+
+def count_objects() -> dict[str, int]:
+    """
+    Live ShotData, OTIO clips, tracks and timelines, and Qt widgets, scenes and graphics items when the UI is loaded
+    """
+    from opentimelineio import schema
+    from wolverine.shots import ShotData
+
+    gc.collect()
+    types = {'ShotData': ShotData, 'Clip': schema.Clip, 'Track': schema.Track, 'Timeline': schema.Timeline}
+    counts = dict.fromkeys(types, 0)
+    for obj in gc.get_objects():
+        for name, cls in types.items():
+            if isinstance(obj, cls):
+                counts[name] += 1
+    for name, counter in _qt_counters().items():
+        counts[name] = counter()
+    return counts
+
+
+class Checkpoint:
+    """
+    Object counts, traced memory and allocations (when tracing) at one point in time
+    """
+
+    def __init__(self) -> None:
+        self.snapshot = snapshot()
+        self.counts = count_objects()
+        self.traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def growth(self, previous: Checkpoint) -> dict[str, int]:
+        """
+        Returns:
+            dict: object count and traced bytes ('traced') deltas since previous, unchanged ones left out
+        """
+        deltas = {name: count - previous.counts.get(name, 0) for name, count in self.counts.items()}
+        deltas['traced'] = self.traced - previous.traced
+        return {name: delta for name, delta in deltas.items() if delta}
+
+    def diff(self, previous: Checkpoint, limit: int = TOP_STATS) -> str:
+        """
+        Report of what changed since previous : object counts then the allocation sites that grew the most
+        """
+        lines = [f'{"objects":<24}{"before":>10}{"after":>10}{"delta":>10}']
+        for name, count in self.counts.items():
+            before = previous.counts.get(name, 0)
+            lines.append(f'{name:<24}{before:>10}{count:>10}{count - before:>+10}')
+        lines.append(f'{"traced KB":<24}{previous.traced / 1024:>10.0f}{self.traced / 1024:>10.0f}'
+                     f'{(self.traced - previous.traced) / 1024:>+10.0f}')
+        if self.snapshot and previous.snapshot:
+            lines.append('')
+            for stat in self.snapshot.compare_to(previous.snapshot, 'lineno')[:limit]:
+                frame = stat.traceback[0]
+                lines.append(f'{stat.size_diff / 1024:+10.1f} KB {stat.count_diff:+8} blocks  '
+                             f'{frame.filename}:{frame.lineno}')
+        return '\n'.join(lines)
+
+
+def write_report(directory: str | Path | None = None) -> Path | None:
+    """
+    Write object counts and the allocations that grew since the previous report (or the top allocations for the
+    first one) to directory
+
+    Returns:
+        Path: written report, None if there is no directory to write it to
+    """
+    global _last_snapshot
+    directory = Path(directory or _report_dir or '')
+    if not directory.name:
+        return None
+    current = snapshot()
+    lines = [f'{name:<24}{count:>10}' for name, count in count_objects().items()]
+    if current:
+        lines.append(f'\ntraced {tracemalloc.get_traced_memory()[0] / 1024 / 1024:.1f} MB, '
+                     f'peak {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MB\n')
+        stats = current.compare_to(_last_snapshot, 'lineno') if _last_snapshot else current.statistics('lineno')
+        for stat in stats[:TOP_STATS]:
+            lines.append(str(stat))
+        _last_snapshot = current
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory.joinpath(f'wolverine_memory_{os.getpid()}_{datetime.now():%Y%m%d_%H%M%S_%f}.txt')
+    path.write_text('\n'.join(lines))
+    log.info(f'Memory report written to ({path})')
+    return path
+
+
+def enable(directory: str | Path, frames: int = DEFAULT_FRAMES) -> None:
+    """
+    Trace allocations and write a report to directory at every SIGUSR1 (posix) and at exit
+    """
+    global _report_dir
+    _report_dir = Path(directory)
+    start(frames)
+    atexit.register(write_report)
+    if hasattr(signal, 'SIGUSR1'):
+        try:
+            signal.signal(signal.SIGUSR1, lambda *_: write_report())
+        except ValueError:  # not on the main thread
+            log.warning('Memory reports can only be requested with SIGUSR1 from the main thread')
+
+
+if os.getenv('WOLVERINE_MEMORY'):
+    enable(os.getenv('WOLVERINE_MEMORY'))
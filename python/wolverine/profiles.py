@@ -0,0 +1,129 @@
+"""
+Export profiles, encode settings used for shot movies and audio. The default profile ('copy') stream-copies movies,
+the others re-encode them (frame accurate trims) with a fixed number of threads per ffmpeg process so the job engine
+can run cpu_count / threads of them side by side without oversubscribing the CPU.
+
+    export.export_shots(shots, export_dir, profile=profiles.get_profile('h264_proxy'))
+
+Studio profiles can be added with register_profile().
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+from wolverine import jobs
+
+
+@dataclass(frozen=True)
+class ExportProfile:
+    name: str
+    description: str = ''
+    video_codec: str = 'copy'       # ffmpeg -c:v, copy keeps the source stream (cut on key frames)
+    preset: str = ''                # -preset (x264/x265)
+    crf: int | None = None          # -crf (x264/x265)
+    video_options: tuple[str, ...] = ()  # any other video output option (eg: ('-profile:v', '0') for prores)
+    pixel_format: str = ''          # -pix_fmt
+    width: int | None = None        # scaled width, height keeps the aspect ratio
+    container: str = ''             # movie extension, the source one if empty
+    movie_audio_codec: str = 'copy'  # audio stream of the movie
+    audio_codec: str = 'pcm_s16le'  # audio only extracts
+    sample_rate: int = 44100
+    channels: int = 2
+    audio_container: str = '.wav'
+    threads: int = 0                # threads per ffmpeg process, 0 lets ffmpeg decide
+
+    @property
+    def is_copy(self) -> bool:
+        return self.video_codec == 'copy'
+
+    def movie_suffix(self, source_suffix: str) -> str:
+        return self.container or source_suffix
+
+    def movie_resolution(self, resolution: tuple[int, int]) -> tuple[int, int]:
+        """
+        Size of the movies of a source at resolution, what scale={width}:-2 gives
+        """
+        if not self.width or self.is_copy:
+            return resolution
+        source_width, source_height = resolution
+        return self.width, round(self.width * source_height / source_width / 2) * 2
+
+    def thread_args(self) -> list[str]:
+        return ['-threads', str(self.threads)] if self.threads else []
+
+    def movie_args(self) -> list[str]:
+        if self.is_copy:
+            return ['-c:v', 'copy', '-c:a', self.movie_audio_codec]
+        args = ['-c:v', self.video_codec]
+        if self.preset:
+            args += ['-preset', self.preset]
+        if self.crf is not None:
+            args += ['-crf', str(self.crf)]
+        args += list(self.video_options)
+        if self.pixel_format:
+            args += ['-pix_fmt', self.pixel_format]
+        if self.width:
+            args += ['-vf', f'scale={self.width}:-2']
+        return args + ['-c:a', self.movie_audio_codec] + self.thread_args()
+
+    def audio_args(self) -> list[str]:
+        return ['-vn', '-acodec', self.audio_codec, '-ar', str(self.sample_rate), '-ac', str(self.channels)]
+
+    def job_limits(self, workers: int | None = None) -> dict[str, int]:
+        """
+        Job engine limits for this profile, workers forces the number of parallel jobs
+
+        Returns:
+            dict: resource class -> number of jobs
+        """
+        if workers:
+            return {jobs.DECODE: workers, jobs.IO: workers}
+        cpu_count = os.cpu_count() or 1
+        threads = self.threads or (1 if self.is_copy else cpu_count)
+        return {jobs.DECODE: max(1, cpu_count // threads), jobs.IO: jobs.DEFAULT_LIMITS[jobs.IO]}
+
+
+DEFAULT_PROFILE = 'copy'
+PROFILES: dict[str, ExportProfile] = {}
+
+
+def register_profile(profile: ExportProfile) -> ExportProfile:
+    PROFILES[profile.name] = profile
+    return profile
+
+
+def get_profile(profile: str | ExportProfile | None = None) -> ExportProfile:
+    """
+    Profile by name, profiles are returned as is and None gives the default profile
+    """
+    if isinstance(profile, ExportProfile):
+        return profile
+    name = profile or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f'Unknown export profile ({name}), available profiles : {", ".join(PROFILES)}')
+    return PROFILES[name]
+
+
+register_profile(ExportProfile(
+    name='copy',
+    description='Stream copy (fast, cuts on key frames)',
+))
+register_profile(ExportProfile(
+    name='h264_proxy',
+    description='H.264 1280px review proxies',
+    video_codec='libx264', preset='veryfast', crf=23, pixel_format='yuv420p', width=1280, container='.mp4',
+    movie_audio_codec='aac', threads=2,
+))
+register_profile(ExportProfile(
+    name='h264_full',
+    description='H.264 full resolution',
+    video_codec='libx264', preset='medium', crf=18, pixel_format='yuv420p', container='.mp4',
+    movie_audio_codec='aac', threads=4,
+))
+register_profile(ExportProfile(
+    name='prores_proxy',
+    description='ProRes 422 Proxy',
+    video_codec='prores_ks', video_options=('-profile:v', '0'), pixel_format='yuv422p10le', container='.mov',
+    movie_audio_codec='pcm_s16le', threads=2,
+))
@@ -0,0 +1,103 @@
+"""
+Schema-versioned (de)serialization of shot lists
+
+Shots are stored as rows of plain values following SHOT_FIELDS, which is a lot cheaper to build and parse than one
+dict per shot and keeps the session files small. orjson is used for the json encoding when it is available.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Iterable
+
+from wolverine.shots import ShotData
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SHOTS_SCHEMA_VERSION = 1
+SHOT_FIELDS = ('index', 'fps', 'source', 'start', 'duration', 'new_start', 'thumbnail', 'movie', 'audio', 'prefix',
+               'enabled', 'ignored')
+
+
+def dumps(data: Any) -> str:
+    if orjson:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, separators=(',', ':'))
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def shots_schema() -> dict[str, Any]:
+    return {'version': SHOTS_SCHEMA_VERSION, 'fields': list(SHOT_FIELDS)}
+
+
+def shot_to_row(shot: ShotData) -> list[Any]:
+    thumbnail, movie, audio = shot.thumbnail, shot.movie, shot.audio
+    return [
+        shot.index,
+        shot.fps,
+        shot.source.as_posix(),
+        shot.start_frame,
+        shot.duration,
+        shot.new_start,
+        thumbnail.as_posix() if thumbnail else None,
+        movie.as_posix() if movie else None,
+        audio.as_posix() if audio else None,
+        shot.prefix,
+        shot.enabled,
+        shot.ignored,
+    ]
+
+
+def shot_from_row(row: list[Any] | tuple[Any, ...]) -> ShotData:
+    index, fps, source, start, duration, new_start, thumbnail, movie, audio, prefix, enabled, ignored = row
+    return ShotData.from_frames(
+        index=index,
+        fps=fps,
+        source=Path(source),
+        start=start,
+        duration=duration,
+        new_start=new_start,
+        thumbnail=Path(thumbnail) if thumbnail else None,
+        movie=Path(movie) if movie else None,
+        audio=Path(audio) if audio else None,
+        prefix=prefix,
+        enabled=enabled,
+        ignored=ignored,
+        auto_thumbnail=False,
+    )
+
+
+def dump_shots(shots: Iterable[ShotData]) -> list[list[Any]]:
+    return [shot_to_row(shot) for shot in shots]
+
+
+def load_shots(rows: list[Any], schema: dict[str, Any] | None = None) -> list[ShotData]:
+    """
+    Rebuild ShotData from serialized rows, shots saved as dicts (before the row format existed) are also accepted
+
+    Args:
+        rows: serialized shots
+        schema: schema the rows were written with, as returned by shots_schema()
+    """
+    if not schema:
+        return [ShotData.from_dict(shot_dict) for shot_dict in rows]
+    version = schema.get('version')
+    if version != SHOTS_SCHEMA_VERSION:
+        raise ValueError(f'Unsupported shots schema version ({version}), expected ({SHOTS_SCHEMA_VERSION})')
+    fields = tuple(schema.get('fields', SHOT_FIELDS))
+    if fields != SHOT_FIELDS:
+        # same version but fields written in another order, remap them by name
+        missing = set(SHOT_FIELDS).difference(fields)
+        if missing:
+            raise ValueError(f'Serialized shots are missing fields ({", ".join(sorted(missing))})')
+        order = [fields.index(f) for f in SHOT_FIELDS]
+        rows = [[row[i] for i in order] for row in rows]
+    return [shot_from_row(row) for row in rows]
@@ -0,0 +1,552 @@
+"""
+UI-free session model : source, shots, sorting/re-indexing, edits, auto-saves, timeline and exports
+
+Front-ends (Qt UI, command line) drive a WolverineSession and subscribe to its events to update themselves.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable
+
+from opentimelineio import opentime, schema
+
+from wolverine import log
+from wolverine import jobs
+from wolverine import analysis
+from wolverine import memory  # noqa: F401, imported for WOLVERINE_MEMORY reports in every front-end
+from wolverine import trace
+from wolverine import utils
+from wolverine import export
+from wolverine import profiles
+from wolverine import cut_list
+from wolverine import serialization
+from wolverine import versions
+from wolverine import shot_index
+from wolverine.shots import ShotData
+from wolverine.shot_table import ShotTable, set_prefix
+from wolverine.validation import repair_shots
+from wolverine.autosave import AutoSaver, read_auto_save
+
+TEMP_SAVE_DIR = Path(os.getenv('WOLVERINE_PREFS_PATH', Path.home())).joinpath('wolverine')
+DEFAULT_THRESHOLD = 45
+
+# events emitted by WolverineSession and the arguments given to their callbacks
+SOURCE_CHANGED = 'source_changed'  # (source: Path, probe_data: FFProbe)
+SHOTS_CHANGED = 'shots_changed'    # (shots: list[ShotData])
+PROGRESS = 'progress'              # (stage: str, current: int, total: int)
+MEDIA_PROGRESS = 'media_progress'  # (stage: str, progress: jobs.AggregateProgress), seconds decoded/written by ffmpeg
+EXPORTED = 'exported'              # (export_directory: Path, errors: int)
+THUMBNAIL_READY = 'thumbnail_ready'  # (shot: ShotData)
+
+# thumbnail job priorities (lower runs first), shots on screen jump ahead of the ones generated in shot order
+VISIBLE_PRIORITY = 0
+BACKGROUND_PRIORITY = 1000
+
+
+class WolverineSession:
+    """
+    Shots of a source movie and every operation done on them
+
+    Events are emitted from the thread running the operation, front-ends that need their own thread (eg: Qt) have
+    to forward them (a queued signal does the job). Long operations (detect, export) can be run on a worker thread
+    with submit().
+    """
+
+    def __init__(self) -> None:
+        self.source: Path | None = None
+        self.probe_data: utils.FFProbe | None = None
+        self.threshold: int = DEFAULT_THRESHOLD
+        self.prefix: str = ''
+        self.shot_start: int = 101
+        self.export_directory: str = ''
+        self.shots: list[ShotData] = []
+        self.timeline: schema.Timeline | None = None
+        self.analysis: analysis.SourceAnalysis | None = None
+        self.analysis_settings = analysis.AnalysisSettings()
+        self.ignore_rules = analysis.IgnoreRules()
+        # shots keep their index (name) when others are added or removed, set once a new version was loaded
+        self.keep_names = False
+
+        self._lock = threading.RLock()
+        self._listeners: dict[str, list[Callable]] = defaultdict(list)
+        self._auto_saver = AutoSaver()
+        self._executor: ThreadPoolExecutor | None = None
+        # thumbnail bookkeeping only, never held while waiting on the job engine : done callbacks take it from the
+        # engine thread, which the session lock would block while an edit probes through that same engine
+        self._jobs_lock = threading.RLock()
+        self._thumbnail_jobs: dict[ShotData, Future] = {}
+        self._prioritized: list[ShotData] = []
+
+    # events
+    def subscribe(self, event: str, callback: Callable) -> Callable[[], None]:
+        """
+        Returns:
+            Callable: function removing the subscription
+        """
+        self._listeners[event].append(callback)
+        return lambda: self.unsubscribe(event, callback)
+
+    def unsubscribe(self, event: str, callback: Callable) -> None:
+        if callback in self._listeners[event]:
+            self._listeners[event].remove(callback)
+
+    def emit(self, event: str, *args: Any) -> None:
+        for callback in list(self._listeners[event]):
+            try:
+                callback(*args)
+            except Exception as e:
+                log.critical(f'Session event callback failed ({event}): {e}')
+
+    def _progress(self, progress: export.ProgressCallback | None = None) -> export.ProgressCallback:
+        def report(stage: str, current: int, total: int) -> None:
+            if progress:
+                progress(stage, current, total)
+            self.emit(PROGRESS, stage, current, total)
+        return report
+
+    def _media_progress(self, stage: str) -> Callable[[jobs.AggregateProgress], None]:
+        return lambda media_progress: self.emit(MEDIA_PROGRESS, stage, media_progress)
+
+    def submit(self, func: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Run a session operation on the session worker thread
+        """
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wolverine-session')
+        return self._executor.submit(func, *args, **kwargs)
+
+    # source and detection
+    @trace.traced('session.load_source')
+    def load_source(self, source: str | Path) -> utils.FFProbe:
+        source = Path(source)
+        probe_data = utils.probe_file(source)
+        if not probe_data:
+            raise ValueError(f'Could not probe file ({source})')
+        self.cancel_thumbnails()
+        with self._lock:
+            self.source = source
+            self.probe_data = probe_data
+            self.shots = []
+            self.timeline = None
+            self.analysis = None
+            self.keep_names = False
+        self.emit(SOURCE_CHANGED, source, probe_data)
+        return probe_data
+
+    @trace.traced('session.detect')
+    def detect(self, threshold: int | None = None, auto_thumbnail: bool = True,
+               progress: export.ProgressCallback | None = None) -> list[ShotData]:
+        if not self.source or not self.probe_data:
+            raise ValueError('No source loaded')
+        if threshold is not None:
+            self.threshold = threshold
+        progress = self._progress(progress)
+
+        # a single decode of the source, detecting again (any threshold) reads the analysis cache
+        try:
+            self.analysis = analysis.analyze(self.source, self.probe_data.fps, self.probe_data.frames,
+                                             settings=self.analysis_settings, progress=self._media_progress('detect'))
+        except (jobs.JobError, OSError) as e:
+            log.critical(f'Could not analyze file ({self.source})')
+            log.critical(e)
+            self.analysis = None
+        if self.analysis and self.analysis.frames != self.probe_data.frames:
+            # containers without a frame count only give an estimate
+            self.probe_data.frames = self.analysis.frames
+        shot_starts = self.analysis.cuts(self.threshold) if self.analysis else []
+        detected = []
+        for shot in utils.shots_from_starts(self.source, self.probe_data.fps, shot_starts, self.probe_data.frames,
+                                            auto_thumbnail=False):
+            detected.append(shot)
+            progress('detect', len(detected), len(shot_starts))
+        if self.analysis:
+            # black gaps, slates and leader don't need any media
+            flagged = analysis.flag_ignored(detected, self.analysis, self.ignore_rules)
+            log.debug(f'{len(flagged)} shots flagged as ignored')
+        self.cancel_thumbnails()
+        self.keep_names = False
+        self.set_shots(detected)
+        if auto_thumbnail:
+            self.request_thumbnails(self.shots)
+        return self.shots
+
+    @trace.traced('session.import_cut_list')
+    def import_cut_list(self, path: str | Path, offset: int = 0, auto_thumbnail: bool = True,
+                        progress: export.ProgressCallback | None = None) -> list[ShotData]:
+        """
+        Cut the source as in an editorial cut list (EDL, FCP XML or .otio) instead of detecting shots, see
+        cut_list.read_shots
+        """
+        if not self.source or not self.probe_data:
+            raise ValueError('No source loaded')
+        progress = self._progress(progress)
+        imported = cut_list.read_shots(path, self.source, self.probe_data.fps, self.probe_data.frames, offset=offset)
+        progress('import', len(imported), len(imported))
+        self.cancel_thumbnails()
+        self.keep_names = False
+        self.set_shots(imported)
+        if auto_thumbnail:
+            self.request_thumbnails(self.shots)
+        return self.shots
+
+    @trace.traced('session.update_source')
+    def update_source(self, source: str | Path, auto_thumbnail: bool = True,
+                      progress: export.ProgressCallback | None = None) -> list[ShotData]:
+        """
+        Replace the source by a new version of it : shots in frames unchanged since the current source are carried
+        over (same name, state and cached media), only the changed frames are analyzed and cut. Shot names are kept
+        from then on (see keep_names and versions)
+
+        Raises:
+            ValueError: there are no shots to carry over or the new version could not be probed
+            JobError, OSError: a version could not be decoded
+        """
+        if not self.source or not self.shots:
+            raise ValueError('No shots to carry over, detect or import the shots of the previous version first')
+        source = Path(source)
+        probe_data = utils.probe_file(source)
+        if not probe_data:
+            raise ValueError(f'Could not probe file ({source})')
+        progress = self._progress(progress)
+
+        result, segments = versions.update(self.source, source, probe_data.fps, probe_data.frames,
+                                           settings=self.analysis_settings, progress=self._media_progress('update'))
+        probe_data.frames = result.frames
+        carried = versions.carry_shots(self.shots, segments, source)
+        added = versions.cut_changed(result, carried, source, self.threshold, new_start=self.shot_start,
+                                     prefix=self.prefix)
+        flagged = analysis.flag_ignored(added, result, self.ignore_rules)
+        # changed shots (re-rendered, re-graded, trimmed) keep their name when they still look the same
+        carried_indices = {shot.index for shot in carried}
+        dropped = [s for s in self.shots if s.index not in carried_indices]
+        previous = analysis.load(self.source)
+        renamed = 0
+        if previous and previous.signature_array() is not None:
+            renamed = shot_index.rename(shot_index.match_shots(previous, dropped, result, added))
+        log.info(f'{len(carried)} of {len(self.shots)} shots carried over to ({source.name}), {len(added)} new shots '
+                 f'({len(flagged)} ignored, {renamed} matching a previous shot)')
+        progress('update', len(carried), len(self.shots))
+
+        self.cancel_thumbnails()
+        with self._lock:
+            self.source = source
+            self.probe_data = probe_data
+            self.analysis = result
+            self.keep_names = True
+        self.emit(SOURCE_CHANGED, source, probe_data)
+        self.set_shots(carried + added)
+        if auto_thumbnail:
+            self.request_thumbnails(self.shots)
+        return self.shots
+
+    def set_shots(self, shots: Iterable[ShotData]) -> None:
+        with self._lock:
+            self.shots = list(shots)
+            if self.shots:
+                set_prefix(self.shots, self.prefix)
+        self.sort_shots()
+
+    # edits
+    @trace.traced('session.sort_shots')
+    def sort_shots(self, pinned: list[ShotData] | None = None) -> None:
+        """
+        Sort, repair and re-index shots then rebuild the timeline, pinned shots keep their range when neighbours are
+        repaired
+        """
+        with self._lock:
+            if not self.shots:
+                return
+
+            pinned = pinned or []
+            self.shots = sorted(self.shots, key=lambda x: x.start_frame)
+            # check if first shot starts at 0
+            if self.shots[0].start_frame != 0:
+                cur_first = self.shots[0]
+                new_first = ShotData(
+                    index=0,
+                    fps=cur_first.fps,
+                    source=cur_first.source,
+                    range=opentime.range_from_start_end_time_inclusive(
+                        start_time=opentime.from_frames(0, cur_first.fps),
+                        end_time_inclusive=opentime.from_frames((cur_first.start_frame - 1), cur_first.fps),
+                    ),
+                    new_start=self.shot_start,
+                    prefix=self.prefix,
+                    ignored=True,
+                    enabled=False,
+                    auto_thumbnail=False,
+                )
+                self.shots.insert(0, new_first)
+                self.request_thumbnail(new_first)
+            # fix gaps/overlaps left by the last edit
+            repaired = repair_shots(self.shots, nb_frames=self.probe_data.frames if self.probe_data else None,
+                                    pinned=pinned)
+            if not repaired.report.is_valid:
+                log.debug(f'Repaired shot list :\n{repaired.report}')
+            self.shots = repaired.shots
+            for shot in repaired.removed:
+                self.cancel_thumbnail(shot)
+            for shot in repaired.moved:
+                if shot not in pinned:
+                    # re-cut, the queued thumbnail (if any) shows the wrong frame
+                    self.request_thumbnail(shot, VISIBLE_PRIORITY if pinned else BACKGROUND_PRIORITY,
+                                           restart=True)
+            # reset shot indices
+            shot_table = ShotTable(self.shots)
+            shot_table.renumber(keep=shot_table.index > 0 if self.keep_names else None)
+            shot_table.commit()
+
+            self.timeline = export.build_timeline(self.shots, self.source or self.shots[0].source)
+        self.emit(SHOTS_CHANGED, self.shots)
+
+    def find_shot(self, frame: int) -> ShotData | None:
+        """
+        Shot containing frame, shots are kept sorted by sort_shots so this is a binary search
+        """
+        row = bisect_right(self.shots, frame, key=lambda x: x.start_frame) - 1
+        if row < 0:
+            return None
+        shot = self.shots[row]
+        return shot if shot.start_frame <= frame <= shot.end_frame else None
+
+    def add_shot(self, start_frame: int, end_frame: int | None = None) -> ShotData | None:
+        closest_shot = self.find_shot(start_frame)
+        if not closest_shot:
+            return None
+        if end_frame is None:
+            end_frame = closest_shot.end_frame
+        if (start_frame, end_frame) == (closest_shot.start_frame, closest_shot.end_frame):
+            return None
+
+        fps = self.probe_data.fps if self.probe_data else closest_shot.fps
+        new_shot = ShotData(
+            index=0,
+            source=self.source or closest_shot.source,
+            fps=fps,
+            range=opentime.range_from_start_end_time_inclusive(
+                start_time=opentime.from_frames(start_frame, fps),
+                end_time_inclusive=opentime.from_frames(end_frame, fps)
+            ),
+            new_start=self.shot_start,
+            prefix=self.prefix,
+            auto_thumbnail=False,
+        )
+        with self._lock:
+            closest_shot.end_frame = (start_frame - 1)
+            self.shots.append(new_shot)
+        self.request_thumbnail(new_shot, VISIBLE_PRIORITY)
+        self.sort_shots()
+        return new_shot
+
+    def remove_shot(self, frame: int) -> ShotData | None:
+        closest_shot = self.find_shot(frame)
+        if not closest_shot:
+            return None
+        # the previous shot is extended over the removed range when the shot list gets repaired
+        with self._lock:
+            self.shots.remove(closest_shot)
+        self.cancel_thumbnail(closest_shot)
+        self.sort_shots()
+        return closest_shot
+
+    def move_shot_start(self, old_start: int, new_start: int) -> ShotData | None:
+        if old_start == new_start:
+            return None
+        closest_shot = self.find_shot(old_start)
+        if not closest_shot:
+            return None
+        closest_shot.start_frame = new_start
+        self.update_shot(closest_shot)
+        return closest_shot
+
+    def update_shot(self, shot: ShotData) -> None:
+        """
+        Shot range was edited, neighbours are trimmed/extended around it, thumbnails of the shot and of the moved
+        neighbours are regenerated in the background (rapid edits of the same shot supersede each other)
+        """
+        self.request_thumbnail(shot, VISIBLE_PRIORITY, restart=True)
+        self.sort_shots(pinned=[shot])
+
+    def set_prefix(self, prefix: str) -> None:
+        self.prefix = prefix
+        if set_prefix(self.shots, prefix):
+            self.sort_shots()
+
+    def set_shot_start(self, shot_start: int) -> None:
+        self.shot_start = shot_start
+        shot_table = ShotTable(self.shots)
+        shot_table.set_new_start(shot_start)
+        if shot_table.commit():
+            self.sort_shots()
+
+    # background thumbnails
+    def _thumbnail_done(self, shot: ShotData, future: Future) -> None:
+        with self._jobs_lock:
+            # a superseded job that finished anyway doesn't get to announce an outdated thumbnail
+            if self._thumbnail_jobs.get(shot) is not future:
+                return
+            del self._thumbnail_jobs[shot]
+        if future.cancelled() or future.exception() or not future.result():
+            return
+        self.emit(THUMBNAIL_READY, shot)
+
+    def request_thumbnail(self, shot: ShotData, priority: int = BACKGROUND_PRIORITY, restart: bool = False) -> Future:
+        """
+        Queue a thumbnail on the job engine, THUMBNAIL_READY is emitted (from the engine thread) once it is written.
+        A shot already queued only gets its priority raised unless restart is True (its range changed), the pending
+        job is then superseded : cancelled (its ffmpeg process killed) and replaced by a new one
+        """
+        engine = jobs.get_engine()
+        key = (shot, 'thumbnail')
+        with self._jobs_lock:
+            future = self._thumbnail_jobs.get(shot)
+            if future and not future.done():
+                if not restart:
+                    engine.reprioritize(key, priority)
+                    return future
+                future.cancel()
+            future = engine.schedule(shot.generate_media_async('thumbnail', engine, priority, key=key), key=key)
+            self._thumbnail_jobs[shot] = future
+        future.add_done_callback(lambda f: self._thumbnail_done(shot, f))
+        return future
+
+    def request_thumbnails(self, shots: Iterable[ShotData]) -> None:
+        for i, shot in enumerate(shots):
+            self.request_thumbnail(shot, BACKGROUND_PRIORITY + i)
+
+    def prioritize_thumbnails(self, shots: Iterable[ShotData]) -> None:
+        """
+        Shots shown by the UI (on screen, under the playhead) get their pending thumbnails first, in the given order,
+        previously prioritized shots go back in line
+        """
+        shots = list(shots)
+        engine = jobs.get_engine()
+        with self._jobs_lock:
+            order = {shot: i for i, shot in enumerate(self.shots)}
+            for shot in self._prioritized:
+                if shot not in shots and shot in self._thumbnail_jobs:
+                    engine.reprioritize((shot, 'thumbnail'), BACKGROUND_PRIORITY + order.get(shot, 0))
+            for i, shot in enumerate(shots):
+                if shot in self._thumbnail_jobs:
+                    engine.reprioritize((shot, 'thumbnail'), VISIBLE_PRIORITY + i)
+            self._prioritized = shots
+
+    def cancel_thumbnail(self, shot: ShotData) -> None:
+        with self._jobs_lock:
+            future = self._thumbnail_jobs.pop(shot, None)
+        if future:
+            future.cancel()
+
+    def cancel_thumbnails(self) -> None:
+        with self._jobs_lock:
+            futures = list(self._thumbnail_jobs.values())
+            self._thumbnail_jobs.clear()
+            self._prioritized = []
+        for future in futures:
+            future.cancel()
+
+    def wait_thumbnails(self, timeout: float | None = None) -> None:
+        with self._jobs_lock:
+            futures = list(self._thumbnail_jobs.values())
+        wait(futures, timeout)
+
+    # auto-saves
+    def auto_save_path(self, source: str | Path | None = None) -> Path:
+        source = Path(source or self.source)
+        return TEMP_SAVE_DIR.joinpath(f'auto_saves/{source.stem}.json')
+
+    def to_save_data(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'source': self.source.as_posix() if self.source else '',
+                'threshold': self.threshold,
+                'probe_data': self.probe_data.to_dict() if self.probe_data else {},
+                'prefix': self.prefix,
+                'shot_start': self.shot_start,
+                'keep_names': self.keep_names,
+                'export_directory': Path(self.export_directory).as_posix() if self.export_directory else '',
+                'shots_schema': serialization.shots_schema(),
+                'shots': serialization.dump_shots(self.shots),
+            }
+
+    def write_auto_save(self, save_path: str | Path | None = None) -> None:
+        """
+        Hand the session over to the background auto-save writer
+        """
+        if not self.source:
+            return
+        with self._lock:
+            save_data = self.to_save_data()
+            # journal entries follow shots across edits that move them to another row
+            shot_ids = [id(shot) for shot in self.shots]
+        self._auto_saver.save(save_path or self.auto_save_path(), save_data, shot_ids)
+
+    def flush_auto_save(self, timeout: float | None = None) -> bool:
+        return self._auto_saver.flush(timeout)
+
+    def read_auto_save(self, source: str | Path | None = None, save_path: str | Path | None = None) -> dict:
+        self.flush_auto_save()
+        return read_auto_save(save_path or self.auto_save_path(source))
+
+    @trace.traced('session.load_save_data')
+    def load_save_data(self, save_data: dict[str, Any], progress: export.ProgressCallback | None = None) -> None:
+        progress = self._progress(progress)
+        self.threshold = save_data.get('threshold', DEFAULT_THRESHOLD)
+        self.export_directory = save_data.get('export_directory', '')
+        self.prefix = save_data.get('prefix', '')
+        self.shot_start = save_data.get('shot_start', 101)
+        self.keep_names = save_data.get('keep_names', False)
+
+        loaded = serialization.load_shots(save_data.get('shots', []), save_data.get('shots_schema'))
+        self.cancel_thumbnails()
+        self.set_shots(loaded)
+        # missing thumbnails are generated in the background, in shot order unless the UI asks for others first
+        self.request_thumbnails([s for s in self.shots if not s.thumbnail or not s.thumbnail.exists()])
+        progress('load', len(loaded), len(loaded))
+
+    # exports
+    @trace.traced('session.export')
+    def export(self, export_directory: str | Path | None = None, media: Iterable[str] = export.SHOT_MEDIA,
+               timelines: Iterable[str] = tuple(export.TIMELINE_ADAPTERS),
+               export_actions: list[tuple[export.ExportAction, Any]] | None = None, workers: int | None = None,
+               progress: export.ProgressCallback | None = None,
+               profile: str | profiles.ExportProfile | None = None) -> int:
+        """
+        Export shot media, timelines and run custom export actions
+
+        Returns:
+            int: number of timelines and custom export actions that failed
+        """
+        export_directory = Path(export_directory or self.export_directory)
+        media = list(media)
+        if not self.shots:
+            raise ValueError('No shots to export')
+        progress = self._progress(progress)
+        export_directory.mkdir(parents=True, exist_ok=True)
+        # background thumbnails would point shots back to the temp directory once the export is done
+        if 'thumbnails' in media:
+            self.cancel_thumbnails()
+        else:
+            self.wait_thumbnails()
+
+        # shots point to their exported media once planned, timelines are written from then on alongside the media
+        plan = export.plan_shots_export(self.shots, export_directory, media, profile)
+        with self._lock:
+            self.timeline = export.build_timeline(self.shots, self.source, profiles.get_profile(profile))
+        timeline_exports = export.TimelineExports(self.timeline, export_directory, self.source.stem, timelines)
+        try:
+            export.export_shots(self.shots, export_directory, media, workers=workers, progress=progress,
+                                profile=profile, plan=plan, media_progress=self._media_progress('export'))
+        except BaseException:
+            timeline_exports.cancel()
+            raise
+        export_errors = len(timeline_exports.wait(progress))
+        export_errors += export.run_export_actions(export_actions or [], export_directory, self.shots,
+                                                   progress=progress)
+        self.emit(EXPORTED, export_directory, export_errors)
+        return export_errors
@@ -0,0 +1,184 @@
+"""
+Perceptual hashes of shots, to find which shots of a new cut are the shots of the previous one even when they were
+re-rendered, re-graded, trimmed or moved
+
+    index = shot_index.ShotIndex.from_shots(previous_analysis, previous_shots)
+    matches = index.match(shot_index.shot_hashes(result, shots))   # {row in shots: row in previous_shots}
+
+Hashes come from the analysis frame signatures (see analysis.SIGNATURE_SIZE), nothing is decoded : the luma of
+HASH_SAMPLES frames sampled across a shot goes through a DCT and the 64 lowest frequencies are compared to their median
+(pHash), brightness and contrast changes leave them alone. Two shots are as far apart as the mean number of differing
+bits between each sample of one and the closest sample of the other, trims move samples but keep them close to one.
+
+Hashes are packed in uint64 and compared all at once (xor + bit count), thousands of shots are matched in a fraction
+of a second without any tree to build.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+
+from wolverine import analysis
+from wolverine.shots import ShotData
+
+HASH_SAMPLES = 4        # frames hashed per shot, evenly spread (the first and last frames, transitions, are skipped)
+HASH_SIZE = 8           # lowest DCT frequencies kept per axis, 64 bits
+MAX_DISTANCE = 10.0     # mean differing bits (of 64) of shots showing the same thing
+BLOCK_SHOTS = 64        # shots compared at once, bounds the memory used by distances()
+
+_BYTE_BITS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    # set bits per uint64 before NumPy 2.0 (no np.bitwise_count), one table lookup per byte
+    values = np.ascontiguousarray(values)
+    return _BYTE_BITS[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+_bit_count = getattr(np, 'bitwise_count', _popcount)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    # orthonormal DCT-II
+    frequencies, samples = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    matrix = np.cos(np.pi * (2 * samples + 1) * frequencies / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def frame_hashes(signatures: np.ndarray) -> np.ndarray:
+    """
+    pHash of frame signatures, the luma plane (first width * height bytes) of each
+
+    Returns:
+        np.ndarray: (frames,) uint64 hashes
+    """
+    width, height = analysis.SIGNATURE_SIZE
+    luma = signatures[:, :width * height].reshape(-1, height, width).astype(np.float32)
+    rows, columns = _dct_matrix(height)[:HASH_SIZE], _dct_matrix(width)[:HASH_SIZE]
+    low = (rows @ luma @ columns.T).reshape(len(luma), -1)
+    # the DC term (mean brightness) is left out of the median
+    bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view('>u8').astype(np.uint64).ravel()
+
+
+def sample_frames(shots: Iterable[ShotData], frames: int) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (shots, HASH_SAMPLES) frames hashed per shot, within the analyzed frames
+    """
+    ranges = np.array([(s.start_frame, s.duration) for s in shots], dtype=np.int64).reshape(-1, 2)
+    positions = np.arange(1, HASH_SAMPLES + 1) / (HASH_SAMPLES + 1)
+    samples = ranges[:, :1] + (ranges[:, 1:] * positions).astype(np.int64)
+    return np.clip(samples, 0, max(frames - 1, 0))
+
+
+def shot_hashes(result: analysis.SourceAnalysis, shots: Iterable[ShotData]) -> np.ndarray:
+    """
+    Hashes of the sampled frames of shots, shots must be cut from the source result is the analysis of
+
+    Returns:
+        np.ndarray: (shots, HASH_SAMPLES) uint64 hashes
+
+    Raises:
+        ValueError: the analysis has no frame signatures
+    """
+    signatures = result.signature_array()
+    if signatures is None:
+        raise ValueError('The analysis has no frame signatures, analyze the source again')
+    samples = sample_frames(shots, result.frames)
+    return frame_hashes(signatures[samples.ravel()]).reshape(samples.shape)
+
+
+class ShotIndex:
+    """
+    Packed hashes of a list of shots, searched by Hamming distance
+    """
+
+    def __init__(self, hashes: np.ndarray) -> None:
+        self.hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, HASH_SAMPLES)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @classmethod
+    def from_shots(cls, result: analysis.SourceAnalysis, shots: Iterable[ShotData]) -> ShotIndex:
+        return cls(shot_hashes(result, shots))
+
+    def distances(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (len(hashes), len(self)) mean differing bits between each sample of hashes and the closest
+                sample of the indexed shots
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, HASH_SAMPLES)
+        result = np.empty((len(hashes), len(self)), dtype=np.float32)
+        # one indexed sample at a time : (shots, indexed shots) temporaries reduced in place are much faster than
+        # a 4d array reduced on its small last axis
+        columns = [np.ascontiguousarray(self.hashes[:, sample]) for sample in range(HASH_SAMPLES)]
+        for start in range(0, len(hashes), BLOCK_SHOTS):
+            block = hashes[start:start + BLOCK_SHOTS]
+            total = np.zeros((len(block), len(self)), dtype=np.uint16)
+            for sample in range(HASH_SAMPLES):
+                values = block[:, sample, None]
+                closest = _bit_count(values ^ columns[0])
+                for column in columns[1:]:
+                    np.minimum(closest, _bit_count(values ^ column), out=closest)
+                total += closest
+            result[start:start + len(block)] = total / HASH_SAMPLES
+        return result
+
+    def match(self, hashes: np.ndarray, max_distance: float = MAX_DISTANCE) -> dict[int, int]:
+        """
+        One to one matches of hashes rows to indexed rows, closest pairs first
+
+        Returns:
+            dict: indexed row per matched hashes row
+        """
+        if not len(self) or not len(hashes):
+            return {}
+        distances = self.distances(hashes)
+        rows, indexed_rows = np.nonzero(distances <= max_distance)
+        order = np.argsort(distances[rows, indexed_rows], kind='stable')
+        matches, taken = {}, set()
+        for row, indexed_row in zip(rows[order].tolist(), indexed_rows[order].tolist()):
+            if row in matches or indexed_row in taken:
+                continue
+            matches[row] = indexed_row
+            taken.add(indexed_row)
+        return matches
+
+
+def match_shots(previous_result: analysis.SourceAnalysis, previous_shots: list[ShotData],
+                result: analysis.SourceAnalysis, shots: list[ShotData],
+                max_distance: float = MAX_DISTANCE) -> list[tuple[ShotData, ShotData]]:
+    """
+    Shots of a new cut (cut from the source of result) showing the same thing as shots of the previous one, ignored
+    shots (black, slates) are left out
+
+    Returns:
+        list: (shot, previous shot) pairs in shots order
+    """
+    previous_shots = [s for s in previous_shots if not s.ignored]
+    shots = [s for s in shots if not s.ignored]
+    if not previous_shots or not shots:
+        return []
+    index = ShotIndex.from_shots(previous_result, previous_shots)
+    matches = index.match(shot_hashes(result, shots), max_distance)
+    return [(shots[row], previous_shots[matches[row]]) for row in sorted(matches)]
+
+
+def rename(matches: Iterable[tuple[ShotData, ShotData]]) -> int:
+    """
+    Give shots the index and state of their previous shot, their name once sorted with the session keep_names on
+
+    Returns:
+        int: renamed shots
+    """
+    renamed = 0
+    for shot, previous_shot in matches:
+        shot.index, shot.prefix = previous_shot.index, previous_shot.prefix
+        shot.new_start, shot.enabled = previous_shot.new_start, previous_shot.enabled
+        renamed += 1
+    return renamed
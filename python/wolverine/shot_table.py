@@ -0,0 +1,193 @@
+"""
+Columnar (NumPy) view over a list of shots, used for bulk operations (re-indexing, offsets, validation, etc...)
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+
+from wolverine.shots import ShotData
+
+INDEX_STEP = 10
+IGNORED_INDEX_OFFSET = 5
+
+
+class ShotTable:
+    """
+    Shot columns (start, duration, new_start, index, enabled, ignored) stored as arrays, row i is self.shots[i]
+
+    Operations only change the arrays, commit() writes the rows that changed back to their ShotData in one go
+    (instead of one attribute write, and dirty flag, at a time).
+    """
+
+    def __init__(self, shots: Iterable[ShotData]) -> None:
+        self.shots: list[ShotData] = list(shots)
+        nb_shots = len(self.shots)
+        self.start = np.fromiter((s.start_frame for s in self.shots), dtype=np.int64, count=nb_shots)
+        self.duration = np.fromiter((s.duration for s in self.shots), dtype=np.int64, count=nb_shots)
+        self.new_start = np.fromiter((s.new_start for s in self.shots), dtype=np.int64, count=nb_shots)
+        self.index = np.fromiter((s.index for s in self.shots), dtype=np.int64, count=nb_shots)
+        self.enabled = np.fromiter((s.enabled for s in self.shots), dtype=bool, count=nb_shots)
+        self.ignored = np.fromiter((s.ignored for s in self.shots), dtype=bool, count=nb_shots)
+        self._committed = self._columns()
+
+    def __len__(self) -> int:
+        return len(self.shots)
+
+    def __getitem__(self, row: int) -> ShotData:
+        return self.shots[row]
+
+    def _columns(self) -> tuple[np.ndarray, ...]:
+        return (self.start.copy(), self.duration.copy(), self.new_start.copy(), self.index.copy(),
+                self.enabled.copy(), self.ignored.copy())
+
+    @property
+    def end(self) -> np.ndarray:
+        # inclusive end frames, same rule as ShotData.end_frame
+        return self.start + np.maximum(self.duration - 1, 0)
+
+    def _mask(self, mask: np.ndarray | None) -> np.ndarray | slice:
+        return slice(None) if mask is None else mask
+
+    def sort(self) -> None:
+        """
+        Sort rows by start frame
+        """
+        order = np.argsort(self.start, kind='stable')
+        if np.array_equal(order, np.arange(len(order))):
+            return
+        self.reorder(order)
+
+    def reorder(self, order: np.ndarray) -> None:
+        """
+        Reorder rows, order being the row indices in their new order
+        """
+        self.shots = [self.shots[i] for i in order]
+        self.start, self.duration, self.new_start = self.start[order], self.duration[order], self.new_start[order]
+        self.index, self.enabled, self.ignored = self.index[order], self.enabled[order], self.ignored[order]
+        self._committed = tuple(column[order] for column in self._committed)
+
+    def shift(self, offset: int, mask: np.ndarray | None = None) -> None:
+        """
+        Move shots by offset frames, keeping their duration
+        """
+        self.start[self._mask(mask)] += offset
+
+    def shift_new_start(self, offset: int, mask: np.ndarray | None = None) -> None:
+        self.new_start[self._mask(mask)] += offset
+
+    def set_new_start(self, value: int, mask: np.ndarray | None = None) -> None:
+        self.new_start[self._mask(mask)] = value
+
+    def renumber(self, step: int = INDEX_STEP, ignored_offset: int = IGNORED_INDEX_OFFSET,
+                 keep: np.ndarray | None = None) -> None:
+        """
+        Re-index shots in row order, ignored shots get the index of the previous shot + ignored_offset
+        (eg: SH010, SH015_IGNORED, SH020)
+
+        Rows of the keep mask keep their index as long as kept indices increase in row order (names stay the same),
+        the others get the index of the previous row + 1 (eg: SH010, SH011, SH020) and the usual step after the last
+        kept row. When a row doesn't fit before the next kept one, every row is re-indexed.
+        """
+        if keep is None or not keep.any():
+            counts = np.cumsum(~self.ignored, dtype=np.int64)
+            self.index = np.where(self.ignored, counts * step + ignored_offset, counts * step)
+            return
+
+        keep = keep.copy()
+        last_kept = -1
+        for row in np.flatnonzero(keep):
+            # moved before shots numbered lower (re-ordered), numbered like new rows
+            if self.index[row] <= last_kept:
+                keep[row] = False
+            else:
+                last_kept = self.index[row]
+        index = self.index.copy()
+        previous, next_row = 0, 0
+        kept_rows = np.flatnonzero(keep)
+        for row in range(len(index)):
+            if keep[row]:
+                previous = index[row]
+                next_row += 1
+                continue
+            if next_row < len(kept_rows):
+                index[row] = previous + 1
+                if index[row] >= index[kept_rows[next_row]]:
+                    self.renumber(step, ignored_offset)
+                    return
+            else:
+                base = previous - previous % step
+                index[row] = base + ignored_offset if self.ignored[row] else base + step
+                index[row] = max(index[row], previous + 1)
+            previous = index[row]
+        self.index = index
+
+    def gaps(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: rows (in start order) followed by missing frames before the next shot starts
+        """
+        order = np.argsort(self.start, kind='stable')
+        starts, ends = self.start[order], self.end[order]
+        return order[:-1][starts[1:] > ends[:-1] + 1]
+
+    def overlaps(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: rows (in start order) whose range runs over the start of the next shot
+        """
+        order = np.argsort(self.start, kind='stable')
+        starts, ends = self.start[order], self.end[order]
+        return order[:-1][starts[1:] <= ends[:-1]]
+
+    def changed_rows(self) -> np.ndarray:
+        changed = np.zeros(len(self.shots), dtype=bool)
+        for column, committed in zip(self._columns(), self._committed):
+            changed |= column != committed
+        return np.flatnonzero(changed)
+
+    def commit(self) -> list[ShotData]:
+        """
+        Write changed rows back to their ShotData
+
+        Returns:
+            list[ShotData]: shots that were updated
+        """
+        rows = self.changed_rows()
+        index_only = ((self.start[rows] == self._committed[0][rows])
+                      & (self.duration[rows] == self._committed[1][rows])
+                      & (self.new_start[rows] == self._committed[2][rows])
+                      & (self.enabled[rows] == self._committed[4][rows])
+                      & (self.ignored[rows] == self._committed[5][rows]))
+        updated = []
+        for row, skip_otio in zip(rows.tolist(), index_only.tolist()):
+            shot = self.shots[row]
+            # set slots directly, shots are flagged for an otio update once instead of once per attribute
+            object.__setattr__(shot, '_start', int(self.start[row]))
+            object.__setattr__(shot, '_duration', int(self.duration[row]))
+            object.__setattr__(shot, 'new_start', int(self.new_start[row]))
+            object.__setattr__(shot, 'index', int(self.index[row]))
+            object.__setattr__(shot, 'enabled', bool(self.enabled[row]))
+            object.__setattr__(shot, 'ignored', bool(self.ignored[row]))
+            if skip_otio:
+                # renumbered only : the clip is renamed rather than built again
+                shot.rename_otio_clip()
+            else:
+                object.__setattr__(shot, '_update_otio', True)
+            updated.append(shot)
+        self._committed = self._columns()
+        return updated
+
+
+def set_prefix(shots: Iterable[ShotData], prefix: str) -> list[ShotData]:
+    """
+    Set prefix on every shot that doesn't already have it
+
+    Returns:
+        list[ShotData]: shots that were updated
+    """
+    updated = [shot for shot in shots if shot.prefix != prefix]
+    for shot in updated:
+        shot.prefix = prefix
+    return updated
@@ -1,46 +1,116 @@
 from __future__ import annotations
-import subprocess
 from pathlib import Path
 from tempfile import gettempdir
-from dataclasses import dataclass, asdict
-from typing import Any
+from typing import Any, Hashable
 
 from opentimelineio import opentime
 from opentimelineio.schema import Clip, Marker, ExternalReference, Box2d, V2d, MissingReference
 
 from wolverine import log
+from wolverine import jobs
+from wolverine import trace
+from wolverine import profiles
+from wolverine import media_cache
+
+MEDIA_TYPES = ('thumbnail', 'movie', 'audio')
+
+_resolutions: dict[tuple[str, int], tuple[int, int] | None] = {}
+
+
+def probe_resolution(file_path: Path) -> tuple[int, int] | None:
+    """
+    Width and height of the first video stream of file_path (memoized while the file doesn't change)
+    """
+    memo_key = (file_path.as_posix(), file_path.stat().st_mtime_ns if file_path.exists() else 0)
+    if memo_key in _resolutions:
+        return _resolutions[memo_key]
+    probe_cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height',
+                 '-of', 'csv=s=x:p=0', file_path.as_posix()]
+    try:
+        resolution = jobs.get_engine().run_sync(probe_cmd, resource=jobs.PROBE).stdout.strip()
+    except (jobs.JobError, OSError) as e:
+        log.critical(f'Could not probe file ({file_path})')
+        log.critical(e)
+        return None
+    _resolutions[memo_key] = tuple(int(s) for s in resolution.decode().split('x')) if resolution else None
+    return _resolutions[memo_key]
 
 
-@dataclass
 class ShotData:
-    index: int
-    fps: float
-    source: Path
-    range: opentime.TimeRange
-    new_start: int = 101
-    thumbnail: Path = None
-    movie: Path = None
-    audio: Path = None
-    prefix: str = ''
-    enabled: bool = True
-    ignored: bool = False
-    _otio_clip: Clip = None
-    _update_otio: bool = False
-    _save_dir: Path = None
+    """
+    A shot of a source movie, frames are stored as plain ints, OpenTimelineIO objects (range, otio_clip) are only
+    built when asked for
+    """
+    __slots__ = ('index', 'fps', 'source', 'new_start', 'thumbnail', 'movie', 'audio', 'prefix', 'enabled', 'ignored',
+                 '_start', '_duration', '_otio_clip', '_update_otio', '_save_dir')
+
+    def __init__(self, index: int, fps: float, source: Path, range: opentime.TimeRange, new_start: int = 101,
+                 thumbnail: Path = None, movie: Path = None, audio: Path = None, prefix: str = '',
+                 enabled: bool = True, ignored: bool = False, _otio_clip: Clip = None, _update_otio: bool = False,
+                 _save_dir: Path = None, auto_thumbnail: bool = True) -> None:
+        self.index = index
+        self.fps = fps
+        self.source = source
+        self._start = range.start_time.to_frames()
+        self._duration = range.duration.to_frames()
+        self.new_start = new_start
+        self.thumbnail = thumbnail
+        self.movie = movie
+        self.audio = audio
+        self.prefix = prefix
+        self.enabled = enabled
+        self.ignored = ignored
+        self._otio_clip = _otio_clip
+        self._save_dir = _save_dir
+        self._update_otio = _update_otio
+
+        if auto_thumbnail and (not self.thumbnail or not self.thumbnail.exists()):
+            self.generate_thumbnail()
+
+    @classmethod
+    def from_frames(cls, index: int, fps: float, source: Path, start: int, duration: int, **kwargs) -> ShotData:
+        """
+        Build a shot from frame numbers, skips creating (then discarding) an otio TimeRange
+        """
+        shot = cls.__new__(cls)
+        for attr, default in (('new_start', 101), ('thumbnail', None), ('movie', None), ('audio', None),
+                              ('prefix', ''), ('enabled', True), ('ignored', False), ('_otio_clip', None),
+                              ('_save_dir', None)):
+            object.__setattr__(shot, attr, kwargs.get(attr, default))
+        object.__setattr__(shot, 'index', index)
+        object.__setattr__(shot, 'fps', fps)
+        object.__setattr__(shot, 'source', source)
+        object.__setattr__(shot, '_start', int(start))
+        object.__setattr__(shot, '_duration', int(duration))
+        object.__setattr__(shot, '_update_otio', kwargs.get('_update_otio', False))
+        if kwargs.get('auto_thumbnail', True) and (not shot.thumbnail or not shot.thumbnail.exists()):
+            shot.generate_thumbnail()
+        return shot
 
     def __repr__(self) -> str:
         return (f'ShotData ({self.name}) [{self.start_frame}-{self.end_frame}] '
                 f'-> [{self.new_start}-{self.new_end}][Dur:{self.duration}]')
 
     def __setattr__(self, __name: str, __value: Any) -> None:
-        super().__setattr__(__name, __value)
-        if __name.startswith('_') or __name in ['index']:
+        object.__setattr__(self, __name, __value)
+        if __name[0] == '_':
             return
-        self._update_otio = True
-
-    def __post_init__(self) -> None:
-        if not self.thumbnail or not self.thumbnail.exists():
-            self.generate_thumbnail()
+        if __name == 'index':
+            self.rename_otio_clip()
+            return
+        object.__setattr__(self, '_update_otio', True)
+
+    def rename_otio_clip(self) -> None:
+        """
+        Give the built otio clip (and its markers) the current name, the only part of it depending on the index
+        """
+        # __init__ sets the index before the clip slots exist
+        if not getattr(self, '_otio_clip', None) or self._update_otio:
+            return
+        self._otio_clip.name = self.name
+        self._otio_clip.metadata['name'] = self.name
+        for marker in self._otio_clip.markers:
+            marker.name = self.name
 
     @property
     def name(self) -> str:
@@ -48,21 +118,31 @@ class ShotData:
         ignored = '' if not self.ignored else '_IGNORED'
         return f'{prefix}SH{self.index:03d}{ignored}'
 
+    @property
+    def range(self) -> opentime.TimeRange:
+        return opentime.TimeRange(
+            start_time=opentime.RationalTime(self._start, self.fps),
+            duration=opentime.RationalTime(self._duration, self.fps),
+        )
+
+    @range.setter
+    def range(self, value: opentime.TimeRange) -> None:
+        self._start = value.start_time.to_frames()
+        self._duration = value.duration.to_frames()
+
     @property
     def start_frame(self) -> int:
-        return self.range.start_time.to_frames()
+        return self._start
 
     @start_frame.setter
     def start_frame(self, value: int) -> None:
-        duration = (self.end_frame - value) + 1
-        self.range = opentime.TimeRange(
-            start_time=opentime.from_frames(value, self.fps),
-            duration=opentime.from_frames(duration, self.fps),
-        )
+        # keep the end frame where it is
+        self._duration = (self.end_frame - value) + 1
+        self._start = value
 
     @property
     def start_time(self) -> float:
-        return self.range.start_time.to_seconds()
+        return self._start / self.fps
 
     @start_time.setter
     def start_time(self, value: float) -> None:
@@ -70,75 +150,52 @@ class ShotData:
 
     @property
     def duration(self) -> int:
-        return self.range.duration.to_frames()
+        return self._duration
 
     @duration.setter
     def duration(self, value: int) -> None:
-        self.range = opentime.TimeRange(
-            start_time=self.range.start_time,
-            duration=opentime.from_frames(value, self.fps),
-        )
+        self._duration = value
 
     @property
     def duration_time(self) -> float:
-        return self.range.duration.to_seconds()
+        return self._duration / self.fps
 
     @duration_time.setter
     def duration_time(self, value: float) -> None:
-        self.range = opentime.TimeRange(
-            start_time=self.range.start_time,
-            duration=opentime.to_frames(opentime.from_seconds(value, self.fps)),
-        )
+        self.duration = opentime.from_seconds(value, self.fps).to_frames()
 
     @property
     def end_frame(self) -> int:
-        return self.range.end_time_inclusive().to_frames()
+        # same as TimeRange.end_time_inclusive, a shot shorter than 2 frames ends on its start frame
+        return self._start + max(self._duration - 1, 0)
 
     @end_frame.setter
     def end_frame(self, value: int) -> None:
-        self.range = opentime.range_from_start_end_time_inclusive(
-            start_time=self.range.start_time,
-            end_time_inclusive=opentime.from_frames(value, self.fps)
-        )
+        self._duration = (value - self._start) + 1
 
     @property
     def end_time(self) -> float:
-        return self.range.end_time_inclusive().to_seconds()
+        return self.end_frame / self.fps
 
     @end_time.setter
     def end_time(self, value: float) -> None:
-        self.range = opentime.range_from_start_end_time_inclusive(
-            self.range.start_time,
-            end_time_inclusive=opentime.to_frames(opentime.from_seconds(value, self.fps))
-        )
+        self.end_frame = opentime.from_seconds(value, self.fps).to_frames()
 
     @property
     def new_end(self) -> int:
-        new_range = opentime.TimeRange(
-            start_time=opentime.from_frames(self.new_start, self.fps),
-            duration=self.range.duration
-        )
-        return new_range.end_time_inclusive().to_frames()
+        return self.new_start + max(self._duration - 1, 0)
 
     @new_end.setter
     def new_end(self, value: int) -> None:
-        new_range = opentime.range_from_start_end_time_inclusive(
-            start_time=opentime.from_frames(self.new_start, self.fps),
-            end_time_inclusive=opentime.from_frames(value, self.fps)
-        )
-        self.duration = new_range.duration.to_frames()
+        self.duration = (value - self.new_start) + 1
 
     @property
     def new_end_time(self) -> float:
-        return opentime.to_seconds(opentime.from_frames(self.end_frame, self.fps))
+        return self.end_frame / self.fps
 
     @new_end_time.setter
     def new_end_time(self, value: float) -> None:
-        new_range = opentime.range_from_start_end_time_inclusive(
-            start_time=opentime.from_frames(self.new_start, self.fps),
-            end_time_inclusive=opentime.to_frames(opentime.from_seconds(value, self.fps))
-        )
-        self.duration = new_range.duration.to_frames()
+        self.new_end = opentime.from_seconds(value, self.fps).to_frames()
 
     @property
     def otio_clip(self) -> Clip:
@@ -162,18 +219,13 @@ class ShotData:
         # add media references if any
         clip_box = None
         if self.thumbnail or self.movie:
-            file_path = self.thumbnail or self.movie
-            probe_cmd = (f'ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=s=x:p=0 '
-                         f'"{file_path.as_posix()}"')
-            try:
-                resolution = subprocess.check_output(probe_cmd, shell=True)
-            except subprocess.CalledProcessError as e:
-                log.critical(f'Could not probe file ({file_path})')
-                log.critical(e)
-                resolution = None
+            # thumbnails are full frames of the source, probing it once gives the bounds of every clip and lets
+            # timelines be built before the exported media exist. Movies of a scaling profile are smaller, exports
+            # set their bounds (see export.build_timeline)
+            file_path = self.source if self.source.exists() else self.thumbnail or self.movie
+            resolution = probe_resolution(file_path)
             if resolution:
-                width, height = (int(s) for s in str(resolution.decode()).split('x'))
-                clip_box = Box2d(V2d(width, height))
+                clip_box = Box2d(V2d(*resolution))
 
         media_refs = {}
         if self.thumbnail:
@@ -197,7 +249,9 @@ class ShotData:
     def save_directory(self) -> Path:
         if self._save_dir:
             return self._save_dir
-        temp_dir = Path(gettempdir()).joinpath(f'wolverine/{self.source.stem}')
+        # sources sharing a name (eg: the same edit in several folders) don't share a directory
+        fingerprint = media_cache.source_fingerprint(self.source)[:8] if self.source.exists() else ''
+        temp_dir = Path(gettempdir()).joinpath(f'wolverine/{self.source.stem}_{fingerprint}'.rstrip('_'))
         if not temp_dir.exists():
             temp_dir.mkdir(parents=True)
         self._save_dir = temp_dir
@@ -207,94 +261,122 @@ class ShotData:
     def save_directory(self, value: str | Path) -> None:
         self._save_dir = Path(value)
 
-    def generate_thumbnail(self) -> None:
-        thumb_out = self.save_directory.joinpath(f'{self.name}.jpg')
-        start_time = opentime.to_time_string(self.range.start_time)
-
-        command_list = ['ffmpeg -hide_banner -loglevel error -y',
-                        f'-i "{self.source.as_posix()}"',
-                        f'-ss {start_time} -vframes:v 1',
-                        f'-fps_mode vfr "{thumb_out.as_posix()}"']
-        # command_list = f'ffmpeg -loglevel quiet -i "{self.source.as_posix()}" -vf "thumbnail={self.start_frame}" -vframes 1 -vsync vfr "{thumb_out.as_posix()}"'
-
-        res = self._generate_media(' '.join(command_list), thumb_out)
-        self.thumbnail = thumb_out if res else None
-
-    def generate_movie(self) -> None:
-        shot_out = self.save_directory.joinpath(f'{self.name}{self.source.suffix}')
-        start_time = opentime.to_time_string(self.range.start_time)
-        duration_time = opentime.to_time_string(self.range.duration)
-
-        command_list = ['ffmpeg -hide_banner -loglevel error -y',
-                        f'-i "{self.source.as_posix()}"',
-                        f'-ss {start_time} -t {duration_time}',
-                        '-c:v copy -c:a copy -fps_mode vfr',
-                        f'{shot_out.as_posix()}']
-        # command_list = f'ffmpeg -loglevel quiet -i "{self.source.as_posix()}" -ss {start_time} -vframes {self.duration} -vsync vfr {shot_out.as_posix()}'
-
-        res = self._generate_media(' '.join(command_list), shot_out)
-        self.movie = shot_out if res else None
-
-    def generate_audio(self) -> None:
-        shot_out = self.save_directory.joinpath(f'{self.name}.wav')
+    def media_duration(self, media: str) -> float:
+        """
+        Seconds of output the extraction of media writes
+        """
+        return 1 / self.fps if media == 'thumbnail' else self.duration_time
+
+    def media_command(self, media: str, profile: str | profiles.ExportProfile | None = None
+                      ) -> tuple[list[str], Path, str]:
+        """
+        Args:
+            media: one of MEDIA_TYPES (thumbnail, movie, audio)
+            profile: export profile (or its name) used for movies and audio, the default one if None
+
+        Returns:
+            tuple: ffmpeg arguments, output path and the job engine resource class the command uses
+        """
+        profile = profiles.get_profile(profile)
         start_time = opentime.to_time_string(self.range.start_time)
         duration_time = opentime.to_time_string(self.range.duration)
-
-        # https://superuser.com/questions/609740/extracting-wav-from-mp4-while-preserving-the-highest-possible-quality
-        # ffmpeg -i input.mp4 -vn -acodec pcm_s16le -ar 44100 -ac 2 output.wav
-        command_list = ['ffmpeg -hide_banner -loglevel error -y',
-                        f'-i "{self.source.as_posix()}"',
-                        f'-ss {start_time} -t {duration_time}',
-                        '-vn -acodec pcm_s16le -ar 44100 -ac 2',
-                        '-fps_mode vfr',
-                        f'{shot_out.as_posix()}']
-
-        res = self._generate_media(' '.join(command_list), shot_out)
-        self.audio = shot_out if res else None
-
-    def _generate_media(self, command: str, output_path: Path) -> bool:
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', self.source.as_posix()]
+        if media == 'thumbnail':
+            output_path = self.save_directory.joinpath(f'{self.name}.jpg')
+            # seeking before the input (decodes from the closest key frame, not from the start of the source)
+            command = command[:-2] + ['-ss', start_time, '-i', self.source.as_posix(),
+                                      '-vframes:v', '1', '-fps_mode', 'vfr']
+            resource = jobs.DECODE
+        elif media == 'movie' and profile.is_copy:
+            output_path = self.save_directory.joinpath(f'{self.name}{profile.movie_suffix(self.source.suffix)}')
+            command += ['-ss', start_time, '-t', duration_time] + profile.movie_args() + ['-fps_mode', 'vfr']
+            resource = jobs.IO
+        elif media == 'movie':
+            # re-encoded, seeking before the input is fast and frame accurate, the frame count gives the exact length
+            output_path = self.save_directory.joinpath(f'{self.name}{profile.movie_suffix(self.source.suffix)}')
+            command = command[:-2] + ['-ss', start_time, '-i', self.source.as_posix(),
+                                      '-frames:v', str(self.duration), '-t', duration_time] + profile.movie_args()
+            resource = jobs.DECODE
+        elif media == 'audio':
+            # https://superuser.com/questions/609740/extracting-wav-from-mp4-while-preserving-the-highest-possible-quality
+            # ffmpeg -i input.mp4 -vn -acodec pcm_s16le -ar 44100 -ac 2 output.wav
+            output_path = self.save_directory.joinpath(f'{self.name}{profile.audio_container}')
+            command = command[:-2] + ['-ss', start_time, '-i', self.source.as_posix(),
+                                      '-t', duration_time] + profile.audio_args() + ['-fps_mode', 'vfr']
+            resource = jobs.DECODE
+        else:
+            raise ValueError(f'Unknown media type ({media}), expected one of {MEDIA_TYPES}')
+        return command + [output_path.as_posix()], output_path, resource
+
+    def generate_thumbnail(self, priority: int = 0) -> None:
+        self._generate_media('thumbnail', priority)
+
+    def generate_movie(self, priority: int = 0) -> None:
+        self._generate_media('movie', priority)
+
+    def generate_audio(self, priority: int = 0) -> None:
+        self._generate_media('audio', priority)
+
+    def _generate_media(self, media: str, priority: int = 0) -> bool:
+        engine = jobs.get_engine()
+        return engine.schedule(self.generate_media_async(media, engine, priority)).result()
+
+    async def generate_media_async(self, media: str, engine: jobs.MediaJobEngine | None = None,
+                                   priority: int = 0, key: Hashable | None = None,
+                                   profile: str | profiles.ExportProfile | None = None,
+                                   progress: jobs.JobProgressCallback | None = None) -> bool:
+        """
+        Extract media with the job engine and store its path on the shot (None if the extraction failed), progress
+        gets the ffmpeg progress of the extraction (see media_duration)
+        """
+        engine = engine or jobs.get_engine()
         if not self.source.exists() or self.source.stat().st_size == 0:
-            log.critical('No source specified or source doesn\'t exist or is empty at : ({self.source})')
+            log.critical(f'No source specified or source doesn\'t exist or is empty at : ({self.source})')
+            setattr(self, media, None)
             return False
 
-        log.debug(f'Running Movie Extract Command : {command}')
-        err_msg = f'Could not extract media from file ({self.source.as_posix()})'
+        command, output_path, resource = self.media_command(media, profile)
+        log.debug(f'Running Movie Extract Command : {" ".join(command)}')
         try:
-            subprocess.check_output(command, shell=True)
-        except subprocess.CalledProcessError:
-            log.critical(err_msg)
+            with trace.span(media, 'shots', shot=self.name):
+                await media_cache.produce(self.source, command, engine, resource=resource, priority=priority,
+                                          key=key, progress=progress, duration=self.media_duration(media))
+        except (jobs.JobError, OSError) as e:
+            log.critical(f'Could not extract media from file ({self.source.as_posix()})')
+            log.debug(e)
+            setattr(self, media, None)
             return False
 
-        if not output_path.exists() or output_path.stat().st_size == 0:
-            log.critical(err_msg)
+        setattr(self, media, output_path)
         return True
 
     def to_dict(self) -> dict[str, Any]:
-        def dict_factory(shot_data: list[tuple[str, Any]]):
-            shot_dict = {}
-            for k, v in shot_data:
-                if k.startswith('_'):
-                    continue
-                if isinstance(v, Path):
-                    v = v.as_posix()
-                if isinstance(v, opentime.TimeRange):
-                    v = {'start_time': v.start_time.to_frames(), 'duration': v.duration.to_frames()}
-                shot_dict[k] = v
-            return shot_dict
-
-        return asdict(self, dict_factory=dict_factory)
+        # built by hand rather than with dataclasses.asdict, which deep-copies every field (otio clip included)
+        return {
+            'index': self.index,
+            'fps': self.fps,
+            'source': self.source.as_posix(),
+            'range': {'start_time': self.start_frame, 'duration': self.duration},
+            'new_start': self.new_start,
+            'thumbnail': self.thumbnail.as_posix() if self.thumbnail else None,
+            'movie': self.movie.as_posix() if self.movie else None,
+            'audio': self.audio.as_posix() if self.audio else None,
+            'prefix': self.prefix,
+            'enabled': self.enabled,
+            'ignored': self.ignored,
+        }
 
     @staticmethod
-    def from_dict(values: dict[str, Any]) -> ShotData:
-        values['source'] = Path(values['source'])
-        values['range'] = opentime.TimeRange(
-            start_time=opentime.from_frames(values['range']['start_time'], values['fps']),
-            duration=opentime.from_frames(values['range']['duration'], values['fps']),
+    def from_dict(values: dict[str, Any], auto_thumbnail: bool = False) -> ShotData:
+        values = dict(values)
+        frame_range = values.pop('range')
+        for key in ['thumbnail', 'movie', 'audio']:
+            if values.get(key):
+                values[key] = Path(values[key])
+        return ShotData.from_frames(
+            start=frame_range['start_time'],
+            duration=frame_range['duration'],
+            source=Path(values.pop('source')),
+            auto_thumbnail=auto_thumbnail,
+            **values
         )
-        if values.get('thumbnail'):
-            values['thumbnail'] = Path(values['thumbnail'])
-        if values.get('movie'):
-            values['movie'] = Path(values['movie'])
-        if values.get('audio'):
-            values['audio'] = Path(values['audio'])
-        return ShotData(**values)
@@ -0,0 +1,228 @@
+"""
+Per-stage timings : spans record wall time, CPU time, subprocesses run and bytes written, they can be written as a
+Chrome trace (open it in https://ui.perfetto.dev or chrome://tracing) or printed as a summary table.
+
+    trace.enable()
+    with trace.span('export.shots', shots=len(shots)):
+        ...
+    trace.write('export_trace.json')
+    print(trace.summary())
+
+Spans nest per thread/task (context variables), jobs scheduled on the job engine belong to the span that scheduled
+them, so subprocesses and bytes written add up in every enclosing span. Tracing is off by default and span() then
+returns a shared no-op object. WOLVERINE_TRACE=<file.json> enables it for the whole process and writes the trace
+at exit.
+"""
+from __future__ import annotations
+
+import os
+import json
+import atexit
+import threading
+from time import perf_counter_ns, thread_time_ns
+from pathlib import Path
+from functools import wraps
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from wolverine import log
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+_enabled = False
+_events: list[dict[str, Any]] = []
+_origin = perf_counter_ns()
+_lock = threading.Lock()
+_current: ContextVar[Span | None] = ContextVar('wolverine_span', default=None)
+
+
+def _children_cpu_ns() -> int:
+    if not resource:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return int((usage.ru_utime + usage.ru_stime) * 1e9)
+
+
+class Span:
+    """
+    cpu is the CPU time of the thread running the span, children_cpu the CPU time of finished subprocesses (process
+    wide, spans running side by side share it, posix only)
+    """
+    __slots__ = ('name', 'category', 'args', 'parent', 'subprocesses', 'bytes_written', '_start', '_cpu_start',
+                 '_children_cpu_start', '_token')
+
+    def __init__(self, name: str, category: str, args: dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+        self.parent: Span | None = None
+        self.subprocesses = 0
+        self.bytes_written = 0
+
+    def __enter__(self) -> Span:
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        self._children_cpu_start = _children_cpu_ns()
+        self._cpu_start = thread_time_ns()
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end = perf_counter_ns()
+        cpu = thread_time_ns() - self._cpu_start
+        _current.reset(self._token)
+        record(self.name, self._start, end, self.category, cpu=cpu,
+               children_cpu=_children_cpu_ns() - self._children_cpu_start,
+               subprocesses=self.subprocesses, bytes_written=self.bytes_written, **self.args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(path: str | Path | None = None) -> None:
+    """
+    Start recording spans, the trace is written to path at exit if given
+    """
+    global _enabled
+    _enabled = True
+    if path:
+        atexit.register(write, path)
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _events.clear()
+
+
+def span(name: str, category: str = 'wolverine', **args: Any) -> Span | _NullSpan:
+    """
+    Context manager timing its block, args are shown with the span in trace viewers
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(name: str | None = None, category: str = 'wolverine') -> Callable:
+    """
+    Decorator, time every call of a function (not for generators or coroutines, use span() in their body)
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add(subprocesses: int = 0, bytes_written: int = 0) -> None:
+    """
+    Count subprocesses and bytes written in the current span and every span enclosing it
+    """
+    if not _enabled:
+        return
+    current = _current.get()
+    with _lock:
+        while current:
+            current.subprocesses += subprocesses
+            current.bytes_written += bytes_written
+            current = current.parent
+
+
+def add_output(path: str | Path) -> None:
+    """
+    Count the size of a written file
+    """
+    if _enabled and os.path.isfile(path):
+        add(bytes_written=os.path.getsize(path))
+
+
+def record(name: str, start: int, end: int, category: str = 'wolverine', **args: Any) -> None:
+    """
+    Record a span that was timed some other way (perf_counter_ns start and end), eg: work done by another process
+    """
+    if not _enabled:
+        return
+    event = {
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': (start - _origin) / 1000,
+        'dur': (end - start) / 1000,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'args': args,
+    }
+    with _lock:
+        _events.append(event)
+
+
+def events() -> list[dict[str, Any]]:
+    with _lock:
+        return list(_events)
+
+
+def write(path: str | Path) -> Path:
+    """
+    Write recorded spans as a Chrome trace (json)
+    """
+    path = Path(path)
+    thread_names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.ident,
+                     'args': {'name': thread.name}} for thread in threading.enumerate()]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'traceEvents': thread_names + events(), 'displayTimeUnit': 'ms'}))
+    log.info(f'Trace written to ({path})')
+    return path
+
+
+def summary() -> str:
+    """
+    Table of spans grouped by name : calls, wall, cpu and subprocesses CPU time, subprocesses and bytes written
+    (nested spans are also counted in the spans enclosing them)
+    """
+    rows: dict[str, list[float]] = {}
+    for event in events():
+        row = rows.setdefault(event['name'], [0, 0.0, 0.0, 0.0, 0, 0])
+        args = event['args']
+        row[0] += 1
+        row[1] += event['dur'] / 1000
+        row[2] += args.get('cpu', 0) / 1e6
+        row[3] += args.get('children_cpu', 0) / 1e6
+        row[4] += args.get('subprocesses', 0)
+        row[5] += args.get('bytes_written', 0)
+    lines = [f'{"span":<32}{"calls":>7}{"wall ms":>12}{"cpu ms":>10}{"sub cpu ms":>12}{"procs":>7}{"MB written":>12}']
+    for name, (calls, wall, cpu, children_cpu, subprocesses, written) in sorted(rows.items(), key=lambda r: -r[1][1]):
+        lines.append(f'{name[:31]:<32}{calls:>7}{wall:>12.1f}{cpu:>10.1f}{children_cpu:>12.1f}{subprocesses:>7}'
+                     f'{written / 1024 / 1024:>12.2f}')
+    return '\n'.join(lines)
+
+
+if os.getenv('WOLVERINE_TRACE'):
+    enable(os.getenv('WOLVERINE_TRACE'))
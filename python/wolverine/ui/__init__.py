@@ -1,27 +1,37 @@
 from __future__ import annotations
 
-import os
 import sys
 from pathlib import Path
 from json import loads, dumps
+from typing import TYPE_CHECKING
 
-import mpv
 from superqt import QLabeledRangeSlider, QLabeledSlider
 from qt_py_tools.Qt import QtWidgets, QtCore
-from opentimelineio import opentime, schema, adapters
+from opentimelineio import opentime, schema
 
 from wolverine import log
+from wolverine import jobs
 from wolverine import shots
 from wolverine import utils
+from wolverine import session
+from wolverine import cut_list
 from wolverine.ui.ui_shots import ShotWidget, ShotInfoWidget, ShotListWidget
 from wolverine.ui.export import ExportAction, ExportActionsUi
 from wolverine.ui.ui_utils import get_icon, OTIOViewWidget
 
+try:
+    from wolverine.xlsx_writer import SHOT_LIST_ACTION
+except ImportError:  # xlsxwriter isn't installed
+    SHOT_LIST_ACTION = None
+
+if TYPE_CHECKING:
+    import mpv
+
 VALID_VIDEO_EXT = ['.mov', '.mp4', '.mkv', '.avi']
-TEMP_SAVE_DIR = Path(os.getenv('WOLVERINE_PREFS_PATH', Path.home())).joinpath('wolverine')
+TEMP_SAVE_DIR = session.TEMP_SAVE_DIR
+AUTO_SAVE_DELAY = 500  # ms to wait after the last edit before auto-saving
 
 
-# FIXME ignore button not working in ShotWidget
 # TODO when selecting video, if UI already loaded and video processed and selected video is the same, skip autosave check
 # TODO add parent sequence selection and add clips representing sequences with different colors (add toggle sequences in timeline button too)
 # TODO when playing select current shot in shots list, when clicking shot jump to shot start in timeline, when double clicking shot ab-loop over it
@@ -52,24 +62,6 @@ TEMP_SAVE_DIR = Path(os.getenv('WOLVERINE_PREFS_PATH', Path.home())).joinpath('w
 # TODO use opentime.rescaled_to to get correct ranges when fps from movie != fps in UI
 # FIXME keyboard shortcuts get overriden by dialog (make don't use QDialog)
 
-# from fcpxml.fcp import FCPXML
-# fcp_path = Path(r'C:\Users\rlahmidi\Desktop\TFTSet10_ANC_Full_230728_shotnumbers.xml')
-# test = FCPXML(xml_file=fcp_path.as_posix())
-# print(test)
-#
-# from edl import EDLParser
-# edl_path = Path(r'C:\Users\rlahmidi\Desktop\TFTSet10_ANC_Full_230728_shotnumbers.edl')
-# test = EDLParser(fps=self._probe_data.fps)
-# test.parse(edl_path.read_text())
-# print(test)
-#
-# from opentimelineio.adapters import read_from_file
-# fcp = read_from_file(fcp_path)
-# edl = read_from_file(edl_path)
-# # edl_clips = edl.each_child()
-# edl_clip = list(edl.each_clip())
-# start, duration = edl_clip.source_range
-
 # https://www.pythonguis.com/examples/python-multimedia-player/
 # from PySide2.QtCore import QUrl
 # from PySide2.QtMultimedia import QMediaPlayer, QAudio
@@ -225,24 +217,38 @@ class PlayerWidget(QtWidgets.QDialog):
         self.sig_player_shortcut.emit(QtCore.Qt.Key_M)
 
 
+class SessionSignals(QtCore.QObject):
+    # session events can be emitted from worker threads, going through signals gets them back on the UI thread
+    sig_shots_changed = QtCore.Signal()
+    sig_thumbnail_ready = QtCore.Signal(object)
+    sig_media_progress = QtCore.Signal(str, object)
+
+
 class WolverineUI(QtWidgets.QDialog):
 
-    def __init__(self, parent: QtWidgets.QWidget = None) -> None:
+    def __init__(self, parent: QtWidgets.QWidget = None, player: bool = True) -> None:
+        """
+        Without player no mpv player is made (no video playback), eg: for benchmarks running offscreen
+        """
         super().__init__(parent=parent)
         self.setWindowTitle('Wolverine - Sequence Splitter')
 
         self._last_pause_state: bool = True
-        self._probe_data: utils.FFProbe | None = None
         self._cur_shot_end = 0
-        self.shots: list[shots.ShotData] = []
-        self.timeline = None
-        self._export_actions: list[ExportAction] = []
+        self._export_actions: list[ExportAction] = [SHOT_LIST_ACTION] if SHOT_LIST_ACTION else []
+        self._session = session.WolverineSession()
+        self._session_signals = SessionSignals()
+        self._session.subscribe(session.SHOTS_CHANGED, lambda _: self._session_signals.sig_shots_changed.emit())
+        self._session.subscribe(session.THUMBNAIL_READY, self._session_signals.sig_thumbnail_ready.emit)
+        self._session.subscribe(session.MEDIA_PROGRESS, self._session_signals.sig_media_progress.emit)
+        # count based progress of the stage media progress is shown for, ignored while ffmpeg reports it
+        self._media_progress_stage: str | None = None
 
         self._build_ui()
         self._connect_ui()
         # self.installEventFilter(self)
 
-        self._player: mpv.MPV = self.__init_player()
+        self._player: mpv.MPV | None = self.__init_player() if player else None
 
     def _build_ui(self):
         self._src_file_le = QtWidgets.QLineEdit()
@@ -287,8 +293,14 @@ class WolverineUI(QtWidgets.QDialog):
         self._export_dir_le = QtWidgets.QLineEdit()
         self._export_dir_le.setReadOnly(True)
         self._browse_dst_pb = QtWidgets.QPushButton('Browse Destination')
-        self._import_pb = QtWidgets.QPushButton('Import')
-        self._import_pb.setVisible(False)
+        self._import_pb = QtWidgets.QPushButton('Import Cut List')
+        self._import_pb.setToolTip('Read shots from an EDL, FCP XML or .otio of the loaded movie instead of detecting '
+                                   'them')
+        self._import_pb.setEnabled(False)
+        self._update_version_pb = QtWidgets.QPushButton('Update Version')
+        self._update_version_pb.setToolTip('Replace the movie by a new version of it, shots in unchanged frames are '
+                                           'kept and only the changed frames are analyzed')
+        self._update_version_pb.setEnabled(False)
         self._export_pb = QtWidgets.QPushButton('Export')
         self._progress_bar = QtWidgets.QProgressBar()
         self._progress_bar.setTextVisible(True)
@@ -300,6 +312,11 @@ class WolverineUI(QtWidgets.QDialog):
 
         self._player_widget = PlayerWidget()
 
+        # coalesce bursts of edits into a single auto-save
+        self._auto_save_timer = QtCore.QTimer(self)
+        self._auto_save_timer.setSingleShot(True)
+        self._auto_save_timer.setInterval(AUTO_SAVE_DELAY)
+
         self._splitter = QtWidgets.QSplitter()
         self._splitter.setOrientation(QtCore.Qt.Orientation.Horizontal)
         self._splitter.addWidget(self._player_widget)
@@ -315,7 +332,8 @@ class WolverineUI(QtWidgets.QDialog):
         marker_lay.addWidget(self._current_frame_sp)
 
         layout = QtWidgets.QGridLayout()
-        layout.addWidget(self._src_file_le, 0, 0, 1, 3)
+        layout.addWidget(self._src_file_le, 0, 0, 1, 2)
+        layout.addWidget(self._update_version_pb, 0, 2, 1, 1)
         layout.addWidget(self._browse_src_pb, 0, 3, 1, 1)
         layout.addWidget(self._import_pb, 0, 4, 1, 1)
         layout.addWidget(self._threshold_sp, 0, 5, 1, 1)
@@ -335,6 +353,8 @@ class WolverineUI(QtWidgets.QDialog):
         self._browse_src_pb.clicked.connect(self._browse_input)
         self._src_file_le.editingFinished.connect(self._video_selected)
         self._process_pb.clicked.connect(self._process_video)
+        self._import_pb.clicked.connect(self._browse_cut_list)
+        self._update_version_pb.clicked.connect(self._browse_new_version)
 
         self._player_widget.sig_player_shortcut.connect(self._player_controls)
         self._player_widget.sig_player_volume.connect(self._set_player_volume)
@@ -348,11 +368,16 @@ class WolverineUI(QtWidgets.QDialog):
 
         self._browse_dst_pb.clicked.connect(self._browse_output)
         self._export_pb.clicked.connect(self._open_export_dialog)
+        self._auto_save_timer.timeout.connect(lambda: self.write_auto_save())
+        self._session_signals.sig_shots_changed.connect(self._shots_changed)
+        self._session_signals.sig_thumbnail_ready.connect(self._thumbnail_ready)
+        self._session_signals.sig_media_progress.connect(self._update_media_progress)
 
         self._shots_panel_lw.sig_shot_range_changed.connect(self._update_shot_neighbors)
         self._shots_panel_lw.sig_shots_changed.connect(self.sort_shots)
         self._shots_panel_lw.sig_shot_selected.connect(self._timeline_seek)
         self._shots_panel_lw.sig_shot_deleted.connect(lambda x: self._remove_shot(None, shot_start=x))
+        self._shots_panel_lw.sig_visible_shots_changed.connect(lambda _: self._prioritize_thumbnails())
 
         # OTIOview signals
         self._otio_view.timeline_widget.selection_changed.connect(self._timeline_selection_changed)
@@ -379,7 +404,26 @@ class WolverineUI(QtWidgets.QDialog):
     # def keyPressEvent(self, event):
     #     print('wolverine keyPressEvent ==> ', event)
 
+    @property
+    def session(self) -> session.WolverineSession:
+        return self._session
+
+    @property
+    def shots(self) -> list[shots.ShotData]:
+        return self._session.shots
+
+    @property
+    def timeline(self):
+        return self._session.timeline
+
+    @property
+    def _probe_data(self) -> utils.FFProbe | None:
+        return self._session.probe_data
+
     def __init_player(self) -> mpv.MPV:
+        # imported here so the UI can be built without libmpv
+        import mpv
+
         # set mpv player and time observer callback
         player = mpv.MPV(wid=str(int(self._player_widget.screen.winId())), keep_open='yes', framedrop='no')
 
@@ -419,14 +463,19 @@ class WolverineUI(QtWidgets.QDialog):
 
     def _load_video(self, video_path: Path):
         self._process_pb.setEnabled(True)
+        self._import_pb.setEnabled(True)
         self._threshold_sp.setEnabled(True)
 
-        self._probe_data = utils.probe_file(video_path)
-        if not self._probe_data:
+        try:
+            self._session.load_source(video_path)
+        except ValueError:
             err_msg = 'The file you have selected cannot be probed'
             QtWidgets.QMessageBox.critical(self, 'File Selection Error', err_msg)
             raise ValueError(err_msg)
+        self._video_loaded(video_path)
 
+    def _video_loaded(self, video_path: Path):
+        # widgets and player for the session source (loaded or updated to a new version)
         frame_range = (0, self._probe_data.frames)
 
         for widget in [self._got_to_frame_sp, self._zoom_timeline_sl]:
@@ -449,8 +498,9 @@ class WolverineUI(QtWidgets.QDialog):
         self._remove_marker_pb.setEnabled(True)
         self._shots_panel_lw.setEnabled(True)
 
-        self._player.loadfile(video_path.as_posix())
-        self._player.pause = True
+        if self._player:
+            self._player.loadfile(video_path.as_posix())
+            self._player.pause = True
 
     def _browse_output(self):
         last_directory = Path(self._export_dir_le.text())
@@ -458,16 +508,13 @@ class WolverineUI(QtWidgets.QDialog):
                                                                  last_directory.as_posix(),
                                                                  QtWidgets.QFileDialog.ShowDirsOnly)
         self._export_dir_le.setText(output_path)
-        self.write_auto_save()
+        self.request_auto_save()
 
     def load_auto_save(self, video_path: Path, save_path: Path = None) -> bool:
         video_path = Path(video_path or self._src_file_le.text())
         if not video_path.exists():
             return False
-        temp_save_path = Path(save_path or TEMP_SAVE_DIR.joinpath(f'auto_saves/{video_path.stem}.json'))
-        if not temp_save_path.exists():
-            return False
-        save_data = loads(temp_save_path.read_text())
+        save_data = self._session.read_auto_save(video_path, save_path)
         if not save_data.get('shots', []):
             return False
 
@@ -479,27 +526,30 @@ class WolverineUI(QtWidgets.QDialog):
         self._export_dir_le.setText(save_data.get('export_directory', ''))
         self._shots_panel_lw.prefix = save_data.get('prefix', '')
         self._shots_panel_lw.start = save_data.get('shot_start', '')
-        self._process_video(save_data=save_data['shots'])
+        self._process_video(save_data=save_data)
         return True
 
+    def _sync_session(self):
+        # push values only held by widgets to the session
+        self._session.threshold = self._threshold_sp.value()
+        self._session.prefix = self._shots_panel_lw.prefix
+        self._session.shot_start = self._shots_panel_lw.start
+        self._session.export_directory = self._export_dir_le.text()
+
     def write_auto_save(self, video_path: Path | str | None = None, save_path: Path | str | None = None):
-        video_path = Path(video_path or self._src_file_le.text())
-        export_dir = self._export_dir_le.text()
-        wolverine_data = {
-            'source': video_path.as_posix(),
-            'threshold': self._threshold_sp.value(),
-            'probe_data': self._probe_data.to_dict(),
-            'prefix': self._shots_panel_lw.prefix,
-            'shot_start': self._shots_panel_lw.start,
-            'export_directory': Path(export_dir).as_posix() if export_dir else '',
-            'shots': []
-        }
-        for shot in self.shots:
-            wolverine_data['shots'].append(shot.to_dict())
-
-        temp_save_path = Path(save_path or TEMP_SAVE_DIR.joinpath(f'auto_saves/{video_path.stem}.json'))
-        temp_save_path.parent.mkdir(parents=True, exist_ok=True)
-        temp_save_path.write_text(dumps(wolverine_data))
+        self._auto_save_timer.stop()
+        self._sync_session()
+        self._session.write_auto_save(save_path or self._session.auto_save_path(video_path))
+
+    def request_auto_save(self):
+        # (re)start the debounce timer, the save is written once edits stop coming in
+        self._auto_save_timer.start()
+
+    def closeEvent(self, event):
+        if self._auto_save_timer.isActive() and self._probe_data:
+            self.write_auto_save()
+        self._session.flush_auto_save()
+        super().closeEvent(event)
 
     def load_config(self, save_path: Path | str | None = None):
         temp_save_path = Path(save_path or TEMP_SAVE_DIR.joinpath(f'config.json'))
@@ -523,35 +573,22 @@ class WolverineUI(QtWidgets.QDialog):
         temp_save_path.parent.mkdir(parents=True, exist_ok=True)
         temp_save_path.write_text(dumps(config_data))
 
-    def _process_video(self, save_data = None):
+    def _process_video(self, save_data: dict | None = None):
         video_path = Path(self._src_file_le.text())
-        if not self._player or not video_path.exists():
+        if not video_path.exists():
             return
 
         self._load_video(video_path)
-
-        new_data = True
-        if save_data:
-            nb_shots = len(save_data)
-            new_data = False
-        else:
-            shots_data = utils.probe_file_shots(video_path, self._probe_data.fps, self._probe_data.frames,
-                                                detection_threshold=self._threshold_sp.value())
-            nb_shots = next(shots_data)
-            save_data = shots_data if nb_shots else []
+        self._sync_session()
 
         self.setEnabled(False)
         self._progress_bar.setVisible(True)
         self._progress_bar_msg.setVisible(True)
-        self._progress_bar.setRange(0, nb_shots)
-        for nb_shot, shot_data in enumerate(save_data):
-            if not new_data:
-                shot_data = shots.ShotData.from_dict(shot_data)
-                shot_data.generate_thumbnail()
-            self.shots.append(shot_data)
-            self._progress_bar.setValue(nb_shot + 1)
-            self._progress_bar_msg.setText('Probing' if new_data else 'Loading' + f' Shots ({(nb_shot+1)}/{nb_shots})')
-            QtWidgets.QApplication.processEvents()
+        if save_data:
+            self._session.load_save_data(save_data, progress=self._update_progress)
+        else:
+            self._session.detect(threshold=self._threshold_sp.value(), progress=self._update_progress)
+        self._media_progress_stage = None
         self._progress_bar.setVisible(False)
         self._progress_bar_msg.setText('')
         self._progress_bar_msg.setVisible(False)
@@ -559,136 +596,105 @@ class WolverineUI(QtWidgets.QDialog):
 
         if not self.shots:
             QtWidgets.QMessageBox.critical(self, 'Detection Error', 'Could not detect any shots in provided video !')
-            return
-
-        self.sort_shots()
-
-    def _update_otio_timeline(self, video_path: Path | str | None = None):
-        video_path = video_path or Path(self._src_file_le.text())
-        # add shots to OTIO track
-        track = schema.Track(
-            name=video_path.stem,
-            kind=schema.TrackKind.Video
-        )
-        for shot in self.shots:
-            if shot.otio_clip.parent():
-                shot.otio_clip.parent().remove(shot.otio_clip)
-            track.append(shot.otio_clip)
-        # add track to stack
-        stack = schema.Stack(
-            children=[track],
-            name=video_path.stem,
-        )
-        # add stack to timeline
-        self.timeline = schema.Timeline()
-        self.timeline.tracks = stack
-        self.timeline.metadata['source'] = video_path.as_posix()
-        self._otio_view.load_timeline(self.timeline)
-        self._otio_view.ruler.move_to_frame(self._current_frame_sp.value() or 0)
 
-    def _find_closest_shots(self, frame: int) -> shots.ShotData:
-        closest_shot = None
-        for i, shot in enumerate(self.shots):
-            if not (shot.start_frame <= frame <= shot.end_frame):
-                continue
-            closest_shot = shot
-            break
+    def _browse_cut_list(self):
+        last_directory = Path(self._src_file_le.text()).parent
+        file_filter = f'Cut lists (*{" *".join(cut_list.CUT_LIST_EXT)})'
+        cut_list_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Choose Cut List', last_directory.as_posix(),
+                                                                 file_filter)
+        if cut_list_path:
+            self._import_cut_list(Path(cut_list_path))
 
-        return closest_shot
+    def _import_cut_list(self, cut_list_path: Path):
+        if not self._probe_data:
+            return
+        self._sync_session()
 
-    def sort_shots(self):
+        self.setEnabled(False)
+        self._progress_bar.setVisible(True)
+        self._progress_bar_msg.setVisible(True)
+        try:
+            self._session.import_cut_list(cut_list_path, progress=self._update_progress)
+        except ValueError as e:
+            QtWidgets.QMessageBox.critical(self, 'Cut List Error', str(e))
+        finally:
+            self._progress_bar.setVisible(False)
+            self._progress_bar_msg.setText('')
+            self._progress_bar_msg.setVisible(False)
+            self.setEnabled(True)
+
+    def _browse_new_version(self):
+        last_directory = Path(self._src_file_le.text()).parent
+        video_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Choose New Version', last_directory.as_posix(),
+                                                              f'Video files (*{" *".join(VALID_VIDEO_EXT)})')
+        if video_path:
+            self._update_version(Path(video_path))
+
+    def _update_version(self, video_path: Path):
         if not self.shots:
             return
+        self._sync_session()
 
-        self.shots = sorted(self.shots, key=lambda x: x.start_frame)
-        # check if first shot starts at 0
-        if self.shots[0].start_frame != 0:
-            cur_first = self.shots[0]
-            new_first = shots.ShotData(
-                index=0,
-                fps=cur_first.fps,
-                source=cur_first.source,
-                range=opentime.range_from_start_end_time_inclusive(
-                    start_time=opentime.from_frames(0, cur_first.fps),
-                    end_time_inclusive=opentime.from_frames((cur_first.start_frame - 1), cur_first.fps),
-                ),
-                ignored=True,
-                enabled=False
-            )
-            new_first.generate_thumbnail()
-            self.shots.insert(0, new_first)
-        # reset shot indices
-        index = 0
-        for shot in self.shots:
-            if shot.ignored:
-                shot.index = (index * 10) + 5
-                continue
-            index += 1
-            shot.index = index * 10
+        self.setEnabled(False)
+        self._progress_bar.setVisible(True)
+        self._progress_bar_msg.setVisible(True)
+        try:
+            self._session.update_source(video_path, progress=self._update_progress)
+        except (ValueError, OSError, jobs.JobError) as e:
+            QtWidgets.QMessageBox.critical(self, 'Update Version Error', str(e))
+            return
+        finally:
+            self._media_progress_stage = None
+            self._progress_bar.setVisible(False)
+            self._progress_bar_msg.setText('')
+            self._progress_bar_msg.setVisible(False)
+            self.setEnabled(True)
+        self._src_file_le.setText(video_path.as_posix())
+        self.save_config(video_path)
+        self._video_loaded(video_path)
+        self.write_auto_save()
+
+    def _shots_changed(self):
         # update UI and timeline and save in temp files
-        self._update_otio_timeline()
+        self._otio_view.load_timeline(self.timeline)
+        self._otio_view.ruler.move_to_frame(self._current_frame_sp.value() or 0)
         self._shots_panel_lw.refresh_shots(self.shots)
-        self.write_auto_save(self._src_file_le.text())
+        self._update_version_pb.setEnabled(bool(self.shots))
+        self.request_auto_save()
+
+    def _thumbnail_ready(self, shot_data: shots.ShotData):
+        self._shots_panel_lw.update_thumbnail(shot_data)
+        self.request_auto_save()
+
+    def _prioritize_thumbnails(self, frame: int | None = None):
+        # shots around the playhead then the ones visible in the shots panel
+        frame = self._current_frame_sp.value() if frame is None else frame
+        current_shot = self._session.find_shot(frame)
+        near_playhead = []
+        if current_shot:
+            row = self.shots.index(current_shot)
+            near_playhead = self.shots[row:row + 2] + self.shots[max(row - 1, 0):row]
+        visible = self._shots_panel_lw.visible_shots()
+        self._session.prioritize_thumbnails(near_playhead + [s for s in visible if s not in near_playhead])
 
-    def _add_shot(self, start_frame: int, end_frame: int | None = None):
-        closest_shot = self._find_closest_shots(start_frame)
-        if not closest_shot:
-            return False
-        if end_frame is None:
-            end_frame = closest_shot.end_frame
-        if (start_frame, end_frame) == (closest_shot.start_frame, closest_shot.end_frame):
-            return False
-
-        new_shot = shots.ShotData(
-            index=0,
-            source=Path(self._src_file_le.text()),
-            fps=self._probe_data.fps,
-            range=opentime.range_from_start_end_time_inclusive(
-                start_time=opentime.from_frames(start_frame, self._probe_data.fps),
-                end_time_inclusive=opentime.from_frames(end_frame, self._probe_data.fps)
-            )
-        )
-        closest_shot.end_frame = (start_frame - 1)
+    def sort_shots(self):
+        self._sync_session()
+        self._session.sort_shots()
 
-        self.shots.append(new_shot)
-        self.sort_shots()
+    def _add_shot(self, start_frame: int, end_frame: int | None = None):
+        return self._session.add_shot(start_frame, end_frame) is not None
 
     def _update_shot_from_marker(self, marker: schema.Marker, new_start: int):
         old_start = marker.marked_range.start_time.to_frames()
-        if old_start == new_start:
-            return False
-        closest_shot = self._find_closest_shots(old_start)
-        if not closest_shot:
-            return False
-        prev_range = (closest_shot.start_frame, closest_shot.end_frame)
-        closest_shot.start_frame = new_start
-        closest_shot.generate_thumbnail()
-        self._update_shot_neighbors(closest_shot, prev_range)
+        return self._session.move_shot_start(old_start, new_start) is not None
 
     def _remove_shot(self, marker: schema.Marker | None, shot_start: int) -> None:
-        if not self.shots:
-            return
         if marker:
             shot_start = marker.marked_range.start_time.to_frames()
-        closest_shot = self._find_closest_shots(shot_start)
-        prev_shot = [s for s in self.shots if s.end_frame == (closest_shot.start_frame - 1)]
-        if prev_shot:
-            prev_shot[0].end_frame = closest_shot.end_frame
-        self.shots.remove(closest_shot)
-
-        self.sort_shots()
+        self._session.remove_shot(shot_start)
 
     def _update_shot_neighbors(self, shot_data: shots.ShotData, prev_range: tuple[int, int]) -> None:
-        prev_start, prev_end = prev_range
-        prev_shot = [s for s in self.shots if s != shot_data and s.end_frame == (prev_start - 1)]
-        next_shot = [s for s in self.shots if s != shot_data and s.start_frame == (prev_end + 1)]
-        if prev_shot:
-            prev_shot[0].end_frame = shot_data.start_frame - 1
-        if next_shot:
-            next_shot[0].start_frame = shot_data.end_frame + 1
-            next_shot[0].generate_thumbnail()
-
-        self.sort_shots()
+        self._session.update_shot(shot_data)
 
     def _update_timeline_focus(self, new_range: tuple[int, int] = None):
         start, end = new_range or self._zoom_timeline_sl.value()
@@ -704,6 +710,7 @@ class WolverineUI(QtWidgets.QDialog):
             if shot_widget.name != shot_name:
                 continue
             self._shots_panel_lw.select_shot(shot_widget)
+            self._prioritize_thumbnails(shot_widget.start)
             break
 
     def _time_observer(self, value: float):
@@ -743,20 +750,26 @@ class WolverineUI(QtWidgets.QDialog):
                 self._cur_shot_end = shot_widget.end
                 self._shots_panel_lw.select_shot(shot_widget)
                 break
+            self._prioritize_thumbnails(int(frame))
 
-        self._player.seek(value_seconds, reference='absolute+exact')
-        self._player.pause = self._last_pause_state
+        if self._player:
+            self._player.seek(value_seconds, reference='absolute+exact')
+            self._player.pause = self._last_pause_state
         QtWidgets.QApplication.processEvents()
 
     def _pause_player(self, status: bool):
+        if not self._player:
+            return
         self._last_pause_state = self._player.pause
         self._player.pause = status
 
     def _set_player_volume(self, volume: int):
-        self._player.volume = volume
+        if self._player:
+            self._player.volume = volume
 
     def _set_player_speed(self, speed: int):
-        self._player.speed = max(0.01, float(speed)/100.0)
+        if self._player:
+            self._player.speed = max(0.01, float(speed)/100.0)
 
     def _player_controls(self, key: QtCore.Qt.Key):
         if not self._player or not self._probe_data:
@@ -814,55 +827,16 @@ class WolverineUI(QtWidgets.QDialog):
         export_path = Path(self._export_dir_le.text())
         export_path.mkdir(parents=True, exist_ok=True)
 
-        # export shots
         self._progress_bar.setVisible(True)
         self._progress_bar_msg.setVisible(True)
-        self._progress_bar.setRange(0, len(self.shots))
-        for i, shot in enumerate(self.shots):
-            self._progress_bar.setValue(i + 1)
-            self._progress_bar_msg.setText(f'Exporting Shots ({(i+1)}/{len(self.shots)})')
-            shot.save_directory = export_path
-            if 'thumbnails' in export_actions['shots']:
-                shot.generate_thumbnail()
-            if 'movies' in export_actions['shots']:
-                shot.generate_movie()
-            if 'audio' in export_actions['shots']:
-                shot.generate_audio()
-            QtWidgets.QApplication.processEvents()
-
-        # export timelines
-        self._update_otio_timeline()
-        timeline_outputs = [
-            ('otio_json', '.otio'),
-            ('cmx_3600', '.edl'),
-            ('fcp_xml', '.xml'),
-        ]
-        # filter timeline outputs
-        timeline_outputs = [(a, e) for a, e in timeline_outputs if e in export_actions['timeline']]
-        # do export
-        input_name = Path(self._src_file_le.text()).stem
-        self._progress_bar.setRange(0, len(timeline_outputs))
-        for i, (adapter, extension) in enumerate(timeline_outputs):
-            self._progress_bar.setValue(i + 1)
-            self._progress_bar_msg.setText(f'Exporting Timelines [{extension}] ({(i+1)}/{len(timeline_outputs)})')
-            output_path = export_path.joinpath(f'{input_name}{extension}')
-            adapters.write_to_file(self.timeline, output_path.as_posix(), adapter_name=adapter)
-
-        # run custom export actions
-        export_errors = 0
-        custom_actions = export_actions.get('custom')
-        self._progress_bar.setRange(0, len(custom_actions))
-        for i, (export_action, widget_value) in enumerate(custom_actions):
-            self._progress_bar.setValue(i + 1)
-            self._progress_bar_msg.setText(f'Running Export Actions ({(i+1)}/{len(self._export_actions)})')
-
-            widget_value = widget_value or []
-            widget_value = widget_value if isinstance(widget_value, list) else [widget_value]
-            try:
-                export_action.func(self._export_dir_le.text(), self.shots, *widget_value)
-            except Exception as e:
-                log.critical(f'Export Failed: \nError: {e}\nExport Action :{export_action}')
-                export_errors += 1
+        export_errors = self._session.export(export_path, media=export_actions['shots'],
+                                             timelines=export_actions['timeline'],
+                                             export_actions=export_actions.get('custom'),
+                                             progress=self._update_progress,
+                                             profile=export_actions.get('profile'))
+        self._media_progress_stage = None
+        # shots now point to the exported media
+        self._shots_changed()
 
         self._progress_bar.setVisible(False)
         self._progress_bar_msg.setText('')
@@ -872,6 +846,28 @@ class WolverineUI(QtWidgets.QDialog):
         err_msg = f'\n {export_errors} errors were encountered, check logs for more details' if export_errors else ''
         QtWidgets.QMessageBox.information(self, 'Wolverine Export', f'Export done !{err_msg}')
 
+    def _update_progress(self, stage: str, current: int, total: int):
+        if stage == self._media_progress_stage:
+            return
+        labels = {'detect': 'Probing Shots', 'load': 'Loading Shots', 'shots': 'Exporting Shots',
+                  'actions': 'Running Export Actions'}
+        label = labels.get(stage, f'Exporting Timelines [{stage.replace("timeline", "")}]')
+        self._progress_bar.setRange(0, total)
+        self._progress_bar.setValue(current)
+        self._progress_bar_msg.setText(f'{label} ({current}/{total})')
+        QtWidgets.QApplication.processEvents()
+
+    def _update_media_progress(self, stage: str, progress: jobs.AggregateProgress):
+        labels = {'detect': 'Probing Shots', 'export': 'Exporting Shots'}
+        # exports report shots done as 'shots'
+        self._media_progress_stage = 'shots' if stage == 'export' else stage
+        eta = f'ETA {progress.eta:.0f}s' if progress.eta is not None else 'ETA ?'
+        self._progress_bar.setRange(0, 1000)
+        self._progress_bar.setValue(int(progress.fraction * 1000))
+        self._progress_bar_msg.setText(f'{labels.get(stage, stage)} ({progress.fraction:.0%}, '
+                                       f'{progress.speed:.1f}x, {eta})')
+        QtWidgets.QApplication.processEvents()
+
 
 def open_ui():
     import qdarktheme
@@ -1,18 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Callable, Any
+from typing import Any
 
 from qt_py_tools.Qt import QtWidgets, QtCore, QtGui
 from superqt import QCollapsible
 
-
-@dataclass
-class ExportAction:
-    description: str
-    func: Callable
-    widget: QtWidgets.QWidget | None = None
-    widget_func: str = ''
+from wolverine import profiles
+from wolverine.export import ExportAction
 
 
 class ExportActionsUi(QtWidgets.QDialog):
@@ -29,6 +23,11 @@ class ExportActionsUi(QtWidgets.QDialog):
         self._shot_thumbs_cb = QtWidgets.QCheckBox()
         self._shot_movies_cb = QtWidgets.QCheckBox()
         self._shot_audio_cb = QtWidgets.QCheckBox()
+        self._profile_cmb = QtWidgets.QComboBox()
+        for profile in profiles.PROFILES.values():
+            self._profile_cmb.addItem(profile.description or profile.name, profile.name)
+        self._profile_cmb.setCurrentIndex(self._profile_cmb.findData(profiles.DEFAULT_PROFILE))
+        self._profile_cmb.setToolTip('Encode settings of movie and audio clips')
 
         shot_fl = QtWidgets.QFormLayout()
         shots_gb = QtWidgets.QGroupBox('Shots :')
@@ -36,6 +35,7 @@ class ExportActionsUi(QtWidgets.QDialog):
         shot_fl.addRow('Export Thumbnails :', self._shot_thumbs_cb)
         shot_fl.addRow('Export Movie Clips :', self._shot_movies_cb)
         shot_fl.addRow('Export Audio Clips :', self._shot_audio_cb)
+        shot_fl.addRow('Export Profile :', self._profile_cmb)
 
         self._tl_edl_cb = QtWidgets.QCheckBox()
         self._tl_xml_cb = QtWidgets.QCheckBox()
@@ -108,7 +108,8 @@ class ExportActionsUi(QtWidgets.QDialog):
         actions = {
             'shots': [label for label, enabled in shots if enabled],
             'timeline': [label for label, enabled in timelines if enabled],
-            'custom': []
+            'custom': [],
+            'profile': self._profile_cmb.currentData(),
         }
         for (enabled_cb, export_action, action_widget) in self._action_widgets:
             if not enabled_cb.isChecked():
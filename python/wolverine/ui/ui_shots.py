@@ -4,12 +4,14 @@ from qt_py_tools.Qt import QtWidgets, QtCore, QtGui
 from opentimelineio import opentime
 
 from wolverine import shots
+from wolverine.shot_table import ShotTable, set_prefix
 from wolverine.ui.ui_utils import get_icon, ONE_BILLION
 
 
 DEFAULT_SHOT_STYLE = '#ShotWidget {border: 1px solid white;}'
 SELECTED_SHOT_STYLE = '#ShotWidget {border: 2px solid yellow;}'
 SHOT_RANGE_TEXT = '{start:03d} - {end:03d} ({duration:03d})'
+VISIBLE_SHOTS_DELAY = 100  # ms without scrolling before visible shots get their thumbnails first
 
 
 class ShotWidget(QtWidgets.QFrame):
@@ -141,7 +143,7 @@ class ShotWidget(QtWidgets.QFrame):
         self.sig_shot_changed.emit(self)
 
     def _toggle_ignored(self):
-        self.shot_data.enabled = not self.shot_data.ignored
+        self.shot_data.ignored = not self.shot_data.ignored
         self.sig_shot_changed.emit(self)
 
 
@@ -253,6 +255,14 @@ class ShotInfoWidget(QtWidgets.QGroupBox):
         self._shot_widget.fill_from_data(self._shot_data)
         self.__updating_ui = False
 
+    def release(self, shot_widget: ShotWidget) -> None:
+        """
+        Forget shot_widget (and its shot) if it is the one shown, it is about to be deleted
+        """
+        if self._shot_widget is shot_widget:
+            self._shot_widget = None
+            self._shot_data = None
+
     def _toggle_loop(self):
         if not self._shot_data:
             return
@@ -312,7 +322,7 @@ class ShotInfoWidget(QtWidgets.QGroupBox):
         if self._shot_data.range == current_range:
             return
 
-        self._shot_data.generate_thumbnail()
+        # the thumbnail is regenerated in the background once the session applies the new range
         self.fill_shot_ui(self._shot_widget)
         self.sig_range_changed.emit(self._shot_data, prev_range)
 
@@ -323,6 +333,7 @@ class ShotListWidget(QtWidgets.QWidget):
     sig_shot_loop = QtCore.Signal(tuple)
     sig_shot_selected = QtCore.Signal(int)
     sig_shot_deleted = QtCore.Signal(int)
+    sig_visible_shots_changed = QtCore.Signal(list)
 
     def __init__(self, parent: QtWidgets.QWidget | None = None):
         super().__init__(parent=parent)
@@ -350,6 +361,11 @@ class ShotListWidget(QtWidgets.QWidget):
         self._scroll.setWidgetResizable(True)
         self._scroll.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
 
+        # scrolling fires a lot, only report visible shots once it settles
+        self._visible_timer = QtCore.QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.setInterval(VISIBLE_SHOTS_DELAY)
+
         self._shot_info_w = ShotInfoWidget()
 
         opts_lay = QtWidgets.QHBoxLayout()
@@ -371,6 +387,8 @@ class ShotListWidget(QtWidgets.QWidget):
     def _connect_ui(self):
         self._shots_prefix_le.editingFinished.connect(self._update_shot_names)
         self._shots_start_sp.valueChanged.connect(self._update_shots_start)
+        self._scroll.verticalScrollBar().valueChanged.connect(lambda _: self._visible_timer.start())
+        self._visible_timer.timeout.connect(lambda: self.sig_visible_shots_changed.emit(self.visible_shots()))
         self._shot_info_w.sig_range_changed.connect(self.sig_shot_range_changed.emit)
         self._shot_info_w.sig_shot_changed.connect(self.sig_shots_changed.emit)
         self._shot_info_w.sig_shot_loop.connect(self.sig_shot_loop.emit)
@@ -392,16 +410,36 @@ class ShotListWidget(QtWidgets.QWidget):
     def start(self, value: int) -> None:
         self._shots_start_sp.setValue(value)
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._visible_timer.start()
+
+    def visible_shots(self) -> list[shots.ShotData]:
+        """
+        Shots whose widget is (at least partly) inside the scroll area viewport, selected shot first
+        """
+        viewport = self._scroll.viewport()
+        viewport_rect = viewport.rect()
+        visible = []
+        for shot_widget in self.shot_widgets:
+            top_left = shot_widget.mapTo(viewport, QtCore.QPoint(0, 0))
+            if viewport_rect.intersects(QtCore.QRect(top_left, shot_widget.size())):
+                visible.append(shot_widget.shot_data)
+        if self._selected_shot and self._selected_shot.shot_data in visible:
+            visible.remove(self._selected_shot.shot_data)
+            visible.insert(0, self._selected_shot.shot_data)
+        return visible
+
+    def update_thumbnail(self, shot_data: shots.ShotData) -> None:
+        for shot_widget in self.shot_widgets:
+            if shot_widget.shot_data is shot_data:
+                shot_widget.fill_from_data(shot_data)
+                return
+
     def _update_shot_names(self):
         if not self._shot_list:
             return
-        prefix = self._shots_prefix_le.text()
-        shots_changed = False
-        for shot_data in self._shot_list:
-            if shot_data.prefix == prefix:
-                continue
-            shot_data.prefix = prefix
-            shots_changed = True
+        shots_changed = set_prefix(self._shot_list, self._shots_prefix_le.text())
         if shots_changed:
             self._shot_info_w.fill_shot_ui(self._selected_shot)
             self.sig_shots_changed.emit()
@@ -409,12 +447,9 @@ class ShotListWidget(QtWidgets.QWidget):
     def _update_shots_start(self, new_start: int):
         if not self._shot_list:
             return
-        shots_changed = False
-        for shot_data in self._shot_list:
-            if shot_data.new_start == new_start:
-                continue
-            shot_data.new_start = new_start
-            shots_changed = True
+        shot_table = ShotTable(self._shot_list)
+        shot_table.set_new_start(new_start)
+        shots_changed = shot_table.commit()
         if shots_changed:
             self._shot_info_w.fill_shot_ui(self._selected_shot)
             self.sig_shots_changed.emit()
@@ -470,9 +505,14 @@ class ShotListWidget(QtWidgets.QWidget):
         for shot_widget in shot_widgets.values():
             if shot_widget == self._selected_shot:
                 self._selected_shot = self.shot_widgets[0] if self.shot_widgets else None
+            self._shot_info_w.release(shot_widget)
+            # the removed shot and its clip go with the widget
+            shot_widget.shot_data = None
+            shot_widget.hide()
             shot_widget.deleteLater()
         if self._selected_shot:
             self._shot_info_w.fill_shot_ui(self._selected_shot)
+        self._visible_timer.start()
 
         return self.shot_widgets
 
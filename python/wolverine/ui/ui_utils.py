@@ -183,7 +183,14 @@ class OTIOViewWidget(QtWidgets.QWidget):
 
     def load_timeline(self, timeline: schema.Timeline):
         self.tracks_widget.clear()
+        # set_timeline only takes the previous tabs out, a scene (an item per clip, marker and ruler) was left behind
+        # on every sort, they are emptied right away and deleted once back in the event loop
+        previous_views = [self.timeline_widget.widget(i) for i in range(self.timeline_widget.count())]
         self.timeline_widget.set_timeline(timeline)
+        for view in previous_views:
+            if view.scene():
+                view.scene().clear()
+            view.deleteLater()
         self.tracks_widget.setVisible(False)
 
     @property
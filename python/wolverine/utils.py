@@ -2,15 +2,17 @@ from __future__ import annotations
 
 import json
 import pprint
-import subprocess
 from pathlib import Path
 from shutil import which
 from dataclasses import dataclass, asdict
-from typing import Iterator
+from typing import Callable, Iterator
 
 from opentimelineio import opentime
 
 from wolverine import log
+from wolverine import jobs
+from wolverine import trace
+from wolverine import analysis
 from wolverine.shots import ShotData
 
 
@@ -52,12 +54,13 @@ def probe_file(file_path, print_stats=False):
             '-show_programs',
             '-show_chapters',
             '-show_private_data',
-            f'"{file_path.as_posix()}"'
+            file_path.as_posix()
     ]
     log.debug(f'PROBING ({file_path.name}): [{" ".join(command_list)}]')
     try:
-        out = subprocess.check_output(' '.join(command_list), shell=True)
-    except subprocess.CalledProcessError as e:
+        with trace.span('probe', file=file_path.name):
+            out = jobs.get_engine().run_sync(command_list, resource=jobs.PROBE).stdout
+    except (jobs.JobError, OSError) as e:
         log.critical(f'Could not probe file ({file_path})')
         log.critical(e)
         return
@@ -114,50 +117,18 @@ def probe_file(file_path, print_stats=False):
     return res
 
 
-def probe_file_shots(file_path: str | Path, fps: float, nb_frames: int, detection_threshold: int = 20) -> Iterator[ShotData]:
+def shots_from_starts(file_path: str | Path, fps: float, shot_starts: list[int], nb_frames: int,
+                      auto_thumbnail: bool = True) -> Iterator[ShotData]:
+    """
+    Shots of file_path starting on shot_starts (sorted frames), the last one ends on the last frame
+    """
     file_path = Path(file_path)
-    clean_path = file_path.as_posix().replace(':', '\\\\:')
-    video_cmd = [
-        'ffprobe -loglevel quiet -show_frames -of compact=p=0 -f lavfi',
-        f'"movie={clean_path},select=\'gt(scene\,{(float(detection_threshold)/100)})\'"'
-    ]
-    log.debug(f'Running Shot Detection Command : {" ".join(video_cmd)}')
-
-    try:
-        out = subprocess.check_output(' '.join(video_cmd), shell=True)
-    except subprocess.CalledProcessError as e:
-        log.critical(f'Could not probe file ({file_path})')
-        log.critical(e)
-        yield 0
-        return
-
-    shots_dicts = [dict([kv.split('=') for kv in f'media_type={line}'.split('|')])
-                   for line in str(out).strip().split('media_type=') if line and line != "b'"]
-    shot_starts = []
-    for i, shot_dict in enumerate(shots_dicts):
-        start_time = float(shot_dict.get('pkt_dts_time')
-                           or shot_dict.get('pts_time')
-                           or shot_dict.get('best_effort_timestamp_time')
-                           or 0)
-        start_frame = int((int(shot_dict.get('pts', 1)) / 1000)
-                          or (int(shot_dict.get('best_effort_timestamp', 1)) / 1000)
-                          or shot_dict.get('coded_picture_number')
-                          or 0)
-        if not start_frame and start_time:
-            start_frame = opentime.from_seconds(start_time, fps).to_frames()
-        if i == 0 and start_frame != 0:
-            start_frame = 0
-        shot_starts.append(start_frame)
-
-    shots_starts = sorted(set(shot_starts))
-    yield len(shots_starts)
-
-    for i, start_frame in enumerate(shots_starts):
+    for i, start_frame in enumerate(shot_starts):
         i += 1
         if i < len(shot_starts):
             next_start_frame = shot_starts[i] - 1
         else:
-            next_start_frame = nb_frames
+            next_start_frame = nb_frames - 1
         shot_data = ShotData(
             index=(i * 10),
             fps=fps,
@@ -165,7 +136,30 @@ def probe_file_shots(file_path: str | Path, fps: float, nb_frames: int, detectio
             range=opentime.range_from_start_end_time_inclusive(
                 start_time=opentime.from_frames(start_frame, fps),
                 end_time_inclusive=opentime.from_frames(next_start_frame, fps),
-            )
+            ),
+            auto_thumbnail=auto_thumbnail
         )
         yield shot_data
 
+
+def probe_file_shots(file_path: str | Path, fps: float, nb_frames: int, detection_threshold: int = 20,
+                     auto_thumbnail: bool = True, use_cache: bool = True,
+                     progress: Callable[[jobs.AggregateProgress], None] | None = None) -> Iterator[ShotData]:
+    """
+    Detect shots with ffmpeg's scene score, yields the number of shots first then every shot. Scores come from the
+    source analysis (see analysis.analyze), progress gets the decoding progress (seconds decoded, speed and ETA)
+    when the source has to be analyzed
+    """
+    file_path = Path(file_path)
+    try:
+        with trace.span('detect', file=file_path.name, threshold=detection_threshold):
+            result = analysis.analyze(file_path, fps, nb_frames, use_cache=use_cache, progress=progress)
+    except (jobs.JobError, OSError) as e:
+        log.critical(f'Could not probe file ({file_path})')
+        log.critical(e)
+        yield 0
+        return
+
+    shot_starts = result.cuts(detection_threshold)
+    yield len(shot_starts)
+    yield from shots_from_starts(file_path, fps, shot_starts, nb_frames, auto_thumbnail)
@@ -0,0 +1,160 @@
+"""
+Timeline consistency checks, a shot list is valid when shots are contiguous, don't overlap, aren't empty and cover
+the whole source (0 to nb_frames - 1)
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import numpy as np
+
+from wolverine.shots import ShotData
+from wolverine.shot_table import ShotTable
+
+
+@dataclass
+class ValidationReport:
+    gaps: list[tuple[int, int]] = field(default_factory=list)
+    overlaps: list[tuple[int, int]] = field(default_factory=list)
+    empty: list[ShotData] = field(default_factory=list)
+    out_of_range: list[ShotData] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not (self.gaps or self.overlaps or self.empty or self.out_of_range)
+
+    def __str__(self) -> str:
+        if self.is_valid:
+            return 'Timeline is valid'
+        lines = [f'Gap [{start}-{end}]' for start, end in self.gaps]
+        lines += [f'Overlap [{start}-{end}]' for start, end in self.overlaps]
+        lines += [f'Empty shot {shot}' for shot in self.empty]
+        lines += [f'Shot past end of source {shot}' for shot in self.out_of_range]
+        return '\n'.join(lines)
+
+
+@dataclass
+class RepairResult:
+    shots: list[ShotData]
+    removed: list[ShotData]
+    moved: list[ShotData]
+    report: ValidationReport
+
+
+def _check_table(table: ShotTable, nb_frames: int | None) -> ValidationReport:
+    """
+    table needs to be sorted by start frame
+    """
+    report = ValidationReport()
+    empty = table.duration <= 0
+    out_of_range = np.zeros(len(table), dtype=bool)
+    if nb_frames is not None:
+        out_of_range = ~empty & (table.start >= nb_frames)
+    report.empty = [table.shots[i] for i in np.flatnonzero(empty).tolist()]
+    report.out_of_range = [table.shots[i] for i in np.flatnonzero(out_of_range).tolist()]
+
+    valid = ~empty & ~out_of_range
+    starts, ends = table.start[valid], table.end[valid]
+    if not len(starts):
+        if nb_frames:
+            report.gaps.append((0, nb_frames - 1))
+        return report
+
+    # running max of previous ends, a long shot can run over several following ones
+    covered = np.maximum.accumulate(ends)
+    gap_rows = np.flatnonzero(starts[1:] > covered[:-1] + 1)
+    overlap_rows = np.flatnonzero(starts[1:] <= covered[:-1])
+    report.gaps = [(int(covered[i]) + 1, int(starts[i + 1]) - 1) for i in gap_rows.tolist()]
+    report.overlaps = [(int(starts[i + 1]), int(min(covered[i], ends[i + 1]))) for i in overlap_rows.tolist()]
+
+    if starts[0] > 0:
+        report.gaps.insert(0, (0, int(starts[0]) - 1))
+    if nb_frames is not None:
+        if covered[-1] < nb_frames - 1:
+            report.gaps.append((int(covered[-1]) + 1, nb_frames - 1))
+        elif covered[-1] > nb_frames - 1:
+            report.overlaps.append((nb_frames, int(covered[-1])))
+    return report
+
+
+def validate_shots(shots: Iterable[ShotData], nb_frames: int | None = None) -> ValidationReport:
+    """
+    Check shots in a single sorted sweep
+
+    Args:
+        shots: shots to check, in any order
+        nb_frames: number of frames in the source, if given shots also need to cover 0 to nb_frames - 1
+    """
+    table = ShotTable(shots)
+    table.sort()
+    return _check_table(table, nb_frames)
+
+
+def repair_shots(shots: Iterable[ShotData], nb_frames: int | None = None,
+                 pinned: Iterable[ShotData] = ()) -> RepairResult:
+    """
+    Fix gaps, overlaps, empty shots and shots past the end of the source in one batch :
+      - empty shots, shots starting after the source ends and shots starting on the same frame as another are removed
+      - every shot ends the frame before the next one starts (gaps are filled by the previous shot, overlaps trimmed)
+      - the last shot ends on the last frame of the source
+    Pinned shots (eg: the shot the user just edited) keep their range, their neighbours are adjusted around them.
+    A gap before the first shot is only reported, it is up to the caller to fill it.
+
+    Returns:
+        RepairResult: repaired shots sorted by start frame, removed shots, shots whose start frame moved and the
+            issues found before the repair
+    """
+    table = ShotTable(shots)
+    pinned_ids = {id(shot) for shot in pinned}
+    is_pinned = np.fromiter((id(shot) in pinned_ids for shot in table.shots), dtype=bool, count=len(table))
+    # sort by start, pinned shots first when several start on the same frame
+    order = np.lexsort((~is_pinned, table.start))
+    table.reorder(order)
+    is_pinned = is_pinned[order]
+
+    report = _check_table(table, nb_frames)
+    original_starts = table.start.copy()
+
+    keep = table.duration > 0
+    if nb_frames is not None:
+        keep &= table.start < nb_frames
+    keep[1:] &= table.start[1:] != table.start[:-1]
+
+    ends = table.end
+    for row in np.flatnonzero(is_pinned & keep).tolist():
+        pin_start, pin_end = table.start[row], ends[row]
+        after = keep & (table.start > pin_start) & (table.start <= pin_end)
+        # shots inside the pinned range disappear, the ones running past its end are trimmed
+        keep &= ~(after & (ends <= pin_end))
+        trimmed = after & (ends > pin_end)
+        table.start[trimmed] = pin_end + 1
+        table.duration[trimmed] = ends[trimmed] - pin_end
+        # the next shot starts right after the pinned end, back over a gap when the pinned shot got shorter
+        later = np.flatnonzero(keep[row + 1:])
+        if len(later):
+            next_row = row + 1 + later[0]
+            if not is_pinned[next_row] and table.start[next_row] > pin_end + 1:
+                table.start[next_row] = pin_end + 1
+                table.duration[next_row] = ends[next_row] - pin_end
+
+    # trimmed shots can end up empty or on the start of the following shot, the pinned one of a pair stays
+    keep &= table.duration > 0
+    rows = np.flatnonzero(keep)
+    same_start = table.start[rows[1:]] == table.start[rows[:-1]]
+    drop = np.where(is_pinned[rows[1:]] & ~is_pinned[rows[:-1]], rows[:-1], rows[1:])
+    keep[drop[same_start]] = False
+
+    rows = np.flatnonzero(keep)
+    if len(rows):
+        starts = table.start[rows]
+        new_ends = np.empty_like(starts)
+        new_ends[:-1] = starts[1:] - 1
+        new_ends[-1] = (nb_frames - 1) if nb_frames is not None else table.end[rows[-1]]
+        table.duration[rows] = new_ends - starts + 1
+
+    table.commit()
+    kept_shots = [table.shots[i] for i in rows.tolist()]
+    removed = [table.shots[i] for i in np.flatnonzero(~keep).tolist()]
+    moved = [table.shots[i] for i in np.flatnonzero(keep & (table.start != original_starts)).tolist()]
+    return RepairResult(shots=kept_shots, removed=removed, moved=moved, report=report)
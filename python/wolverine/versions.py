@@ -0,0 +1,401 @@
+"""
+Incremental analysis of new versions of a source : animatics get delivered again with a few shots changed, the new
+version is matched against the analysis of the previous one and only what changed gets analyzed again
+
+    result, segments = versions.update(previous_source, source, fps=24)
+    shots = versions.carry_shots(previous_shots, segments, source)
+
+A light decode of the new version (low resolution signatures, key frames and audio peaks, see
+analysis.signature_command) is matched against the signatures of the previous version : runs of at least CHUNK_FRAMES
+frames whose signatures and audio peaks are within tolerance are unchanged segments, frames can be inserted, removed
+or replaced anywhere. Scene scores, black and frozen ranges and thumbnails of the unchanged segments come from the
+previous analysis, only the other frames are analyzed again.
+
+Shots of the previous version lying inside an unchanged segment keep their name and their cached media : thumbnails,
+movies and audio are added to the media cache under the keys of the new source, exports link them instead of encoding
+them again.
+
+Signatures are compared with a tolerance instead of being hashed, unchanged frames of a delivery encoded again don't
+decode to the exact same pixels.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from dataclasses import dataclass, asdict
+from typing import Callable, Hashable, Iterable
+
+import numpy as np
+
+from wolverine import log
+from wolverine import jobs
+from wolverine import trace
+from wolverine import analysis
+from wolverine import profiles
+from wolverine import media_cache
+from wolverine.shots import ShotData, MEDIA_TYPES
+
+CHUNK_FRAMES = 24           # shortest run of matching frames making an unchanged segment
+SIGNATURE_TOLERANCE = 6     # largest difference between two signature values (0-255) of the same frame
+AUDIO_TOLERANCE = 3.0       # dB, largest difference between the audio peaks of the same frame (lossy codecs)
+SEARCH_STEP = 6             # frames between two searches of the previous version while frames don't match
+MAX_CANDIDATES = 32         # matching frames of the previous version tried per search
+RUN_BLOCK = 256             # frames compared at once when following a segment
+MAX_CHANGED_RATIO = 0.5     # more changed frames than that and the new version is analyzed as a whole
+
+
+@dataclass(frozen=True)
+class Segment:
+    """
+    Frames of the new version (from start, for duration frames) unchanged from the previous version (from
+    previous_start)
+    """
+    start: int
+    previous_start: int
+    duration: int
+
+    @property
+    def end(self) -> int:
+        # excluded
+        return self.start + self.duration
+
+    @property
+    def offset(self) -> int:
+        # frame of the previous version + offset = frame of the new version
+        return self.start - self.previous_start
+
+    def contains_previous(self, start: int, duration: int) -> bool:
+        return self.previous_start <= start and start + duration <= self.previous_start + self.duration
+
+
+def _peaks(audio_peaks: list[float] | None, frames: int) -> np.ndarray:
+    # sources without audio are silent, adding or removing audio changes every frame with sound
+    if audio_peaks is None:
+        return np.full(frames, analysis.SILENCE_DB)
+    return np.asarray(audio_peaks, dtype=np.float64)
+
+
+def match(previous_signatures: np.ndarray, previous_peaks: np.ndarray, signatures: np.ndarray, peaks: np.ndarray,
+          chunk: int = CHUNK_FRAMES) -> list[Segment]:
+    """
+    Unchanged segments of a new version, signatures and peaks being per frame (see SourceAnalysis.signature_array)
+
+    Returns:
+        list[Segment]: segments in the order of the new version, they don't overlap
+    """
+    previous_signatures, signatures = previous_signatures.astype(np.int16), signatures.astype(np.int16)
+    # a frame can only match if its average is within tolerance, cheap to check against the whole previous version
+    previous_means, means = previous_signatures.mean(axis=1), signatures.mean(axis=1)
+    nb_previous, nb_frames = len(previous_signatures), len(signatures)
+    # first frames of the holds of the previous version : a held frame matches the whole hold, trying its first frame
+    # aligns on the start of the hold
+    held = np.abs(np.diff(previous_signatures, axis=0)).max(axis=1) <= SIGNATURE_TOLERANCE
+    hold_starts = np.flatnonzero(np.concatenate([[False], held]) < np.concatenate([held, [False]]))
+
+    def same(frame: int, previous_frame: int, count: int) -> np.ndarray:
+        # per frame : video within tolerance, audio too unless the frames around it match (lossy audio codecs smear
+        # transients over a frame)
+        video = np.abs(signatures[frame:frame + count] -
+                       previous_signatures[previous_frame:previous_frame + count]).max(axis=1)
+        before = min(1, frame, previous_frame)
+        after = min(1, nb_frames - frame - count, nb_previous - previous_frame - count)
+        different = np.abs(peaks[frame - before:frame + count + after] -
+                           previous_peaks[previous_frame - before:previous_frame + count + after]) > AUDIO_TOLERANCE
+        # frames past either end don't break a match
+        different = np.concatenate([np.zeros(1 - before, dtype=bool), different, np.zeros(1 - after, dtype=bool)])
+        audio = ~different[1:-1] | ~(different[:-2] | different[2:])
+        return (video <= SIGNATURE_TOLERANCE) & audio
+
+    def forward(frame: int, previous_frame: int) -> int:
+        # matching frames from frame on
+        length = 0
+        while frame + length < nb_frames and previous_frame + length < nb_previous:
+            count = min(RUN_BLOCK, nb_frames - frame - length, nb_previous - previous_frame - length)
+            matching = same(frame + length, previous_frame + length, count)
+            if not matching.all():
+                return length + int(np.argmin(matching))
+            length += count
+        return length
+
+    def backward(frame: int, previous_frame: int, limit: int) -> int:
+        # matching frames before frame, down to limit
+        length = 0
+        while frame - length > limit and previous_frame - length > 0:
+            count = min(RUN_BLOCK, frame - length - limit, previous_frame - length)
+            matching = same(frame - length - count, previous_frame - length - count, count)[::-1]
+            if not matching.all():
+                return length + int(np.argmin(matching))
+            length += count
+        return length
+
+    def search(frame: int, offset: int, unmatched: int) -> Segment | None:
+        # the longest run of matching frames around frame, held frames match anywhere in a shot : ties go to the
+        # offset closest to the current one
+        candidates = np.flatnonzero(np.abs(previous_means - means[frame]) <= SIGNATURE_TOLERANCE)
+        video = np.abs(previous_signatures[candidates] - signatures[frame]).max(axis=1)
+        audio = np.abs(previous_peaks[candidates] - peaks[frame])
+        candidates = candidates[(video <= SIGNATURE_TOLERANCE) & (audio <= AUDIO_TOLERANCE)]
+        closest = candidates[np.argsort(np.abs(frame - offset - candidates), kind='stable')][:MAX_CANDIDATES]
+        holds = np.intersect1d(candidates, hold_starts)[:MAX_CANDIDATES]
+        best = None
+        for previous_frame in np.concatenate([closest, np.setdiff1d(holds, closest)]).tolist():
+            before = backward(frame, previous_frame, unmatched)
+            length = before + forward(frame, previous_frame)
+            if length >= chunk and (not best or length > best.duration):
+                best = Segment(frame - before, previous_frame - before, length)
+        return best
+
+    segments = []
+    frame, offset, unmatched = 0, 0, 0
+    while frame + chunk <= nb_frames:
+        segment = search(frame, offset, unmatched)
+        if not segment:
+            frame += SEARCH_STEP
+            continue
+        segments.append(segment)
+        offset = segment.offset
+        frame = unmatched = segment.end
+    return segments
+
+
+def changed_ranges(segments: Iterable[Segment], frames: int) -> list[tuple[int, int]]:
+    """
+    Frame ranges (end excluded) of the new version outside of segments, two segments following each other without
+    a change in between give an empty range : the first frame of the second one is a cut
+    """
+    ranges, cursor = [], 0
+    for segment in segments:
+        if segment.start > cursor:
+            ranges.append((cursor, segment.start))
+        elif segment.start:
+            ranges.append((segment.start, segment.start))
+        cursor = segment.end
+    if cursor < frames:
+        ranges.append((cursor, frames))
+    return ranges
+
+
+def _windows(ranges: list[tuple[int, int]], gap: int) -> list[tuple[int, int]]:
+    # changed ranges close to each other are analyzed together, seeking has a cost too
+    windows = []
+    for start, end in ranges:
+        if windows and start - windows[-1][1] < gap:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def _clip(ranges: Iterable[tuple[int, int]], start: int, end: int, offset: int = 0) -> list[tuple[int, int]]:
+    return [(max(s + offset, start), min(e + offset, end)) for s, e in ranges if s + offset < end and e + offset > start]
+
+
+def _merge(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    # ranges cut by a segment boundary are joined again
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _run(commands: dict[Hashable, tuple[list[str], float]],
+         progress: Callable[[jobs.AggregateProgress], None] | None) -> dict[Hashable, str]:
+    # decodes run in parallel (as many as the engine allows), stderr of each
+    tracker = jobs.ProgressTracker()
+    engine = jobs.get_engine()
+    futures = {}
+    for key, (command, duration) in commands.items():
+        log.debug(f'Running Analysis Command : {" ".join(command)}')
+        futures[engine.submit(command, resource=jobs.DECODE, duration=duration,
+                              progress=tracker.job(key, duration))] = key
+    outputs = {}
+    for future in tracker.as_completed(futures, progress):
+        outputs[futures[future]] = future.result().stderr.decode(errors='replace')
+    return outputs
+
+
+def _previous_analysis(previous_source: Path, fps: float, settings: analysis.AnalysisSettings,
+                       progress: Callable[[jobs.AggregateProgress], None] | None) -> analysis.SourceAnalysis:
+    previous = analysis.analyze(previous_source, fps, settings=settings, progress=progress)
+    if previous.signature_array() is None:
+        # analyzed before signatures were part of the analysis
+        previous = analysis.analyze(previous_source, fps, use_cache=False, settings=settings, progress=progress)
+    return previous
+
+
+@trace.traced('versions.update')
+def update(previous_source: str | Path, source: str | Path, fps: float, frames: int | None = None,
+           settings: analysis.AnalysisSettings | None = None,
+           progress: Callable[[jobs.AggregateProgress], None] | None = None
+           ) -> tuple[analysis.SourceAnalysis, list[Segment]]:
+    """
+    Analysis of source, a new version of previous_source, made from the analysis of previous_source (analyzed first
+    if it is not in the analysis cache) for the frames both versions share
+
+    Returns:
+        tuple: analysis of source and its segments unchanged from previous_source
+
+    Raises:
+        JobError, OSError: a source could not be decoded
+    """
+    previous_source, source = Path(previous_source), Path(source)
+    settings = settings or analysis.AnalysisSettings()
+    previous = _previous_analysis(previous_source, fps, settings, progress)
+    previous_peaks = _peaks(previous.audio_peaks, previous.frames)
+
+    cached = analysis.load(source)
+    if cached and cached.fps == fps and cached.settings == asdict(settings) and cached.signature_array() is not None:
+        segments = match(previous.signature_array(), previous_peaks, cached.signature_array(),
+                         _peaks(cached.audio_peaks, cached.frames))
+        return cached, segments
+
+    # signatures of the new version first, a decode without any full resolution filter
+    with TemporaryDirectory(prefix='wolverine_versions_') as temp_dir:
+        signatures_path = Path(temp_dir).joinpath('signatures.raw')
+        command = analysis.signature_command(source, fps, signatures_path)
+        output = _run({'signatures': (command, frames / fps if frames else None)}, progress)['signatures']
+        values = analysis.parse_output(output, fps)
+        signatures = signatures_path.read_bytes() if signatures_path.exists() else b''
+    nb_frames = values['frames']
+    if not nb_frames:
+        raise OSError(f'No video frames decoded from ({source})')
+    current = analysis.SourceAnalysis(fingerprint=media_cache.source_fingerprint(source), fps=fps,
+                                      frames=nb_frames, scene_scores=[0.0] * nb_frames, black=[], freeze=[],
+                                      key_frames=values['key_frames'], audio_peaks=values['audio_peaks'],
+                                      thumbnail_frames=[], settings=asdict(settings), signatures=signatures)
+    if current.signature_array() is None:
+        raise OSError(f'Could not read the signatures of ({source})')
+
+    segments = match(previous.signature_array(), previous_peaks, current.signature_array(),
+                     _peaks(current.audio_peaks, nb_frames))
+    changed = changed_ranges(segments, nb_frames)
+    nb_changed = sum(end - start for start, end in changed)
+    log.info(f'{source.name} : {nb_changed} of {nb_frames} frames changed since {previous_source.name}, '
+             f'{len(segments)} unchanged segments')
+    if nb_changed > MAX_CHANGED_RATIO * nb_frames:
+        return analysis.analyze(source, fps, nb_frames, use_cache=False, settings=settings, progress=progress), segments
+
+    scores = np.zeros(nb_frames)
+    black, freeze, thumbnail_frames = [], [], []
+    cache = media_cache.get_cache()
+    for segment in segments:
+        # the first frame of a segment is scored against a frame that may have changed, its window scores it
+        first = segment.previous_start
+        scores[segment.start + 1:segment.end] = previous.scene_scores[first + 1:first + segment.duration]
+        black += _clip(previous.black, segment.start, segment.end, segment.offset)
+        freeze += _clip(previous.freeze, segment.start, segment.end, segment.offset)
+        for frame in previous.thumbnail_frames:
+            if not segment.contains_previous(frame, 1) or not cache:
+                continue
+            cached_path = cache.get(analysis.thumbnail_key(previous_source, fps, frame), '.jpg')
+            if cached_path and cache.put(analysis.thumbnail_key(source, fps, frame + segment.offset), cached_path):
+                thumbnail_frames.append(frame + segment.offset)
+
+    # changed frames, with the frame before (scores) and the first frame of the next segment (its score)
+    windows = _windows(changed, CHUNK_FRAMES)
+    with TemporaryDirectory(prefix='wolverine_versions_') as temp_dir:
+        commands = {}
+        for start, end in windows:
+            decoded = (max(start - 1, 0), min(end + 1, nb_frames))
+            thumbnails_dir = Path(temp_dir).joinpath(f'{start:06d}') if cache else None
+            if thumbnails_dir:
+                thumbnails_dir.mkdir()
+            command = analysis.analysis_command(source, fps, thumbnails_dir, settings, frame_range=decoded)
+            commands[(start, end)] = (command, (decoded[1] - decoded[0]) / fps)
+        outputs = _run(commands, progress)
+        for (start, end), output in outputs.items():
+            window = analysis.parse_output(output, fps)
+            first = max(start - 1, 0)
+            # the first decoded frame has nothing to be scored against, unless it is the first frame of the source
+            for frame, score in enumerate(window['scene_scores'][1:], first + 1):
+                if frame < nb_frames:
+                    scores[frame] = score
+            black += _clip(window['black'], start, end, first)
+            freeze += _clip(window['freeze'], start, end, first)
+            if cache:
+                # the first decoded frame always gets one, it is only a candidate when it starts the source
+                thumbnails = [frame + first if frame or not first else None for frame in window['thumbnails']]
+                thumbnail_frames += analysis.cache_thumbnails(source, fps, thumbnails,
+                                                              Path(temp_dir).joinpath(f'{start:06d}'))
+
+    current.scene_scores = [round(float(score), 6) for score in scores]
+    current.black, current.freeze = _merge(black), _merge(freeze)
+    current.thumbnail_frames = sorted(set(thumbnail_frames))
+    analysis.store(current)
+    return current, segments
+
+
+def carry_media(previous_shot: ShotData, shot: ShotData) -> int:
+    """
+    Add the cached media of previous_shot to the media cache under the keys of shot (same frames in a new version)
+
+    Returns:
+        int: media carried over
+    """
+    cache = media_cache.get_cache()
+    if not cache or not previous_shot.source.exists():
+        return 0
+    carried = 0
+    for media in MEDIA_TYPES:
+        for profile in [None] if media == 'thumbnail' else list(profiles.PROFILES.values()):
+            if media == 'movie' and profile.is_copy:
+                # stream copies are cut on the key frames of their own source
+                continue
+            previous_command, previous_path, _ = previous_shot.media_command(media, profile)
+            cached_path = cache.get(media_cache.media_key(previous_shot.source, previous_command),
+                                    previous_path.suffix)
+            if not cached_path:
+                continue
+            command = shot.media_command(media, profile)[0]
+            if cache.put(media_cache.media_key(shot.source, command), cached_path):
+                carried += 1
+    return carried
+
+
+def carry_shots(previous_shots: Iterable[ShotData], segments: list[Segment], source: Path) -> list[ShotData]:
+    """
+    Shots of the previous version inside an unchanged segment moved to the new version (source), with the same
+    name, state and cached media
+
+    Returns:
+        list[ShotData]: carried over shots
+    """
+    carried = []
+    for previous_shot in previous_shots:
+        segment = next((s for s in segments if s.contains_previous(previous_shot.start_frame, previous_shot.duration)),
+                       None)
+        if not segment:
+            continue
+        shot = ShotData.from_frames(index=previous_shot.index, fps=previous_shot.fps, source=source,
+                                    start=previous_shot.start_frame + segment.offset,
+                                    duration=previous_shot.duration, new_start=previous_shot.new_start,
+                                    prefix=previous_shot.prefix, enabled=previous_shot.enabled,
+                                    ignored=previous_shot.ignored, auto_thumbnail=False)
+        carry_media(previous_shot, shot)
+        carried.append(shot)
+    return carried
+
+
+def cut_changed(result: analysis.SourceAnalysis, carried: list[ShotData], source: Path, threshold: int,
+                **kwargs) -> list[ShotData]:
+    """
+    New shots (index 0) of the frames of source no carried over shot covers, cut where the analysis finds cuts at
+    threshold, kwargs go to ShotData.from_frames
+
+    Returns:
+        list[ShotData]: new shots, ordered
+    """
+    cuts = result.cuts(threshold)
+    covered = sorted((s.start_frame, s.start_frame + s.duration) for s in carried) + [(result.frames, result.frames)]
+    shots, cursor = [], 0
+    for start, end in covered:
+        if start > cursor:
+            starts = [cursor] + [cut for cut in cuts if cursor < cut < start]
+            for shot_start, shot_end in zip(starts, starts[1:] + [start]):
+                shots.append(ShotData.from_frames(index=0, fps=result.fps, source=source, start=shot_start,
+                                                  duration=shot_end - shot_start, auto_thumbnail=False, **kwargs))
+        cursor = max(cursor, end)
+    return shots
@@ -1,166 +1,233 @@
+"""
+Shot list report (.xlsx), rows are written in order with xlsxwriter's constant_memory mode (no merged cells) and
+thumbnails are embedded pre-downscaled, so memory stays flat and files stay small on long sequences.
+
+Downscaled thumbnails go through the media cache, the ones that aren't cached are downscaled in a few batched ffmpeg
+processes.
+
+Registered as an export action :
+
+    window.add_export_action(xlsx_writer.SHOT_LIST_ACTION)
+    python -m wolverine export sequence.mov -o /exports --action wolverine.xlsx_writer:SHOT_LIST_ACTION
+"""
+from __future__ import annotations
 
-import string
 import datetime
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterable
 
 import xlsxwriter
+from opentimelineio import opentime
 
-from wolverine import utils
+from wolverine import log
+from wolverine import jobs
+from wolverine import media_cache
+from wolverine.export import ExportAction
+from wolverine.shots import ShotData
 
-
-HEADER_LIST = ['Shot', 'Preview', 'IN', 'OUT', 'Duration', 'Brief', 'Work', 'Feedback']
-DEFAULT_LOGO = Path(__file__).parents[1].joinpath('resources/icons/brunch_b.png')
+HEADER_LIST = ['Shot', 'Preview', 'IN', 'OUT', 'Duration', 'New Range', 'Brief', 'Work', 'Feedback']
+COLUMN_WIDTHS = [16, 24, 16, 16, 12, 16, 50, 50, 50]
+DEFAULT_LOGO = Path(__file__).parents[2].joinpath('resources/icons/brunch_b.png')
 DEFAULT_LOGO_SCALE = [2.55, 2.8]
+THUMBNAIL_SIZE = (160, 90)  # pixels, thumbnails are fitted in it keeping their aspect ratio
+HEADER_ROW = 11
+MIN_BATCH_SIZE = 50  # thumbnails per ffmpeg process, below it starting processes costs more than it saves
+
+
+def _scale_filter(size: tuple[int, int]) -> str:
+    return f'scale={size[0]}:{size[1]}:force_original_aspect_ratio=decrease'
+
+
+def _thumbnail_key(thumbnail: Path, size: tuple[int, int]) -> str:
+    # same key as a one image command, whether it was downscaled alone or in a batch
+    return media_cache.media_key(thumbnail, ['ffmpeg', '-i', thumbnail.as_posix(), '-vf', _scale_filter(size), ''])
+
+
+def downscale_thumbnails(thumbnails: list[Path], output_dir: str | Path,
+                         size: tuple[int, int] = THUMBNAIL_SIZE) -> list[Path | None]:
+    """
+    Fit thumbnails in size, cached ones are linked from the media cache, the others are downscaled in batches (a few
+    ffmpeg processes instead of one per thumbnail) then added to the cache
+
+    Returns:
+        list: downscaled thumbnail for each thumbnail, None if it couldn't be made
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache = media_cache.get_cache()
+    outputs: list[Path | None] = [output_dir.joinpath(f'{i:06d}.jpg') for i in range(len(thumbnails))]
+    missing = []
+    for i, thumbnail in enumerate(thumbnails):
+        if not thumbnail.exists():
+            outputs[i] = None
+        elif not cache or not cache.fetch(_thumbnail_key(thumbnail, size), '.jpg', outputs[i]):
+            missing.append(i)
+    if not missing:
+        return outputs
+
+    # one ffmpeg per decode slot, each downscaling a chunk of the missing thumbnails (concat demuxer, one image per
+    # frame). lowres lets the jpeg decoder skip half the resolution, thumbnails are much bigger than size anyway
+    engine = jobs.get_engine()
+    chunk_count = max(1, min(engine.limits[jobs.DECODE], len(missing) // MIN_BATCH_SIZE))
+    chunks = [missing[i::chunk_count] for i in range(chunk_count)]
+    futures = []
+    for chunk_index, chunk in enumerate(chunks):
+        batch_dir = output_dir.joinpath(f'batch_{chunk_index}')
+        batch_dir.mkdir(exist_ok=True)
+        concat_list = batch_dir.joinpath('thumbnails.ffconcat')
+        lines = ['ffconcat version 1.0']
+        for i in chunk:
+            escaped_path = thumbnails[i].resolve().as_posix().replace("'", "'\\''")
+            lines.append(f"file '{escaped_path}'")
+        concat_list.write_text('\n'.join(lines))
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-lowres', '1', '-f', 'concat', '-safe', '0',
+                   '-i', concat_list.as_posix(), '-vf', _scale_filter(size), '-fps_mode', 'passthrough',
+                   '-start_number', '0', batch_dir.joinpath('%06d.jpg').as_posix()]
+        futures.append(engine.submit(command, resource=jobs.DECODE))
+
+    retry = []
+    for chunk_index, (chunk, future) in enumerate(zip(chunks, futures)):
+        try:
+            future.result()
+        except (jobs.JobError, OSError) as e:
+            log.critical(f'Could not downscale thumbnails : {e}')
+        batch_dir = output_dir.joinpath(f'batch_{chunk_index}')
+        batch_outputs = list(batch_dir.glob('[0-9]*.jpg'))
+        if len(batch_outputs) != len(chunk):
+            # an image ffmpeg skipped (unreadable jpeg) shifts every output after it to the wrong shot
+            log.warning(f'{len(batch_outputs)} of {len(chunk)} thumbnails downscaled in a batch, downscaling them one '
+                        f'at a time')
+            for batch_output in batch_outputs:
+                batch_output.unlink()
+            for i in chunk:
+                outputs[i].unlink(missing_ok=True)
+            retry += chunk
+            continue
+        for batch_index, i in enumerate(chunk):
+            batch_output = batch_dir.joinpath(f'{batch_index:06d}.jpg')
+            if not batch_output.exists():
+                outputs[i] = None
+                continue
+            batch_output.replace(outputs[i])
+            if cache:
+                cache.put(_thumbnail_key(thumbnails[i], size), outputs[i])
+
+    futures = {i: engine.submit(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-lowres', '1', '-i',
+                                 thumbnails[i].as_posix(), '-vf', _scale_filter(size), '-frames:v', '1',
+                                 outputs[i].as_posix()], resource=jobs.DECODE) for i in retry}
+    for i, future in futures.items():
+        try:
+            future.result()
+        except (jobs.JobError, OSError) as e:
+            log.critical(f'Could not downscale thumbnail ({thumbnails[i]}) : {e}')
+        if not outputs[i].exists():
+            outputs[i] = None
+        elif cache:
+            cache.put(_thumbnail_key(thumbnails[i], size), outputs[i])
+    return outputs
+
+
+def _timecode(frame: int, fps: float) -> str:
+    return f'{opentime.to_timecode(opentime.from_frames(frame, fps), fps)}\n{frame:04d}'
+
+
+def create_xlsx_style(workbook: xlsxwriter.Workbook) -> dict:
+    return {
+        'title': workbook.add_format({'font_name': 'Arial', 'font_size': 48, 'bold': True, 'valign': 'top'}),
+        'description': workbook.add_format({'font_name': 'Arial', 'font_size': 20, 'align': 'right'}),
+        'description_value': workbook.add_format({'font_name': 'Arial', 'font_size': 20, 'italic': True}),
+        'header': workbook.add_format({'font_name': 'Arial', 'font_size': 16, 'bold': True, 'border': 1,
+                                       'bg_color': '#D8D8D8', 'valign': 'vcenter', 'align': 'center'}),
+        'basic': workbook.add_format({'font_name': 'Arial', 'font_size': 16, 'border': 1, 'valign': 'vcenter',
+                                      'align': 'center', 'text_wrap': True}),
+        'notes': workbook.add_format({'font_name': 'Arial', 'font_size': 12, 'border': 1, 'valign': 'top',
+                                      'text_wrap': True}),
+    }
 
 
-def create_fill_xml(output_path, source_file, fps, shots_list):
-    print("creating excel file")
+def create_shot_list(output_path: str | Path, shots: Iterable[ShotData], source: str | Path | None = None,
+                     fps: float | None = None, logo_path: str | Path | None = None,
+                     thumbnail_size: tuple[int, int] = THUMBNAIL_SIZE) -> Path:
+    """
+    Write the shot list of shots (ignored shots are left out) to output_path
 
+    Returns:
+        Path: written file
+    """
     output_path = Path(output_path)
-    # Create a new Excel file and add a worksheet.
-    workbook = xlsxwriter.Workbook(output_path.as_posix())
-    worksheet = workbook.add_worksheet()
+    shots = [shot for shot in shots if not shot.ignored]
+    source = Path(source or (shots[0].source if shots else output_path.stem))
+    fps = fps or (shots[0].fps if shots else 24.0)
+
+    with TemporaryDirectory(prefix='wolverine_xlsx_') as temp_dir:
+        # images are only read when the workbook gets closed, they need to exist until then
+        thumbnails = downscale_thumbnails([shot.thumbnail or Path() for shot in shots], temp_dir, thumbnail_size)
+
+        workbook = xlsxwriter.Workbook(output_path.as_posix(), {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Shot List')
+        styles = create_xlsx_style(workbook)
+        for column, width in enumerate(COLUMN_WIDTHS):
+            worksheet.set_column(column, column, width)
+
+        # constant_memory mode : every row is written once, top to bottom
+        logo_path = Path(logo_path or DEFAULT_LOGO)
+        worksheet.set_row(0, 130)
+        if logo_path.exists():
+            scale_x, scale_y = DEFAULT_LOGO_SCALE
+            worksheet.insert_image(0, 0, logo_path.as_posix(), {'x_scale': scale_x, 'y_scale': scale_y})
+        worksheet.write(0, 6, 'SHOT LIST', styles['title'])
+
+        description = {
+            'Source': source.stem,
+            'Date': datetime.datetime.today().strftime('%d-%m-%Y'),
+            'FPS': f'{fps:g}',
+            'Shots': str(len(shots)),
+        }
+        for row, (label, value) in enumerate(description.items(), start=2):
+            worksheet.set_row(row, 26)
+            worksheet.write(row, 1, f'{label} :', styles['description'])
+            worksheet.write(row, 2, value, styles['description_value'])
+
+        worksheet.set_row(HEADER_ROW, 34)
+        for column, header in enumerate(HEADER_LIST):
+            worksheet.write(HEADER_ROW, column, header, styles['header'])
+
+        row_height = thumbnail_size[1] * 0.75 + 6  # pixels to points, with a small margin
+        for row, (shot, thumbnail) in enumerate(zip(shots, thumbnails), start=HEADER_ROW + 1):
+            worksheet.set_row(row, row_height)
+            worksheet.write(row, 0, shot.name, styles['basic'])
+            worksheet.write(row, 1, '', styles['basic'])
+            if thumbnail:
+                worksheet.insert_image(row, 1, thumbnail.as_posix(), {'x_offset': 4, 'y_offset': 4,
+                                                                      'object_position': 1})
+            worksheet.write(row, 2, _timecode(shot.start_frame, fps), styles['basic'])
+            worksheet.write(row, 3, _timecode(shot.end_frame, fps), styles['basic'])
+            worksheet.write(row, 4, shot.duration, styles['basic'])
+            worksheet.write(row, 5, f'{shot.new_start} - {shot.new_end}', styles['basic'])
+            for column in range(6, len(HEADER_LIST)):
+                worksheet.write_blank(row, column, None, styles['notes'])
+        worksheet.freeze_panes(HEADER_ROW + 1, 0)
+        workbook.close()
+    return output_path
 
-    workbook, xlsx_styles = create_xlsx_style(workbook)
-    worksheet = fill_logo(worksheet)
 
-    fill_xlsx_description(source_file, worksheet, xlsx_styles)
-    fill_xlsx_data(shots_list, fps, worksheet, xlsx_styles)
-    stylise_xlsx(worksheet)
+def create_fill_xml(output_path: str | Path, source_file: str | Path, fps: float, shots_list: list[ShotData]) -> bool:
     try:
-        workbook.close()
+        create_shot_list(output_path, shots_list, source=source_file, fps=fps)
     except Exception as e:
-        print(e)
+        log.critical(f'Could not write shot list ({output_path}) : {e}')
         return False
     return True
 
 
-def fill_logo(worksheet, logo_path='', logo_height=174, logo_scale=None):
-    logo_scale_x, logo_scale_y = logo_scale or DEFAULT_LOGO_SCALE
-    logo_path = Path(logo_path or DEFAULT_LOGO)
-    worksheet.insert_image("B1", logo_path, {'x_scale': logo_scale_x, 'y_scale': logo_scale_y})
-    worksheet.set_row(0, logo_height)
-    return worksheet
-
-
-def create_xlsx_style(workbook):
-    xlsx_styles = {
-        "bold": workbook.add_format({'bold': True}),
-        "italic": workbook.add_format({'italic': True}),
-        "grey_bold": workbook.add_format({'font_name': 'Arial', 'font_size': 16, 'bold': True, 'border': 1,
-                                          'bg_color': '#D8D8D8', 'valign': 'vcenter', 'align': 'center'}),
-        "image": workbook.add_format({'border': 1, 'valign': 'vcenter', 'align': 'center'}),
-        "basic": workbook.add_format({'font_name': 'Arial', 'font_size': 16, 'border': 1, 'valign': 'vcenter',
-                                      'align': 'center'}),
-        "basic_borderless": workbook.add_format({'font_name': 'Arial', 'font_size': 16, 'valign': 'vcenter',
-                                                 'align': 'center'}),
-        "big_arial": workbook.add_format({'font_name': 'Arial', 'font_size': 20, 'valign': 'bottom', 'align': 'right'}),
-        "big_bold_arial": workbook.add_format({'font_name': 'Arial', 'font_size': 48, 'bold': True, 'valign': 'top',
-                                               'align': 'right'}),
-        "big_italic_arial": workbook.add_format({'font_name': 'Arial', 'font_size': 20, 'italic': True,
-                                                 'valign': 'bottom', 'align': 'left'}),
-    }
-    return workbook, xlsx_styles
-
-
-def fill_xlsx_description(source_path, worksheet, xlsx_styles):
-    source_path = Path(source_path)
-    description_data = {
-        "PROJECT": '',
-        "Source": source_path.stem,
-        "Date": datetime.datetime.today().strftime("%d-%m-%Y"),
-        "Agency": '',
-        "Production": '',
-        "Director": '',
-        "Producer": '',
-        "Post-Producer": ''
-    }
-    worksheet.write("I1", "SHOT LIST", xlsx_styles.get("big_bold_arial"))
-
-    start_row = 4
-    columns_desc = [2, 3]
-    columns = string.ascii_uppercase[:26]
-    for c in columns_desc:
-        worksheet.set_row(c, 22.5)
-        for row, desc, desc_value in enumerate(description_data.items()):
-            row += start_row
-            worksheet.set_row(row, 22.5)
-            cur_column = f'{columns[c]}{row}'
-            if c == columns_desc[0]:
-                desc += ' :' if row != 0 else ''
-                worksheet.write(cur_column, str(desc), xlsx_styles.get("big_arial"))
-            else:
-                worksheet.write(cur_column, str(desc_value), xlsx_styles.get("big_italic_arial"))
-
-
-def fill_xlsx_data(shots_list, fps, worksheet, xlsx_styles):
-    start_row = 14
-    merge_columns = ["B", "C", "G", "H", "I"]
-    double_cell_columns = ["IN", "OUT", "Duration"]
-    columns = string.ascii_uppercase[:26]
-
-    added_headers = False
-    add1 = add2 = 0
-    for i, shot_data in enumerate(shots_list):
-        cur_row = i + start_row
-        cur_row1, cur_row2, add1, add2 = get_row_id(i == 0, cur_row, add1, add2)
-        worksheet.set_row(cur_row1, 21)
-        worksheet.set_row(cur_row2, 81)
-        for clm in merge_columns:
-            worksheet.merge_range(f'{clm}{cur_row2}:{clm}{cur_row1}', "", xlsx_styles["basic"])
-        for header_index, header in enumerate(HEADER_LIST):
-            header_index += 1
-            shot_header = shot_data.get(header)
-            #headers
-            if not added_headers and header not in ['Shot', 'Preview']:
-                cur_column = columns[header_index] + str(13)
-                worksheet.write(cur_column, header, xlsx_styles["grey_bold"])
-            # row1
-            cur_column = columns[header_index] + str(cur_row1)
-            if header in double_cell_columns:
-                cur_timecode = utils.calculate_time_code(fps, shot_header)
-                cur_text = f'{int(cur_timecode[-1]):04d}'
-                worksheet.write(cur_column, cur_text, xlsx_styles["basic"])
-            # row2
-            cur_column = columns[header_index] + str(cur_row2)
-            cur_text = str(shot_header)
-            if header in double_cell_columns:
-                cur_timecode = utils.calculate_time_code(fps, shot_header)
-                cur_text = str(':'.join([f'{f:02d}' for f in cur_timecode[:-1]]))
-            if columns[header_index] == "C" and shot_data.thumbail and shot_data.thumbail.exists():
-                worksheet.write(cur_column, "", xlsx_styles["image"])
-                worksheet.insert_image(cur_column, shot_data.thumbail.as_posix(), {'x_scale': 1.03, 'y_scale': 1.8})
-            else:
-                if header == "Shot":
-                    cur_text = f'PL{shot_data.index:03d}'
-                worksheet.write(cur_column, cur_text, xlsx_styles["basic"])
-        added_headers = True
-
-    return worksheet
-
-
-def get_row_id(first_run, row, add1, add2):
-    row1 = row2 = row
-    if first_run:
-        if row % 2 != 0:
-            add2 += 1
-        else:
-            add1 += 1
-    else:
-        add1 += 1
-        add2 += 1
-    row1 += add1
-    row2 += add2
-    return row1, row2, add1, add2
-
-
-def stylise_xlsx(worksheet):
-    column_params = {"A": 0.75, "B": 9.25, "C": 19.25, "D": 16.5, "E": 16.5,
-                     "F": 16.5, "G": 54.5, "H": 54.5, "I": 54.5}
-    for column_id, column_size in column_params.items():
-        worksheet.set_column(f'{column_id}:{column_size}')
-    worksheet.set_row(11, 51.75)
-    worksheet.set_row(12, 33.75)
-
-    return worksheet
+def export_shot_list(export_directory: str, shots: list[ShotData]) -> None:
+    if not shots:
+        return
+    source = Path(shots[0].source)
+    output_path = Path(export_directory).joinpath(f'{source.stem}_shot_list.xlsx')
+    create_shot_list(output_path, shots, source=source, fps=shots[0].fps)
+    log.info(f'Shot list written to ({output_path})')
+
 
+SHOT_LIST_ACTION = ExportAction(description='Shot List (.xlsx)', func=export_shot_list)